@@ -7,10 +7,24 @@ import logging
 import jwt
 import json
 import redis
+import concurrent.futures
 from datetime import datetime, timedelta, timezone
 from functools import wraps
 from supabase import create_client, Client
 import git
+from riot_client import RiotClient
+from riot_rate_limiter import LANE_BACKGROUND, RiotRateLimiter, RiotRateLimitError
+from league_cache import LeagueSnapshotCache
+from match_store import MatchHistoryIndex, MatchStore, parse_match, slim_match
+from rank_freshness import (CALLER_GROUP, CALLER_INTERACTIVE, RANK_FINGERPRINT_KEY, freshness_stamp,
+                            rank_fingerprint, rank_is_fresh)
+from rank_poll_scheduler import RankPollScheduler
+from member_series_cache import (MEMBER_SERIES_PATTERN, append_events, compose_group_events, load_series,
+                                 series_freshness, series_from_events, store_series)
+from member_stats_dirty import mark_groups_dirty, mark_riot_ids_dirty
+from rank_rollup import RANK_AUDIT_DAILY_DAYS, fetch_daily_rank_events
+from rank_event_stream import iter_rank_event_pages
+from smart_filter import chart_day, smart_filter_chunks
 # Try to load dotenv if available, otherwise use system environment variables
 #test hook next
 try:
@@ -79,9 +93,37 @@ redis_client = redis.Redis(
 API_KEY = os.environ.get('RIOT_API_KEY')
 if not API_KEY:
     raise ValueError("RIOT_API_KEY environment variable is required")
-BASE_URL = "https://americas.api.riotgames.com/tft/match/v1/matches"
-RIOT_ACCOUNT_URL = "https://americas.api.riotgames.com/riot/account/v1/accounts/by-riot-id"
-TFT_LEAGUE_URL = "https://na1.api.riotgames.com/tft/league/v1/by-puuid"
+
+# Shared pooled Riot API client (keep-alive connections, default timeouts), with the
+# Redis-backed rate limiter so every worker and the processor share one quota
+riot_rate_limiter = RiotRateLimiter(redis_client)
+riot_client = RiotClient(API_KEY, rate_limiter=riot_rate_limiter)
+# Short-TTL league-by-puuid snapshots shared by every rank lookup (and the processor)
+league_cache = LeagueSnapshotCache(riot_client, redis_client)
+# Finished matches never change, so they are stored permanently and downloaded once
+match_store = MatchStore(riot_client, redis_client)
+# Per-puuid stored match history with a sync cursor, so refreshes only fetch new games
+match_history = MatchHistoryIndex(redis_client)
+# The rank audit processor's polling schedule; viewing a group moves its members up
+rank_poll_scheduler = RankPollScheduler(redis_client)
+
+# Unique key of rank_audit_events: one event per player, record and Pacific day
+RANK_AUDIT_EVENT_KEY = 'riot_id,wins,losses,local_day'
+RANK_AUDIT_BULK_MAX_EVENTS = 1000  # largest batch POST /api/rank-audit-events/bulk accepts
+
+# Group live rank lookups fan out over a shared bounded pool (the rate limiter still
+# paces the actual Riot calls) and return whatever finished within the deadline
+GROUP_LIVE_DATA_WORKERS = int(os.environ.get('GROUP_LIVE_DATA_WORKERS', 8))
+GROUP_LIVE_DATA_DEADLINE = float(os.environ.get('GROUP_LIVE_DATA_DEADLINE', 4))
+live_data_executor = concurrent.futures.ThreadPoolExecutor(
+    max_workers=GROUP_LIVE_DATA_WORKERS,
+    thread_name_prefix='live-rank'
+)
+
+# Group rank refreshes run off the request path, one at a time per group, and skip
+# accounts the freshness policy says were refreshed recently (see rank_freshness.py)
+GROUP_RANK_REFRESH_LOCK_TTL = 120  # upper bound on one group refresh, in case a worker dies mid-job
+rank_refresh_executor = concurrent.futures.ThreadPoolExecutor(max_workers=2, thread_name_prefix='rank-refresh')
 
 # JWT configuration
 JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY')
@@ -234,6 +276,15 @@ def _calculate_elo(tier, rank, league_points):
         
         return base_elo + division_value + league_points
 
+def riot_rate_limited_response(error):
+    """Build a 429 response for a RiotRateLimitError, passing Retry-After through to the client"""
+    retry_after = max(1, int(round(error.retry_after)))
+    return jsonify({
+        'error': 'Rate Limit Exceeded',
+        'message': 'Too many requests to Riot API. Please try again later.',
+        'retry_after': retry_after
+    }), 429, {'Retry-After': str(retry_after)}
+
 def execute_supabase_query_with_retry(query_func, max_retries=3, delay=1):
     """
     Execute a Supabase query with retry logic for connection issues
@@ -318,7 +369,7 @@ def populate_rank_audit_events(riot_id, region):
         print(f"Found {len(ranked_rating_changes)} rank audit events")
         
         # Process events in reverse order to calculate cumulative wins/losses
-        events_to_insert = []
+        latest_by_key = {}  # dedup key -> event, as in create_rank_audit_events_bulk
         previous_rating = None
         cumulative_wins = 0
         cumulative_losses = 0
@@ -344,6 +395,9 @@ def populate_rank_audit_events(riot_id, region):
             except Exception as e:
                 print(f"Error parsing timestamp {created_timestamp}: {e}")
                 created_at = datetime.now(timezone.utc)
+            if created_at.tzinfo is None:
+                created_at = created_at.replace(tzinfo=timezone.utc)
+            created_at = created_at.astimezone(timezone.utc)
             
             # Prepare event data with cumulative totals
             event_data = {
@@ -354,20 +408,28 @@ def populate_rank_audit_events(riot_id, region):
                 'created_at': created_at.isoformat()
             }
             
-            events_to_insert.append(event_data)
+            # One event per wins, losses and Pacific day: the latest replaces earlier ones
+            key = (cumulative_wins, cumulative_losses, chart_day(created_at))
+            previous = latest_by_key.get(key)
+            if previous is None or previous['created_at'] <= event_data['created_at']:
+                latest_by_key[key] = event_data
             previous_rating = current_rating
         
-        # Insert events into database
+        events_to_insert = list(latest_by_key.values())
+        
+        # Upsert on the daily key, so re-linking or re-running a backfill over recorded
+        # days replaces those events instead of failing the whole batch
         if events_to_insert:
             def insert_events():
-                return supabase.table('rank_audit_events').insert(events_to_insert).execute()
+                return supabase.table('rank_audit_events').upsert(events_to_insert, on_conflict=RANK_AUDIT_EVENT_KEY).execute()
             
             insert_response = execute_supabase_query_with_retry(insert_events)
             
             if insert_response and insert_response.data:
-                print(f"Successfully inserted {len(events_to_insert)} rank audit events for riot_id: {riot_id}")
+                print(f"Successfully upserted {len(events_to_insert)} rank audit events for riot_id: {riot_id}")
+                mark_riot_ids_dirty(redis_client, append_events(redis_client, events_to_insert))
             else:
-                print(f"Failed to insert rank audit events for riot_id: {riot_id}")
+                print(f"Failed to upsert rank audit events for riot_id: {riot_id}")
         
     except Exception as e:
         print(f"Error populating rank audit events for riot_id {riot_id}: {str(e)}")
@@ -1029,6 +1091,7 @@ def add_member_to_study_group(group_id):
             return result
         
         result = execute_supabase_query_with_retry(add_user_to_group)
+        mark_groups_dirty(redis_client, [group_id])
         
         if not result or not result.data:
             logger.error(f"Failed to insert user {target_riot_id} into study group {group_id}")
@@ -1086,6 +1149,7 @@ def remove_member_from_study_group(group_id):
             return supabase.table('user_to_study_group').delete().eq('study_group_id', group_id).eq('riot_id', target_riot_id).execute()
         
         result = execute_supabase_query_with_retry(remove_user)
+        mark_groups_dirty(redis_client, [group_id])
         
         if not result or not result.data:
             return jsonify({'error': 'Failed to remove member from study group'}), 500
@@ -1188,6 +1252,7 @@ def leave_study_group(group_id):
             return supabase.table('user_to_study_group').delete().eq('study_group_id', group_id).eq('riot_id', user_riot_id).execute()
         
         result = execute_supabase_query_with_retry(remove_user)
+        mark_groups_dirty(redis_client, [group_id])
         
         if not result or not result.data:
             return jsonify({'error': 'Failed to leave study group'}), 500
@@ -1310,8 +1375,159 @@ def get_user_study_groups_by_user(user_id):
         logger.error(f"Error fetching study groups for user {user_id}: {str(e)}")
         return jsonify({'error': 'Failed to fetch user study groups', 'details': str(e)}), 500
 
+def rank_from_league_entries(league_data):
+    """Rank string stored on riot_accounts ('GOLD II 45LP', 'TURBO ORANGE' or 'UNRANKED')"""
+    for entry in league_data:
+        if entry.get('queueType') == 'RANKED_TFT':
+            tier = entry.get('tier', 'UNRANKED')
+            if tier == 'UNRANKED':
+                return 'UNRANKED'
+            return f"{tier} {entry.get('rank', '')} {entry.get('leaguePoints', 0)}LP"
+    # If no ranked TFT found, check for turbo TFT
+    for entry in league_data:
+        if entry.get('queueType') == 'RANKED_TFT_TURBO':
+            rated_tier = entry.get('ratedTier', 'UNRANKED')
+            return f"TURBO {rated_tier}" if rated_tier != 'UNRANKED' else 'UNRANKED'
+    return 'UNRANKED'
+
+def rank_reading_from_league_entries(league_data):
+    """rank_str, elo, wins and losses of the queue the rank comes from (None without a TFT entry)"""
+    if not isinstance(league_data, list):
+        return None
+    for queue_type in ('RANKED_TFT', 'RANKED_TFT_TURBO'):
+        for entry in league_data:
+            if entry.get('queueType') == queue_type:
+                rank_str = rank_from_league_entries([entry])
+                return {
+                    'rank_str': rank_str,
+                    'elo': rank_to_elo(rank_str),
+                    'wins': entry.get('wins', 0),
+                    'losses': entry.get('losses', 0)
+                }
+    return None
+
+def record_rank_audit_event(riot_id, league_data):
+    """
+    Write the rank audit event for a rank the app just refreshed. The processor skips
+    accounts refreshed recently (see rank_freshness.py), so their change is recorded here;
+    a reading the processor or the app already wrote (same fingerprint) is not written again.
+    """
+    reading = rank_reading_from_league_entries(league_data)
+    if reading is None:
+        return
+    fingerprint = rank_fingerprint(reading)
+    try:
+        if redis_client.hget(RANK_FINGERPRINT_KEY, riot_id) == fingerprint:
+            return
+    except Exception as e:
+        logger.warning(f"Redis error reading rank fingerprint for {riot_id}: {str(e)}")
+    
+    event = {
+        'riot_id': riot_id,
+        'elo': reading['elo'],
+        'wins': reading['wins'],
+        'losses': reading['losses'],
+        'created_at': datetime.now(timezone.utc).isoformat()
+    }
+    
+    def upsert_event():
+        return supabase.table('rank_audit_events').upsert(event, on_conflict=RANK_AUDIT_EVENT_KEY).execute()
+    
+    try:
+        response = execute_supabase_query_with_retry(upsert_event)
+    except Exception as e:
+        logger.error(f"Error recording rank audit event for riot_id {riot_id}: {str(e)}")
+        return
+    if not response or response.data is None:
+        logger.error(f"Failed to record rank audit event for riot_id {riot_id}")
+        return
+    
+    try:
+        redis_client.hset(RANK_FINGERPRINT_KEY, riot_id, fingerprint)
+    except Exception as e:
+        logger.warning(f"Redis error saving rank fingerprint for {riot_id}: {str(e)}")
+    mark_riot_ids_dirty(redis_client, append_events(redis_client, [event]))
+
+def _group_rank_refresh_key(group_id):
+    return f"group_rank_refresh:{group_id}"
+
+def group_rank_refresh_in_progress(group_id):
+    try:
+        return bool(redis_client.exists(_group_rank_refresh_key(group_id)))
+    except Exception as e:
+        logger.warning(f"Redis error checking rank refresh for group {group_id}: {str(e)}")
+        return False
+
+def refresh_account_rank(riot_account):
+    """Fetch one account's rank from Riot and store it with a fresh date_updated"""
+    riot_id = riot_account['riot_id']
+    league_response = league_cache.get(riot_account['region'], riot_id, lane=LANE_BACKGROUND)
+    if league_response.status_code != 200:
+        logger.error(f"Failed to fetch league data for riot_id {riot_id}: {league_response.status_code}")
+        return
+    
+    league_data = league_response.json()
+    update_data = {'date_updated': freshness_stamp()}
+    new_rank = rank_from_league_entries(league_data)
+    if new_rank != riot_account.get('rank'):
+        update_data['rank'] = new_rank
+    
+    def update_riot_account():
+        return supabase.table('riot_accounts').update(update_data).eq('riot_id', riot_id).execute()
+    
+    update_response = execute_supabase_query_with_retry(update_riot_account)
+    if 'rank' in update_data and update_response and update_response.data:
+        logger.info(f"Successfully updated rank for riot_id {riot_id} to '{new_rank}'")
+    record_rank_audit_event(riot_id, league_data)
+
+def run_group_rank_refresh(group_id, riot_accounts):
+    try:
+        for riot_account in riot_accounts:
+            try:
+                refresh_account_rank(riot_account)
+            except Exception as e:
+                logger.error(f"Error updating rank for riot_id {riot_account.get('riot_id')}: {str(e)}")
+    finally:
+        try:
+            redis_client.delete(_group_rank_refresh_key(group_id))
+        except Exception as e:
+            logger.warning(f"Redis error releasing rank refresh for group {group_id}: {str(e)}")
+
+def schedule_group_rank_refresh(group_id, riot_accounts):
+    """
+    Start a background rank refresh for the group's accounts whose rank is stale.
+    
+    At most one refresh per group runs at a time across all workers (Redis lock).
+    Returns True if a refresh is running for the group (started now or earlier).
+    """
+    stale_accounts = [
+        account for account in riot_accounts
+        if account.get('riot_id') and account.get('region') and not rank_is_fresh(account, CALLER_GROUP)
+    ]
+    if not stale_accounts:
+        return group_rank_refresh_in_progress(group_id)
+    
+    try:
+        started = redis_client.set(_group_rank_refresh_key(group_id), '1', nx=True, ex=GROUP_RANK_REFRESH_LOCK_TTL)
+    except Exception as e:
+        logger.warning(f"Redis error scheduling rank refresh for group {group_id}: {str(e)}")
+        return False
+    
+    if started:
+        logger.info(f"Refreshing ranks for {len(stale_accounts)} members of group {group_id} in the background")
+        rank_refresh_executor.submit(run_group_rank_refresh, group_id, stale_accounts)
+    return True
+
 @app.route('/api/study-groups/<int:group_id>/users', methods=['GET'])
 def get_study_group_users(group_id):
+    """
+    Get a study group's members with their stored ranks.
+    Query parameters:
+    - update_ranks: Set to 'false' to skip refreshing stale ranks (optional, default: true)
+    
+    Ranks are always answered from riot_accounts. Stale ones are refreshed by a background
+    job; rankRefreshInProgress tells the client to re-fetch shortly for the new values.
+    """
     # Check if rank updates are requested (default to True for backward compatibility)
     update_ranks = request.args.get('update_ranks', 'true').lower() == 'true'
     logger.info(f"Fetching users for group {group_id} with rank updates: {update_ranks}")
@@ -1324,108 +1540,29 @@ def get_study_group_users(group_id):
         response = execute_supabase_query_with_retry(get_members)
         
         if not response or not response.data:
-            return jsonify({'study_group_users': []})
+            return jsonify({'study_group_users': [], 'rankRefreshInProgress': False})
         
         # Get all riot_ids from the members
         riot_ids = [member['riot_id'] for member in response.data if member.get('riot_id')]
+        rank_poll_scheduler.mark_group_viewed(group_id, riot_ids)
         
         # Get riot account data for all members
         riot_accounts_map = {}
         if riot_ids:
             def get_riot_accounts():
-                return supabase.table('riot_accounts').select('rank, summoner_name, icon_id, riot_id, region').in_('riot_id', riot_ids).execute()
+                return supabase.table('riot_accounts').select('rank, summoner_name, icon_id, riot_id, region, date_updated').in_('riot_id', riot_ids).execute()
             
             riot_response = execute_supabase_query_with_retry(get_riot_accounts)
             if riot_response and riot_response.data:
                 for account in riot_response.data:
                     riot_accounts_map[account['riot_id']] = account
         
-        # OPTIMIZATION: Batch update ranks if requested (simplified version)
         if update_ranks:
-            # Update ranks sequentially but with optimized database queries
-            for member in response.data:
-                riot_id = member.get('riot_id')
-                riot_account = riot_accounts_map.get(riot_id)
-                if riot_account and riot_account.get('riot_id') and riot_account.get('region'):
-                    try:
-                        puuid = riot_account['riot_id']
-                        region = riot_account['region']
-                        current_rank = riot_account.get('rank', 'UNRANKED')
-                        
-                        logger.info(f"Updating rank for riot_id {riot_id} (puuid: {puuid}, region: {region})")
-                        
-                        # Use the region directly from the user's account
-                        league_url = f"https://{region}.api.riotgames.com/tft/league/v1/by-puuid/{puuid}"
-                        headers = {'X-Riot-Token': API_KEY}
-                        league_response = requests.get(league_url, headers=headers, timeout=10)
-                        
-                        if league_response.status_code == 200:
-                            league_data = league_response.json()
-                            
-                            # Find ranked TFT data
-                            new_rank = None
-                            for entry in league_data:
-                                if entry.get('queueType') == 'RANKED_TFT':
-                                    tier = entry.get('tier', 'UNRANKED')
-                                    rank_division = entry.get('rank', '')
-                                    league_points = entry.get('leaguePoints', 0)
-                                    if tier != 'UNRANKED':
-                                        new_rank = f"{tier} {rank_division} {league_points}LP"
-                                    else:
-                                        new_rank = 'UNRANKED'
-                                    break
-                            
-                            # If no ranked TFT found, check for turbo TFT
-                            if not new_rank:
-                                for entry in league_data:
-                                    if entry.get('queueType') == 'RANKED_TFT_TURBO':
-                                        rated_tier = entry.get('ratedTier', 'UNRANKED')
-                                        if rated_tier != 'UNRANKED':
-                                            new_rank = f"TURBO {rated_tier}"
-                                        else:
-                                            new_rank = 'UNRANKED'
-                                        break
-                            
-                            if not new_rank:
-                                new_rank = 'UNRANKED'
-                            
-                            # Update the rank in our map
-                            if new_rank != current_rank:
-                                current_time = datetime.now(timezone.utc).isoformat()
-                                update_data = {
-                                    'date_updated': current_time,
-                                    'rank': new_rank
-                                }
-                                
-                                def update_riot_account():
-                                    return supabase.table('riot_accounts').update(update_data).eq('riot_id', riot_id).execute()
-                                
-                                update_response = execute_supabase_query_with_retry(update_riot_account)
-                                if update_response and update_response.data:
-                                    logger.info(f"Successfully updated rank for riot_id {riot_id} to '{new_rank}'")
-                                    # Update our local map
-                                    if riot_id in riot_accounts_map:
-                                        riot_accounts_map[riot_id]['rank'] = new_rank
-                                else:
-                                    logger.error(f"Failed to update rank for riot_id {riot_id}")
-                            else:
-                                # Just update timestamp
-                                current_time = datetime.now(timezone.utc).isoformat()
-                                update_data = {'date_updated': current_time}
-                                
-                                def update_riot_account():
-                                    return supabase.table('riot_accounts').update(update_data).eq('riot_id', riot_id).execute()
-                                
-                                execute_supabase_query_with_retry(update_riot_account)
-                                
-                        else:
-                            logger.error(f"Failed to fetch league data for user {user_id}: {league_response.status_code}")
-                            
-                    except Exception as update_error:
-                        logger.error(f"Error updating rank for user {user_id}: {str(update_error)}")
-                        continue
+            rank_refresh_in_progress = schedule_group_rank_refresh(group_id, list(riot_accounts_map.values()))
+        else:
+            rank_refresh_in_progress = group_rank_refresh_in_progress(group_id)
         
-        # Build response using the optimized data
+        # Build response from stored ranks
         users_with_elo = []
         for member in response.data:
             elo = 0
@@ -1453,7 +1590,7 @@ def get_study_group_users(group_id):
             }
             users_with_elo.append(member_with_elo)
         
-        return jsonify({'study_group_users': users_with_elo})
+        return jsonify({'study_group_users': users_with_elo, 'rankRefreshInProgress': rank_refresh_in_progress})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -1461,23 +1598,218 @@ def get_study_group_users(group_id):
 
 @app.route('/api/match/<match_id>', methods=['GET'])
 def get_match_data(match_id):
+    """
+    Get a match: Riot's complete document by default.
+    Query parameters:
+    - slim: Set to 'true' for the stored summary instead (same structure as Riot's
+      document, per-participant placement/level/units/traits only), served from the
+      match store without calling Riot once the match is stored (optional, default: false)
+    """
     try:
-        url = f"{BASE_URL}/{match_id}"
-        headers = {'X-Riot-Token': API_KEY}
-        response = requests.get(url, headers=headers)
+        slim = request.args.get('slim', 'false').lower() == 'true'
+        
+        if slim:
+            stored_match = match_store.get_many([match_id]).get(match_id)
+            if stored_match is not None:
+                return jsonify(stored_match)
+        
+        response = riot_client.get_match('americas', match_id)
         if response.status_code == 200:
-            return jsonify(response.json())
+            match = parse_match(response.content)
+            match_store.put(match_id, match)
+            if slim:
+                return jsonify(slim_match(match))
+            # Riot's body as is, rather than serializing the parsed document again
+            return app.response_class(response.content, mimetype='application/json')
         else:
             return jsonify({'error': f'API request failed with status code {response.status_code}', 'message': response.text}), response.status_code
+    except RiotRateLimitError as e:
+        return riot_rate_limited_response(e)
     except requests.exceptions.RequestException as e:
         return jsonify({'error': 'Network error occurred', 'message': str(e)}), 500
     except Exception as e:
         return jsonify({'error': 'An unexpected error occurred', 'message': str(e)}), 500
 
+# Match history sync configuration
+MATCH_HISTORY_INITIAL_COUNT = 20  # matches fetched the first time we see a player
+MATCH_HISTORY_SYNC_COUNT = 100  # match ids asked for per page of a refresh
+MATCH_HISTORY_MAX_PAGE = 100  # largest page the endpoint will return
+
+def build_match_history_entry(match_id, match_data, puuid):
+    """Summarise one match from a player's point of view (None if they aren't in it)"""
+    # Find the player's data in the match
+    player_data = None
+    for participant in match_data['info']['participants']:
+        if participant['puuid'] == puuid:
+            player_data = participant
+            break
+    
+    if not player_data:
+        return None
+    
+    # Extract champions and their items
+    champions = []
+    for unit in player_data['units']:
+        champion_name = unit['character_id'].replace('TFT15_', '')
+        star_level = unit['tier'] if unit['tier'] <= 4 else 4
+        
+        champions.append({
+            'name': champion_name,
+            'stars': star_level,
+            'items': unit.get('itemNames', [])
+        })
+    
+    # Extract traits
+    traits = []
+    for trait in player_data['traits']:
+        if trait['tier_current'] > 0:  # Only include active traits
+            traits.append({
+                'name': trait['name'],
+                'num_units': trait['num_units'],
+                'tier_current': trait['tier_current'],
+                'tier_total': trait['tier_total']
+            })
+    
+    return {
+        'matchId': match_id,
+        'gameCreation': match_data['info']['gameCreation'],
+        'gameLength': match_data['info']['game_length'],
+        'placement': player_data['placement'],
+        'playerName': player_data['riotIdGameName'],
+        'champions': champions,
+        'traits': traits
+    }
+
+def ingest_match_history(puuid, match_region, match_ids):
+    """
+    Make sure the given matches are stored and in the player's stored history.
+    Returns ({match_id: gameCreation} of those now in the history, ids that failed to download).
+    """
+    if not match_ids:
+        return {}, []
+    
+    history = match_history.known(puuid, match_ids)
+    new_ids = [match_id for match_id in match_ids if match_id not in history]
+    matches = match_store.get_many(new_ids)
+    missing_ids = [match_id for match_id in match_ids if match_id not in matches]
+    
+    # Download matches we have never seen using parallel requests
+    def download_match(match_id):
+        try:
+            return match_id, match_store.download(match_region, match_id)
+        except Exception as e:
+            logger.error(f"Error downloading match {match_id}: {str(e)}")
+            return match_id, None
+    
+    if missing_ids:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
+            for match_id, match_data in executor.map(download_match, missing_ids):
+                if match_data:
+                    matches[match_id] = match_data
+    
+    # Matches that failed to download are left out so the next refresh retries them
+    added = {
+        match_id: match_data['info']['gameCreation']
+        for match_id, match_data in matches.items()
+    }
+    match_history.add(puuid, added)
+    history.update(added)
+    return history, [match_id for match_id in new_ids if match_id not in added]
+
+def sync_match_history(puuid, match_region):
+    """
+    Bring a player's stored history up to date, asking Riot only for matches after
+    the stored cursor. Returns the status code of the Riot match-ids calls.
+    
+    The cursor only moves once every page is read and every match in them stored;
+    otherwise the next refresh asks for the same range again (stored ids are skipped).
+    """
+    cursor = match_history.get_cursor(puuid)
+    if not cursor:
+        response = riot_client.get_match_ids(match_region, puuid, count=MATCH_HISTORY_INITIAL_COUNT)
+        if response.status_code != 200:
+            return response.status_code
+        match_ids = response.json() or []
+        history, failed_ids = ingest_match_history(puuid, match_region, match_ids)
+        if match_ids and not failed_ids:
+            newest_match_id = max(history, key=history.get)
+            match_history.set_newest(puuid, newest_match_id, history[newest_match_id])
+            match_history.set_oldest(puuid, min(history.values()))
+        if not failed_ids and len(match_ids) < MATCH_HISTORY_INITIAL_COUNT:
+            match_history.mark_exhausted(puuid)
+        return 200
+    
+    # startTime is in seconds; the newest known match comes back again and is skipped
+    newest_match_id, newest_game_creation = cursor['newest_match_id'], cursor['newest_game_creation']
+    complete = True
+    start = 0
+    while True:
+        response = riot_client.get_match_ids(
+            match_region, puuid,
+            count=MATCH_HISTORY_SYNC_COUNT,
+            start=start,
+            start_time=cursor['newest_game_creation'] // 1000
+        )
+        if response.status_code != 200:
+            return response.status_code
+        match_ids = response.json() or []
+        history, failed_ids = ingest_match_history(puuid, match_region, match_ids)
+        complete = complete and not failed_ids
+        for match_id, game_creation in history.items():
+            if game_creation > newest_game_creation:
+                newest_match_id, newest_game_creation = match_id, game_creation
+        if len(match_ids) < MATCH_HISTORY_SYNC_COUNT:
+            break
+        start += MATCH_HISTORY_SYNC_COUNT
+    
+    if complete:
+        match_history.set_newest(puuid, newest_match_id, newest_game_creation)
+    return 200
+
+def backfill_match_history(puuid, match_region, needed):
+    """
+    Extend a player's stored history with matches older than the backfill cursor.
+    
+    Older matches are asked for by time (endTime) rather than by offset, so gaps in
+    the stored history or new games played meanwhile don't shift the range. The
+    cursor moves down to the oldest match stored with nothing missing above it.
+    """
+    cursor = match_history.get_cursor(puuid)
+    oldest_game_creation = cursor['oldest_game_creation'] or match_history.oldest_stored(puuid)
+    if oldest_game_creation is None:
+        return
+    response = riot_client.get_match_ids(match_region, puuid, count=needed, end_time=oldest_game_creation // 1000)
+    if response.status_code != 200:
+        return
+    
+    match_ids = response.json() or []
+    history, failed_ids = ingest_match_history(puuid, match_region, match_ids)
+    
+    # Ids come newest first: stop at the first one that didn't download, so it's asked for again
+    for match_id in match_ids:
+        if match_id not in history:
+            break
+        oldest_game_creation = min(oldest_game_creation, history[match_id])
+    match_history.set_oldest(puuid, oldest_game_creation)
+    
+    if not failed_ids and len(match_ids) < needed:
+        match_history.mark_exhausted(puuid)
+
 @app.route('/api/match-history/<puuid>', methods=['GET'])
 def get_match_history(puuid):
+    """
+    Get a player's match history from their stored history, newest first.
+    Query parameters:
+    - region: server or routing region (optional, default: americas)
+    - start: offset into the history (optional, default: 0)
+    - count: number of matches to return (optional, default: 20, max: 100)
+    - refresh: set to 'false' to skip asking Riot for new matches (optional, default: true)
+    """
     try:
         region = request.args.get('region', 'americas')
+        start = max(0, request.args.get('start', 0, type=int))
+        count = min(max(1, request.args.get('count', MATCH_HISTORY_INITIAL_COUNT, type=int)), MATCH_HISTORY_MAX_PAGE)
+        refresh = request.args.get('refresh', 'true').lower() == 'true'
         
         # Map server regions to routing regions for Riot API
         # Server regions: na1, br1, la1, la2, kr1, jp1, euw1, eun1, tr1, ru1, oc1, ph2, sg2, th2, tw2, vn2
@@ -1498,96 +1830,46 @@ def get_match_history(puuid):
         print(f"Received region: {region}, mapped to: {server_to_routing_mapping.get(region, 'americas')}")
         match_region = server_to_routing_mapping.get(region, 'americas')
         
-        # Get match IDs from Riot API
-        match_ids_url = f"https://{match_region}.api.riotgames.com/tft/match/v1/matches/by-puuid/{puuid}/ids"
-        headers = {'X-Riot-Token': API_KEY}
-        
-        # Get the last 20 matches
-        params = {'count': 20}
-        response = requests.get(match_ids_url, headers=headers, params=params)
-        
-        if response.status_code != 200:
-            return jsonify({'error': f'Failed to fetch match IDs: {response.status_code}'}), response.status_code
-        
-        match_ids = response.json()
+        # Only matches newer than the stored cursor are fetched from Riot
+        if refresh:
+            status_code = sync_match_history(puuid, match_region)
+            if status_code != 200 and match_history.count(puuid) == 0:
+                return jsonify({'error': f'Failed to fetch match IDs: {status_code}'}), status_code
         
-        if not match_ids:
-            return jsonify({'matches': []})
+        # Pages past the end of the stored history pull older matches once, then stay stored
+        stored_count = match_history.count(puuid)
+        cursor = match_history.get_cursor(puuid)
+        if start + count > stored_count and cursor and not cursor['exhausted']:
+            backfill_match_history(puuid, match_region, start + count - stored_count)
+            stored_count = match_history.count(puuid)
+            cursor = match_history.get_cursor(puuid)
+        older_matches_available = bool(cursor) and not cursor['exhausted']
         
-        # Get detailed match data for each match ID using parallel requests
-        def fetch_match_data(match_id):
-            try:
-                match_url = f"https://{match_region}.api.riotgames.com/tft/match/v1/matches/{match_id}"
-                match_response = requests.get(match_url, headers=headers)
-                
-                if match_response.status_code == 200:
-                    match_data = match_response.json()
-                    
-                    # Find the player's data in the match
-                    player_data = None
-                    for participant in match_data['info']['participants']:
-                        if participant['puuid'] == puuid:
-                            player_data = participant
-                            break
-                    
-                    if player_data:
-                        # Extract champions and their items
-                        champions = []
-                        for unit in player_data['units']:
-                            champion_name = unit['character_id'].replace('TFT15_', '')
-                            star_level = unit['tier'] if unit['tier'] <= 4 else 4
-                            
-                            champions.append({
-                                'name': champion_name,
-                                'stars': star_level,
-                                'items': unit.get('itemNames', [])
-                            })
-                        
-                        # Extract traits
-                        traits = []
-                        for trait in player_data['traits']:
-                            if trait['tier_current'] > 0:  # Only include active traits
-                                traits.append({
-                                    'name': trait['name'],
-                                    'num_units': trait['num_units'],
-                                    'tier_current': trait['tier_current'],
-                                    'tier_total': trait['tier_total']
-                                })
-                        
-                        return {
-                            'matchId': match_id,
-                            'gameCreation': match_data['info']['gameCreation'],
-                            'gameLength': match_data['info']['game_length'],
-                            'placement': player_data['placement'],
-                            'playerName': player_data['riotIdGameName'],
-                            'champions': champions,
-                            'traits': traits
-                        }
-                
-                return None
-                
-            except Exception as e:
-                return None
-
-        # Use concurrent.futures to parallelize the requests
-        import concurrent.futures
+        match_ids = match_history.page(puuid, start, count)
+        stored_matches = match_store.get_many(match_ids)
         
         matches = []
-        with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
-            # Submit all match data requests
-            future_to_match_id = {executor.submit(fetch_match_data, match_id): match_id for match_id in match_ids}
-            
-            # Collect results as they complete
-            for future in concurrent.futures.as_completed(future_to_match_id):
-                match_data = future.result()
-                if match_data:
-                    matches.append(match_data)
+        for match_id in match_ids:
+            match_data = stored_matches.get(match_id)
+            if not match_data:
+                continue
+            entry = build_match_history_entry(match_id, match_data, puuid)
+            if entry:
+                matches.append(entry)
         
         # Sort matches by game creation time (newest first)
         matches.sort(key=lambda x: x['gameCreation'], reverse=True)
         
-        return jsonify({'matches': matches})
+        return jsonify({
+            'matches': matches,
+            'start': start,
+            'count': count,
+            'total': stored_count,
+            'hasMore': start + count < stored_count or older_matches_available
+        })
         
+    except RiotRateLimitError as e:
+        return riot_rate_limited_response(e)
     except requests.exceptions.RequestException as e:
         return jsonify({'error': 'Network error occurred', 'message': str(e)}), 500
     except Exception as e:
@@ -1605,19 +1887,13 @@ def connect_riot_account():
             return jsonify({'error': 'gameName and tagLine are required'}, 400)
         
         # Use region-specific API endpoint
-        if region == 'asia':
-            riot_account_url = f"https://asia.api.riotgames.com/riot/account/v1/accounts/by-riot-id"
-        elif region == 'europe':
-            riot_account_url = f"https://europe.api.riotgames.com/riot/account/v1/accounts/by-riot-id"
+        if region in ('asia', 'europe'):
+            account_region = region
         else:  # americas (default)
-            riot_account_url = f"https://americas.api.riotgames.com/riot/account/v1/accounts/by-riot-id"
+            account_region = 'americas'
         
         # Call Riot API to get account data
-        
-        url = f"{riot_account_url}/{game_name}/{tag_line}"
- 
-        headers = {'X-Riot-Token': API_KEY}
-        response = requests.get(url, headers=headers)
+        response = riot_client.get_account_by_riot_id(account_region, game_name, tag_line)
         
         if response.status_code == 200:
             riot_data = response.json()
@@ -1629,8 +1905,7 @@ def connect_riot_account():
             print(f"Riot ID: {riot_id}")
             
             # Get user's region from Riot API
-            region_url = f"https://{region}.api.riotgames.com/riot/account/v1/region/by-game/tft/by-puuid/{puuid}"
-            region_response = requests.get(region_url, headers=headers)
+            region_response = riot_client.get_account_region(region, puuid)
             if region_response.status_code == 200:
                 region_data = region_response.json()
                 user_region = region_data.get('region', region)  # Use selected region as fallback
@@ -1643,8 +1918,7 @@ def connect_riot_account():
             rank = None
             try:
                 # Use the region directly from the user's account (no mapping needed for TFT league API)
-                league_url = f"https://{user_region}.api.riotgames.com/tft/league/v1/by-puuid/{puuid}"
-                league_response = requests.get(league_url, headers=headers)
+                league_response = riot_client.get_league_by_puuid(user_region, puuid)
                 if league_response.status_code == 200:
                     league_data = league_response.json()
                     # Find ranked TFT data
@@ -1675,8 +1949,7 @@ def connect_riot_account():
             # Fetch summoner data to get profile icon
             icon_id = None
             try:
-                summoner_url = f"https://{user_region}.api.riotgames.com/tft/summoner/v1/summoners/by-puuid/{puuid}"
-                summoner_response = requests.get(summoner_url, headers=headers)
+                summoner_response = riot_client.get_summoner_by_puuid(user_region, puuid)
                 if summoner_response.status_code == 200:
                     summoner_data = summoner_response.json()
                     icon_id = summoner_data.get('profileIconId')
@@ -1749,6 +2022,8 @@ def connect_riot_account():
                 'message': response.text
             }), response.status_code
             
+    except RiotRateLimitError as e:
+        return riot_rate_limited_response(e)
     except requests.exceptions.RequestException as e:
         print(f"Request exception in connect_riot_account: {e}")
         return jsonify({'error': 'Network error occurred', 'message': str(e)}), 500
@@ -1773,18 +2048,13 @@ def riot_login():
             return jsonify({'error': 'gameName and tagLine are required'}), 400
         
         # Use region-specific API endpoint
-        # Call actual Riot API to get account data
-        if region == 'asia':
-            riot_account_url = f"https://asia.api.riotgames.com/riot/account/v1/accounts/by-riot-id"
-        elif region == 'europe':
-            riot_account_url = f"https://europe.api.riotgames.com/riot/account/v1/accounts/by-riot-id"
+        if region in ('asia', 'europe'):
+            account_region = region
         else:  # americas (default)
-            riot_account_url = f"https://americas.api.riotgames.com/riot/account/v1/accounts/by-riot-id"
+            account_region = 'americas'
         
-        # Call Riot API to get account data
-        url = f"{riot_account_url}/{game_name}/{tag_line}"
-        headers = {'X-Riot-Token': API_KEY}
-        response = requests.get(url, headers=headers)
+        # Call actual Riot API to get account data
+        response = riot_client.get_account_by_riot_id(account_region, game_name, tag_line)
         
         if response.status_code != 200:
             return jsonify({'error': 'Invalid Riot ID or region'}), 400
@@ -1794,8 +2064,7 @@ def riot_login():
         riot_id = f"{riot_data.get('gameName')}#{riot_data.get('tagLine')}"
         
         # Get user's region from Riot API
-        region_url = f"https://{region}.api.riotgames.com/riot/account/v1/region/by-game/tft/by-puuid/{puuid}"
-        region_response = requests.get(region_url, headers=headers)
+        region_response = riot_client.get_account_region(region, puuid)
         
         if region_response.status_code == 200:
             region_data = region_response.json()
@@ -1894,8 +2163,7 @@ def riot_login():
                 
                 # Use the same pattern as existing working code - direct PUUID-based league endpoint
                 # Use the user's actual region (e.g., na1) directly
-                league_url = f"https://{user_region}.api.riotgames.com/tft/league/v1/by-puuid/{puuid}"
-                league_response = requests.get(league_url, headers=headers)
+                league_response = riot_client.get_league_by_puuid(user_region, puuid)
                 
                 if league_response.status_code == 200:
                     league_data = league_response.json()
@@ -1938,6 +2206,8 @@ def riot_login():
                 }
             })
             
+    except RiotRateLimitError as e:
+        return riot_rate_limited_response(e)
     except requests.exceptions.RequestException as e:
         return jsonify({'error': 'Network error occurred', 'message': str(e)}), 500
     except Exception as e:
@@ -2149,10 +2419,12 @@ def get_tft_league_data(puuid):
         user_id = request.args.get('user_id')
         
         # Try to get region from riot_accounts table using PUUID first
+        stored_account = None
         try:
-            riot_account_response = supabase.table('riot_accounts').select('region').eq('riot_id', puuid).execute()
+            riot_account_response = supabase.table('riot_accounts').select('region, date_updated').eq('riot_id', puuid).execute()
             if riot_account_response.data and len(riot_account_response.data) > 0:
-                server_region = riot_account_response.data[0].get('region', 'americas')
+                stored_account = riot_account_response.data[0]
+                server_region = stored_account.get('region', 'americas')
             else:
                 server_region = request.args.get('region', 'americas')
         except Exception as e:
@@ -2180,11 +2452,13 @@ def get_tft_league_data(puuid):
         
         print(f"TFT League - Using server region directly: {server_region}")
         
-        url = f"https://{server_region}.api.riotgames.com/tft/league/v1/by-puuid/{puuid}"
-        headers = {'X-Riot-Token': API_KEY}
+        # A recently refreshed account is served from the shared league snapshot and not rewritten
+        rank_fresh = stored_account is not None and rank_is_fresh(stored_account, CALLER_INTERACTIVE)
         
         try:
-            response = requests.get(url, headers=headers, timeout=10)
+            response = (rank_fresh and league_cache.peek(server_region, puuid)) or league_cache.get(server_region, puuid)
+        except RiotRateLimitError as e:
+            return riot_rate_limited_response(e)
         except requests.exceptions.Timeout:
             return jsonify({
                 'error': 'Request timeout',
@@ -2204,9 +2478,7 @@ def get_tft_league_data(puuid):
             
             # Update rank and date_updated in database if the account exists
             try:
-                # Check if account exists in riot_accounts table using puuid
-                account_check = supabase.table('riot_accounts').select('*').eq('riot_id', puuid).execute()
-                if account_check.data and len(account_check.data) > 0:
+                if stored_account is not None and not rank_fresh:
                     # Account exists, update their rank and date_updated
                     rank = None
                     # Find ranked TFT data
@@ -2232,13 +2504,12 @@ def get_tft_league_data(puuid):
                                 break
                     
                     # Update the rank and date_updated in the database
-                    current_time = datetime.now(timezone.utc).isoformat()
-                    
-                    update_data = {'date_updated': current_time}
+                    update_data = {'date_updated': freshness_stamp()}
                     if rank is not None:
                         update_data['rank'] = rank
                     
                     supabase.table('riot_accounts').update(update_data).eq('riot_id', puuid).execute()
+                    record_rank_audit_event(puuid, league_data)
             except Exception as e:
                 # Continue with the response even if update fails
                 pass
@@ -2527,23 +2798,20 @@ def update_riot_account_rank_by_puuid(puuid):
             return jsonify({'error': 'Riot account not found'}), 404
         
         account = account_response.data[0]
-        region = account.get('region', 'americas')
+        region = account.get('region', 'na1')
         
-        # Map region to routing region for TFT league API
-        routing_region = region
-        if region == 'na1':
-            routing_region = 'americas'
-        elif region == 'euw1':
-            routing_region = 'europe'
-        elif region == 'kr':
-            routing_region = 'asia'
+        if rank_is_fresh(account, CALLER_INTERACTIVE):
+            return jsonify({
+                'success': True,
+                'message': 'Rank is already up to date',
+                'rank': account.get('rank')
+            })
         
-        # Fetch TFT league data to get rank
+        # Fetch TFT league data to get rank (league API is served by the platform region, e.g. na1)
         rank = None
+        league_data = None
         try:
-            league_url = f"https://{routing_region}.api.riotgames.com/tft/league/v1/by-puuid/{puuid}"
-            headers = {'X-Riot-Token': API_KEY}
-            league_response = requests.get(league_url, headers=headers)
+            league_response = league_cache.get(region, puuid)
             
             if league_response.status_code == 200:
                 league_data = league_response.json()
@@ -2572,7 +2840,12 @@ def update_riot_account_rank_by_puuid(puuid):
             rank = None
         
         # Update the rank in the database
-        update_response = supabase.table('riot_accounts').update({'rank': rank}).eq('riot_id', puuid).execute()
+        update_data = {'rank': rank}
+        if rank is not None:
+            update_data['date_updated'] = freshness_stamp()
+        update_response = supabase.table('riot_accounts').update(update_data).eq('riot_id', puuid).execute()
+        if rank is not None:
+            record_rank_audit_event(puuid, league_data)
         
         if update_response.data:
             return jsonify({
@@ -2601,15 +2874,15 @@ def update_riot_account_icon_by_puuid(puuid):
         # Fetch summoner data to get profile icon ID
         icon_id = None
         try:
-            summoner_url = f"https://{region}.api.riotgames.com/tft/summoner/v1/summoners/by-puuid/{puuid}"
-            headers = {'X-Riot-Token': API_KEY}
-            summoner_response = requests.get(summoner_url, headers=headers)
+            summoner_response = riot_client.get_summoner_by_puuid(region, puuid)
             
             if summoner_response.status_code == 200:
                 summoner_data = summoner_response.json()
                 icon_id = summoner_data.get('profileIconId')
             else:
                 return jsonify({'error': 'Failed to fetch summoner data'}), summoner_response.status_code
+        except RiotRateLimitError as e:
+            return riot_rate_limited_response(e)
         except Exception as e:
             return jsonify({'error': 'Failed to fetch summoner data'}), 500
         
@@ -3063,9 +3336,7 @@ def get_free_agents():
 def get_summoner_data(puuid):
     try:
         region = request.args.get('region', 'americas')
-        url = f"https://{region}.api.riotgames.com/tft/summoner/v1/summoners/by-puuid/{puuid}"
-        headers = {'X-Riot-Token': API_KEY}
-        response = requests.get(url, headers=headers)
+        response = riot_client.get_summoner_by_puuid(region, puuid)
         
         if response.status_code == 200:
             summoner_data = response.json()
@@ -3076,6 +3347,8 @@ def get_summoner_data(puuid):
                 'message': response.text
             }), response.status_code
             
+    except RiotRateLimitError as e:
+        return riot_rate_limited_response(e)
     except requests.exceptions.RequestException as e:
         return jsonify({'error': 'Network error occurred', 'message': str(e)}), 500
     except Exception as e:
@@ -3311,6 +3584,7 @@ def respond_to_invite(invite_id):
                 }).execute()
             
             add_response = execute_supabase_query_with_retry(add_to_group)
+            mark_groups_dirty(redis_client, [invite_data['study_group_id']])
             
             if not add_response or not add_response.data:
                 return jsonify({'error': 'Failed to add user to study group'}), 500
@@ -3462,7 +3736,86 @@ def get_team_stats():
         logger.error(f"Error getting team stats: {str(e)}")
         return jsonify({'error': 'Failed to get team stats', 'details': str(e)}), 500
 
-def fetch_live_data_for_group(group_id):
+def fetch_member_live_data(riot_account):
+    """Current ranked TFT data for one member, or None if they have none"""
+    riot_id = riot_account['riot_id']
+    summoner_name = riot_account['summoner_name']
+    region = riot_account.get('region') or 'na1'
+    
+    league_response = league_cache.get(region, riot_id)
+    if league_response.status_code != 200:
+        logger.warn(f"Failed to fetch league data for {summoner_name}: {league_response.status_code}")
+        return None
+    
+    # Find Ranked TFT data (not Turbo)
+    ranked_data = None
+    for entry in league_response.json():
+        if entry.get('queueType') == 'RANKED_TFT':
+            ranked_data = entry
+            break
+    
+    if not ranked_data:
+        return None
+    
+    tier = ranked_data.get('tier', '').lower()
+    rank = ranked_data.get('rank', '')
+    league_points = ranked_data.get('leaguePoints', 0)
+    
+    return {
+        'riot_id': riot_id,
+        'summoner_name': summoner_name,
+        'tier': tier,
+        'rank': rank,
+        'leaguePoints': league_points,
+        'wins': ranked_data.get('wins', 0),
+        'losses': ranked_data.get('losses', 0),
+        'elo': _calculate_elo(tier, rank, league_points),
+        'created_at': datetime.now().isoformat(),
+        'isLive': True
+    }
+
+def fetch_live_data_for_accounts(riot_accounts, previous_live_data=None, deadline=GROUP_LIVE_DATA_DEADLINE):
+    """
+    Fetch live data for many members concurrently, giving up after `deadline` seconds.
+    
+    Members whose lookup did not finish in time (or hit the Riot rate limit) are returned
+    with 'stale': True, carrying their previous live data when we have it. Lookups still
+    running keep going in the background and land in the league cache for the next request.
+    """
+    futures = {
+        live_data_executor.submit(fetch_member_live_data, account): account
+        for account in riot_accounts
+        if account.get('riot_id')
+    }
+    done, not_done = concurrent.futures.wait(futures, timeout=deadline)
+    
+    live_data = {}
+    stale_accounts = [futures[future] for future in not_done]
+    for future in done:
+        account = futures[future]
+        try:
+            member_live_data = future.result()
+            if member_live_data:
+                live_data[account['summoner_name']] = member_live_data
+        except RiotRateLimitError:
+            stale_accounts.append(account)
+        except Exception as e:
+            logger.error(f"Error fetching live data for {account['summoner_name']}: {str(e)}")
+    
+    for account in stale_accounts:
+        summoner_name = account['summoner_name']
+        stale_entry = dict((previous_live_data or {}).get(summoner_name) or {
+            'riot_id': account['riot_id'],
+            'summoner_name': summoner_name
+        })
+        stale_entry.update({'isLive': False, 'stale': True})
+        live_data[summoner_name] = stale_entry
+    
+    if stale_accounts:
+        logger.warning(f"Live data incomplete: {len(stale_accounts)} of {len(futures)} members marked stale")
+    return live_data
+
+def fetch_live_data_for_group(group_id, previous_live_data=None):
     """Fetch live data from Riot API for all members in a group"""
     try:
         # Get all users in the study group with their riot accounts
@@ -3476,73 +3829,59 @@ def fetch_live_data_for_group(group_id):
         if not members_response or not members_response.data:
             return {}
         
-        live_data = {}
-        
-        for member in members_response.data:
-            user_id = member['user_id']
-            riot_account = member.get('riot_accounts')
-            
-            if not riot_account or not riot_account.get('riot_id'):
-                continue
-            
-            riot_id = riot_account['riot_id']
-            summoner_name = riot_account['summoner_name']
-            region = riot_account.get('region', 'na1')
-            
-            try:
-                # Fetch league data from Riot API
-                league_url = f"https://{region}.api.riotgames.com/tft/league/v1/by-puuid/{riot_id}"
-                headers = {
-                    'X-Riot-Token': API_KEY
-                }
-                
-                league_response = requests.get(league_url, headers=headers, timeout=10)
-                
-                if league_response.status_code == 200:
-                    league_data = league_response.json()
-                    
-                    # Find Ranked TFT data (not Turbo)
-                    ranked_data = None
-                    for entry in league_data:
-                        if entry.get('queueType') == 'RANKED_TFT':
-                            ranked_data = entry
-                            break
-                    
-                    if ranked_data:
-                        # Convert rank to ELO
-                        tier = ranked_data.get('tier', '').lower()
-                        rank = ranked_data.get('rank', '')
-                        league_points = ranked_data.get('leaguePoints', 0)
-                        wins = ranked_data.get('wins', 0)
-                        losses = ranked_data.get('losses', 0)
-                        
-                        # Calculate ELO (simplified version)
-                        elo = _calculate_elo(tier, rank, league_points)
-                        
-                        # Create live data point
-                        live_data[summoner_name] = {
-                            'riot_id': riot_id,
-                            'summoner_name': summoner_name,
-                            'tier': tier,
-                            'rank': rank,
-                            'leaguePoints': league_points,
-                            'wins': wins,
-                            'losses': losses,
-                            'elo': elo,
-                            'created_at': datetime.now().isoformat(),
-                            'isLive': True
-                        }
-                        
-            except Exception as e:
-                logger.error(f"Error fetching live data for {summoner_name}: {str(e)}")
-                continue
-        
-        return live_data
+        riot_accounts = [member['riot_accounts'] for member in members_response.data if member.get('riot_accounts')]
+        return fetch_live_data_for_accounts(riot_accounts, previous_live_data)
         
     except Exception as e:
         logger.error(f"Error in fetch_live_data_for_group: {str(e)}")
         return {}
 
+def execute_page_with_retry(query):
+    """Run one page of a streamed read (see rank_event_stream.py) with connection retries"""
+    return execute_supabase_query_with_retry(query.execute)
+
+def load_member_events(riot_id_to_name, refresh=False):
+    """
+    Chart events of these members, composed from their cached series with one MGET (see
+    member_series_cache.py). Series not cached (all of them, with refresh) are built from
+    the daily rollup, or from streamed raw events without it, and cached.
+    Returns (events, per-member series version and timestamps).
+    """
+    riot_ids = list(riot_id_to_name)
+    series, missing = {}, set(riot_ids)
+    if not refresh:
+        try:
+            series, missing = load_series(redis_client, riot_ids)
+        except Exception as e:
+            logger.warning(f"Redis cache error reading member series: {str(e)}")
+    
+    if missing:
+        missing_ids = sorted(missing)
+        events = load_daily_rank_events(missing_ids)
+        if events is None:
+            events = smart_filter_chunks(iter_rank_event_pages(supabase, missing_ids, execute=execute_page_with_retry))
+        built = series_from_events(events, missing_ids)
+        series.update(built)
+        try:
+            pipe = redis_client.pipeline(transaction=False)
+            store_series(pipe, built)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Failed to cache member series for {len(built)} members: {str(e)}")
+    
+    return compose_group_events(series, riot_id_to_name), series_freshness(series)
+
+def load_daily_rank_events(riot_ids, days=RANK_AUDIT_DAILY_DAYS):
+    """
+    Chart events (one per member per day, last `days` days) from the rank_audit_daily
+    rollup, or None when the rollup can't be read and callers should filter raw events.
+    """
+    try:
+        return execute_supabase_query_with_retry(lambda: fetch_daily_rank_events(supabase, riot_ids, days))
+    except Exception as e:
+        logger.warning(f"rank_audit_daily unavailable, reading raw rank audit events: {str(e)}")
+        return None
+
 @app.route('/api/team-stats/members', methods=['GET'])
 def get_member_stats():
     """
@@ -3572,17 +3911,23 @@ def get_member_stats():
                 if cached_data:
                     logger.warning(f"Redis cache hit for group {group_id}")
                     cache_data = json.loads(cached_data)
+                    cache_data['events'], cache_data['memberSeries'] = load_member_events(cache_data['memberNames'])
+                    # Series are updated in place as events land: the response is as fresh
+                    # as the most recently written of them
+                    cache_data['cached_at'] = max(
+                        [cache_data.get('cached_at') or ''] +
+                        [member['cached_at'] for member in cache_data['memberSeries'].values()]
+                    )
                     
                     # If live data is requested, we need to fetch it separately
                     if include_members:
                         logger.warning(f"Redis cache hit but live data requested for group {group_id}, fetching live data...")
-                        live_data = fetch_live_data_for_group(group_id)
+                        live_data = fetch_live_data_for_group(group_id, cache_data.get('liveData'))
                         cache_data['liveData'] = live_data
                         
                         # Update the cache with the fresh live data
                         try:
                             updated_cache_data = {
-                                "events": cache_data['events'],
                                 "memberNames": cache_data['memberNames'],
                                 "liveData": live_data,
                                 "cached_at": datetime.now(timezone.utc).isoformat()
@@ -3650,222 +3995,15 @@ def get_member_stats():
         if not riot_ids:
             return jsonify({'error': 'No valid Riot IDs found for group members'}), 404
         
-        # Get rank audit events for these riot_ids (removed start_date filter to show all available data)
-        logger.info(f"Fetching all available events for group members (no start_date filter)")
-        
-        def get_rank_events():
-            return supabase.table('rank_audit_events').select('*').in_('riot_id', riot_ids).order('created_at').execute()
-        
-        events_response = execute_supabase_query_with_retry(get_rank_events)
-        
-        if not events_response:
-            events_response = {'data': []}  # Return empty array if table doesn't exist yet
-        
-        events = events_response.data or []
-        
-        # Optimize events data for frontend processing
-        logger.info(f"Processing {len(events)} raw events for optimization")
-        
-        # Group events by riot_id and apply smart filtering per day
-        optimized_events = []
-        events_by_riot_id = {}
-        
-        # Get current date for comparison (use local timezone for proper day grouping)
-        import pytz
-        
-        # Use a common timezone (e.g., US Eastern) or you could make this configurable
-        # For now, let's use UTC but we'll convert dates to local time for grouping
-        current_utc = datetime.now(timezone.utc)
-        
-        # Convert to a reasonable timezone for date grouping
-        # You might want to make this configurable based on user preference
-        # Try different common US timezones to handle the issue properly
-        timezone_to_try = ['America/New_York', 'America/Chicago', 'America/Denver', 'America/Los_Angeles', 'America/Phoenix']
-        local_tz = pytz.UTC  # Default fallback
-        
-        # For this fix, let's use Pacific Time as it seems to match your scenario better
-        try:
-            local_tz = pytz.timezone('America/Los_Angeles')  # Pacific Time
-        except:
-            # Fallback to UTC if timezone is not available
-            local_tz = pytz.UTC
-        current_local = current_utc.astimezone(local_tz)
-        current_date = current_local.date().isoformat()
-        
-        # First, group all events by riot_id and date (converted to local timezone)
-        for event in events:
-            riot_id = event['riot_id']
-            if riot_id not in events_by_riot_id:
-                events_by_riot_id[riot_id] = {}
-            
-            # Parse the date and convert to local timezone for proper grouping
-            try:
-                # Parse the UTC timestamp
-                event_utc = datetime.fromisoformat(event['created_at'].replace('Z', '+00:00'))
-                
-                # Convert to local timezone for date grouping
-                event_local = event_utc.astimezone(local_tz)
-                event_date = event_local.date().isoformat()  # YYYY-MM-DD in local time
-                
-                if event_date not in events_by_riot_id[riot_id]:
-                    events_by_riot_id[riot_id][event_date] = []
-                
-                events_by_riot_id[riot_id][event_date].append(event)
-            except (KeyError, AttributeError, ValueError) as e:
-                logger.warn(f"Skipping invalid event: {e}")
-                continue
-        
-        # Now apply smart filtering: keep only one event per day per user
-        logger.info(f"Applying smart filtering for {len(events_by_riot_id)} users")
-        for riot_id, dates in events_by_riot_id.items():
-            logger.info(f"Processing user {riot_id} with {len(dates)} unique dates")
-            for event_date, day_events in dates.items():
-                if not day_events:
-                    continue
-                
-                # Check if this is today
-                is_today = event_date == current_date
-                
-                if len(day_events) > 1:
-                    logger.info(f"  Date {event_date} has {len(day_events)} events (is_today: {is_today})")
-                    for i, event in enumerate(day_events):
-                        logger.info(f"    Event {i+1}: {event['created_at']} | ELO: {event['elo']}")
-                
-                if is_today:
-                    # For today, keep the most recent (latest) event
-                    selected_event = max(day_events, key=lambda x: x['created_at'])
-                    logger.info(f"  Selected for today: {selected_event['created_at']} | ELO: {selected_event['elo']}")
-                else:
-                    # For other days, keep the highest ELO event
-                    selected_event = max(day_events, key=lambda x: x['elo'])
-                    logger.info(f"  Selected for historical: {selected_event['created_at']} | ELO: {selected_event['elo']}")
-                
-                # Add the selected event to optimized events
-                optimized_events.append({
-                    'riot_id': riot_id,
-                    'summoner_name': riot_id_to_name.get(riot_id, riot_id),
-                    'created_at': selected_event['created_at'],
-                    'elo': selected_event['elo'],
-                    'wins': selected_event['wins'],
-                    'losses': selected_event['losses']
-                })
-        
-        # Sort optimized events by created_at
-        optimized_events.sort(key=lambda x: x['created_at'])
-        
-        # The smart filtering already ensures one event per day per user
-        # Just limit the total number of events per user to prevent huge responses
-        MAX_EVENTS_PER_USER = 50
-        limited_events = []
-        events_per_user = {}
-        
-        for event in optimized_events:
-            riot_id = event['riot_id']
-            if riot_id not in events_per_user:
-                events_per_user[riot_id] = []
-            events_per_user[riot_id].append(event)
-        
-        # Keep only the most recent events for each user (smart filtering already applied)
-        for riot_id, user_events in events_per_user.items():
-            # Sort by created_at (most recent first) and take the latest MAX_EVENTS_PER_USER
-            user_events.sort(key=lambda x: x['created_at'], reverse=True)
-            limited_events.extend(user_events[:MAX_EVENTS_PER_USER])
-        
-        # Sort all events chronologically for final response
-        limited_events.sort(key=lambda x: x['created_at'])
-        
-        logger.info(f"Optimized events: {len(limited_events)} (reduced from {len(events)}, max {MAX_EVENTS_PER_USER} per user, smart filtering: highest ELO for historical days, most recent for current day)")
-        events = limited_events
+        # Composed from each member's cached series; series not cached yet (or all of them,
+        # with force_refresh) are built from the daily rollup or streamed raw events
+        events, member_series = load_member_events(riot_id_to_name, refresh=force_refresh)
         
         # Only fetch live data if explicitly requested
         live_data = {}
         if include_members:
             logger.info(f"Fetching live data for {len(riot_ids)} members")
-            
-            for riot_id in riot_ids:
-                try:
-                    # Find the riot account data we already fetched
-                    riot_account = next((account for account in riot_response.data if account['riot_id'] == riot_id), None)
-                    if not riot_account:
-                        logger.warn(f"No riot account found for riot_id {riot_id}")
-                        continue
-                    
-                    summoner_name = riot_account['summoner_name']
-                    region = riot_account.get('region', 'na1')  # Default to na1 if region not set
-                    
-                    # Fetch league data from Riot API
-                    try:
-                        import requests
-                        
-                        # Use the correct TFT league endpoint with PUUID
-                        league_url = f"https://{region}.api.riotgames.com/tft/league/v1/by-puuid/{riot_id}"
-                        headers = {
-                            'X-Riot-Token': API_KEY
-                        }
-                        
-                        logger.info(f"🔍 Fetching league data for {summoner_name} (puuid: {riot_id})")
-                        logger.info(f"🔗 League URL: {league_url}")
-                        logger.info(f"🔑 Using API key: {API_KEY[:10]}...")
-                        
-                        league_response = requests.get(league_url, headers=headers, timeout=10)
-                        logger.info(f"📡 League response status: {league_response.status_code}")
-                        
-                        if league_response.status_code == 200:
-                            league_data = league_response.json()
-                            logger.info(f"📊 League data received: {league_data}")
-                            
-                            # Find Ranked TFT data (not Turbo)
-                            ranked_data = None
-                            for entry in league_data:
-                                if entry.get('queueType') == 'RANKED_TFT':
-                                    ranked_data = entry
-                                    break
-                            
-                            if ranked_data:
-                                # Convert rank to ELO
-                                tier = ranked_data.get('tier', '').lower()
-                                rank = ranked_data.get('rank', '')
-                                league_points = ranked_data.get('leaguePoints', 0)
-                                wins = ranked_data.get('wins', 0)
-                                losses = ranked_data.get('losses', 0)
-                                
-                                # Calculate ELO (simplified version)
-                                elo = _calculate_elo(tier, rank, league_points)
-                                
-                                # Create live data point
-                                live_data[summoner_name] = {
-                                    'riot_id': riot_id,
-                                    'summoner_name': summoner_name,
-                                    'tier': tier,
-                                    'rank': rank,
-                                    'leaguePoints': league_points,
-                                    'wins': wins,
-                                    'losses': losses,
-                                    'elo': elo,
-                                    'created_at': datetime.now().isoformat(),
-                                    'isLive': True
-                                }
-                                logger.info(f"✅ Live data for {summoner_name}: ELO {elo}")
-                            else:
-                                logger.warn(f"No ranked TFT data found for {summoner_name}")
-                        elif league_response.status_code in [401, 403]:
-                            # API key is invalid/expired - this is expected
-                            logger.warn(f"Riot API key is invalid/expired for {summoner_name}: {league_response.status_code}")
-                            logger.warn(f"Response content: {league_response.text}")
-                            # Continue without live data for this user
-                        else:
-                            logger.warn(f"Failed to fetch league data for {summoner_name}: {league_response.status_code}")
-                            logger.warn(f"Response content: {league_response.text}")
-                            # Continue without live data for this user
-                            
-                    except Exception as e:
-                        logger.error(f"Error fetching live data for {summoner_name}: {str(e)}")
-                        logger.error(f"Full error details: {type(e).__name__}: {e}")
-                        # Continue without live data for this user
-                        
-                except Exception as e:
-                    logger.error(f"Error processing user {user_id}: {str(e)}")
-            
+            live_data = fetch_live_data_for_accounts(riot_response.data)
             logger.info(f"Fetched live data for {len(live_data)} members")
         else:
             logger.info("Skipping live data fetch (not requested)")
@@ -3876,45 +4014,27 @@ def get_member_stats():
             return jsonify({
                 "events": [],
                 "memberNames": riot_id_to_name,
+                "memberSeries": member_series,
                 "liveData": live_data
             })
         
         logger.info(f"Found {len(events)} events for group {group_id} with {len(riot_ids)} members")
         
-        # Group events by summoner_name instead of riot_id
-        member_stats = {}
-        for event in events:
-            riot_id = event['riot_id']
-            summoner_name = riot_id_to_name.get(riot_id, riot_id)  # Use summoner_name, fallback to riot_id
-            
-            if summoner_name not in member_stats:
-                member_stats[summoner_name] = []
-            
-            # Add summoner_name to the event data
-            event_with_name = event.copy()
-            event_with_name['summoner_name'] = summoner_name
-            member_stats[summoner_name].append(event_with_name)
-        
-        logger.info(f"Final member_stats structure: {list(member_stats.keys())}")
-        for summoner_name, events_list in member_stats.items():
-            logger.info(f"  {summoner_name}: {len(events_list)} events")
-        
-        # Flatten all events into a single array
-        all_events = []
-        for summoner_name, events_list in member_stats.items():
-            all_events.extend(events_list)
+        # Events are already grouped by member, each member's oldest first
+        all_events = events
         
         # Create the response data
         response_data = {
             "events": all_events,
             "memberNames": riot_id_to_name,
+            "memberSeries": member_series,
             "liveData": live_data
         }
         
-        # Cache the data in Redis (without live data to avoid API calls in cache)
+        # Cache the group's members in Redis (events live in the member series; no live
+        # data, to avoid API calls in cache)
         try:
             cache_data = {
-                "events": all_events,
                 "memberNames": riot_id_to_name,
                 "liveData": {},  # Empty for cached data
                 "cached_at": datetime.now(timezone.utc).isoformat()
@@ -3947,80 +4067,20 @@ def get_player_stats(riot_id):
     try:
         logger.info(f"Getting player stats for riot_id: {riot_id}")
         
-        def get_rank_events():
-            return supabase.table('rank_audit_events').select('*').eq('riot_id', riot_id).order('created_at', desc=True).limit(200).execute()
-        
-        events_response = execute_supabase_query_with_retry(get_rank_events)
-    
-        if not events_response:
-            events_response = {'data': []}  # Return empty array if table doesn't exist yet
-        
-        events = events_response.data or []
-        
-        logger.info(f"Found {len(events)} raw events for riot_id: {riot_id}")
-        
-        # Apply timezone-aware smart filtering (same logic as team stats)
-        import pytz
-        
-        # Get current date for comparison (use local timezone for proper day grouping)
-        current_utc = datetime.now(timezone.utc)
-        
-        # Convert to a reasonable timezone for date grouping
-        try:
-            local_tz = pytz.timezone('America/Los_Angeles')  # Pacific Time
-        except:
-            local_tz = pytz.UTC
-        current_local = current_utc.astimezone(local_tz)
-        current_date = current_local.date().isoformat()
-        
-        # Group events by date (converted to local timezone)
-        events_by_date = {}
-        for event in events:
-            try:
-                # Parse the UTC timestamp
-                event_utc = datetime.fromisoformat(event['created_at'].replace('Z', '+00:00'))
-                
-                # Convert to local timezone for date grouping
-                event_local = event_utc.astimezone(local_tz)
-                event_date = event_local.date().isoformat()  # YYYY-MM-DD in local time
-                
-                if event_date not in events_by_date:
-                    events_by_date[event_date] = []
-                
-                events_by_date[event_date].append(event)
-            except (KeyError, AttributeError, ValueError) as e:
-                logger.warn(f"Skipping invalid event: {e}")
-                continue
-        
-        # Apply smart filtering: keep only one event per day
-        optimized_events = []
-        logger.info(f"Applying smart filtering for {len(events_by_date)} unique dates")
-        
-        for event_date, day_events in events_by_date.items():
-            if not day_events:
-                continue
-             #sdfsdfsd   
-            # Check if this is today
-            is_today = event_date == current_date
-            
-            if len(day_events) > 1:
-                logger.info(f"  Date {event_date} has {len(day_events)} events (is_today: {is_today})")
-            
-            if is_today:
-                # For today, keep the most recent (latest) event
-                selected_event = max(day_events, key=lambda x: x['created_at'])
-                logger.info(f"  Selected for today: {selected_event['created_at']} | ELO: {selected_event['elo']}")
-            else:
-                # For other days, keep the highest ELO event
-                selected_event = max(day_events, key=lambda x: x['elo'])
-                logger.info(f"  Selected for historical: {selected_event['created_at']} | ELO: {selected_event['elo']}")
-            
-            optimized_events.append(selected_event)
+        # One event per day from the daily rollup, most recent first
+        daily_events = load_daily_rank_events([riot_id])
+        if daily_events is not None:
+            daily_events.reverse()
+            return jsonify({
+                'events': daily_events
+            })
         
-        # Sort by date (most recent first)
-        optimized_events.sort(key=lambda x: x['created_at'], reverse=True)
+        # Without the rollup, the same 50 days filtered from the player's streamed raw events
+        optimized_events = smart_filter_chunks(
+            iter_rank_event_pages(supabase, [riot_id], execute=execute_page_with_retry))
+        optimized_events.reverse()
         
-        logger.info(f"Optimized events: {len(optimized_events)} (reduced from {len(events)}, smart filtering: highest ELO for historical days, most recent for current day)")
+        logger.info(f"Optimized events for riot_id {riot_id}: {len(optimized_events)}")
         
         return jsonify({
             'events': optimized_events
@@ -4044,44 +4104,148 @@ def create_rank_audit_event():
             if field not in data:
                 return jsonify({'error': f'Missing required field: {field}'}), 400
 
-        # Get current date (UTC) for duplicate checking
-        current_date = datetime.now(timezone.utc).date()
-        
-        # Check if an entry with the same wins, losses, and date already exists for this user
-        def check_existing_event():
-            return supabase.table('rank_audit_events').select('*').eq('riot_id', data['riot_id']).eq('wins', data['wins']).eq('losses', data['losses']).gte('created_at', current_date.isoformat()).lt('created_at', (current_date + timedelta(days=1)).isoformat()).execute()
+        event = {field: data[field] for field in required_fields}
+        event['created_at'] = data.get('created_at') or datetime.now(timezone.utc).isoformat()
 
-        existing_response = execute_supabase_query_with_retry(check_existing_event)
+        # An event with the same wins and losses on the same (Pacific) day replaces the
+        # earlier one, in a single upsert on the rank_audit_events_daily_key constraint
+        def upsert_event():
+            return supabase.table('rank_audit_events').upsert(event, on_conflict=RANK_AUDIT_EVENT_KEY).execute()
 
-        # If matching entries exist for the same day, delete them before inserting the new one
-        if existing_response and existing_response.data and len(existing_response.data) > 0:
-            logger.info(f"Found {len(existing_response.data)} existing entries with same wins/losses on same day for riot_id {data['riot_id']}, deleting them")
-            
-            def delete_existing_events():
-                return supabase.table('rank_audit_events').delete().eq('riot_id', data['riot_id']).eq('wins', data['wins']).eq('losses', data['losses']).gte('created_at', current_date.isoformat()).lt('created_at', (current_date + timedelta(days=1)).isoformat()).execute()
-            
-            delete_response = execute_supabase_query_with_retry(delete_existing_events)
-            
-            if not delete_response:
-                logger.error(f"Failed to delete existing entries for riot_id {data['riot_id']}")
-                return jsonify({'error': 'Failed to delete existing entries'}), 500
-            
-            logger.info(f"Successfully deleted {len(existing_response.data)} existing entries")
-
-        def create_event():
-            return supabase.table('rank_audit_events').insert(data).execute()
-
-        response = execute_supabase_query_with_retry(create_event)
+        response = execute_supabase_query_with_retry(upsert_event)
 
         if response and response.data:
+            # Fold the event into the player's cached series; mark it for a rebuild otherwise
+            mark_riot_ids_dirty(redis_client, append_events(redis_client, [event]))
             return jsonify({'success': True, 'event': response.data[0]}), 201
         else:
+            mark_riot_ids_dirty(redis_client, [event['riot_id']])
             return jsonify({'error': 'Failed to create rank audit event'}), 500
 
     except Exception as e:
         logger.error(f"Error creating rank audit event: {str(e)}")
         return jsonify({'error': 'Failed to create rank audit event'}), 500
 
+@app.route('/api/rank-audit-events/bulk', methods=['POST'])
+def create_rank_audit_events_bulk():
+    """
+    Create or replace many rank audit events in one atomic upsert.
+    Body: {"events": [{"riot_id", "elo", "wins", "losses", "created_at" (optional)}, ...]}
+    
+    Same dedup rule as the single-event route: one event per riot_id, wins, losses and
+    Pacific day, the latest replacing earlier ones (within the request too). Returns a
+    result per submitted item, in order: 'upserted', 'superseded' (a later item in the
+    request has the same key) or 'invalid' with an error (including a riot_id that has no
+    riot_accounts row). The status is 200 when no item
+    is invalid, 207 when some are and others were written, and 400 when none were.
+    """
+    try:
+        data = request.get_json()
+        events = data.get('events') if isinstance(data, dict) else data
+        if not isinstance(events, list) or not events:
+            return jsonify({'error': 'events must be a non-empty array'}), 400
+        if len(events) > RANK_AUDIT_BULK_MAX_EVENTS:
+            return jsonify({'error': f'At most {RANK_AUDIT_BULK_MAX_EVENTS} events per request'}), 400
+        
+        now = datetime.now(timezone.utc)
+        results = [None] * len(events)
+        latest_by_key = {}  # dedup key -> (index, event, created_at)
+        
+        for index, item in enumerate(events):
+            if not isinstance(item, dict):
+                results[index] = {'index': index, 'status': 'invalid', 'error': 'Event must be an object'}
+                continue
+            missing = [field for field in ('elo', 'wins', 'losses', 'riot_id') if field not in item]
+            if missing:
+                results[index] = {'index': index, 'status': 'invalid', 'error': f"Missing required field: {missing[0]}"}
+                continue
+            if not isinstance(item['riot_id'], str) or not item['riot_id']:
+                results[index] = {'index': index, 'status': 'invalid', 'error': 'riot_id must be a non-empty string'}
+                continue
+            if not all(isinstance(item[field], int) and not isinstance(item[field], bool) for field in ('elo', 'wins', 'losses')):
+                results[index] = {'index': index, 'status': 'invalid', 'error': 'elo, wins and losses must be integers'}
+                continue
+            try:
+                created_at = datetime.fromisoformat(item['created_at'].replace('Z', '+00:00')) if item.get('created_at') else now
+                if created_at.tzinfo is None:
+                    created_at = created_at.replace(tzinfo=timezone.utc)
+                created_at = created_at.astimezone(timezone.utc)
+            except (AttributeError, ValueError):
+                results[index] = {'index': index, 'status': 'invalid', 'error': 'created_at must be an ISO timestamp'}
+                continue
+            
+            event = {
+                'riot_id': item['riot_id'],
+                'elo': item['elo'],
+                'wins': item['wins'],
+                'losses': item['losses'],
+                'created_at': created_at.isoformat()
+            }
+            key = (event['riot_id'], event['wins'], event['losses'], chart_day(created_at))
+            
+            # One statement can't upsert the same key twice: keep the latest of the request
+            previous = latest_by_key.get(key)
+            if previous and previous[2] > created_at:
+                results[index] = {'index': index, 'status': 'superseded', 'superseded_by': previous[0]}
+                continue
+            if previous:
+                results[previous[0]] = {'index': previous[0], 'status': 'superseded', 'superseded_by': index}
+            latest_by_key[key] = (index, event, created_at)
+        
+        # An unknown riot_id would fail the foreign key, and with it the whole upsert
+        if latest_by_key:
+            submitted_ids = sorted({event['riot_id'] for _, event, _ in latest_by_key.values()})
+            
+            def get_known_accounts():
+                return supabase.table('riot_accounts').select('riot_id').in_('riot_id', submitted_ids).execute()
+            
+            accounts_response = execute_supabase_query_with_retry(get_known_accounts)
+            known_ids = {row['riot_id'] for row in (accounts_response.data or [])} if accounts_response else set()
+            for key, (index, event, _) in list(latest_by_key.items()):
+                if event['riot_id'] not in known_ids:
+                    del latest_by_key[key]
+            for index, result in enumerate(results):
+                if (result is None or result['status'] == 'superseded') and events[index]['riot_id'] not in known_ids:
+                    results[index] = {'index': index, 'status': 'invalid', 'error': 'riot_id not found'}
+        
+        if latest_by_key:
+            rows = [event for _, event, _ in latest_by_key.values()]
+            
+            def upsert_events():
+                return supabase.table('rank_audit_events').upsert(rows, on_conflict=RANK_AUDIT_EVENT_KEY).execute()
+            
+            response = execute_supabase_query_with_retry(upsert_events)
+            if not response or response.data is None:
+                mark_riot_ids_dirty(redis_client, [event['riot_id'] for event in rows])
+                return jsonify({'error': 'Failed to upsert rank audit events'}), 500
+            mark_riot_ids_dirty(redis_client, append_events(redis_client, rows))
+            
+            ids_by_key = {
+                (row['riot_id'], row['wins'], row['losses'], row.get('local_day')): row.get('id')
+                for row in response.data
+            }
+            for key, (index, _, _) in latest_by_key.items():
+                results[index] = {'index': index, 'status': 'upserted', 'id': ids_by_key.get(key)}
+        
+        upserted = sum(1 for result in results if result['status'] == 'upserted')
+        invalid = sum(1 for result in results if result['status'] == 'invalid')
+        if invalid == 0:
+            status_code = 200
+        elif upserted:
+            status_code = 207  # Multi-Status: see each item's result
+        else:
+            status_code = 400
+        return jsonify({
+            'success': invalid == 0,
+            'upserted': upserted,
+            'invalid': invalid,
+            'results': results
+        }), status_code
+        
+    except Exception as e:
+        logger.error(f"Error creating rank audit events in bulk: {str(e)}")
+        return jsonify({'error': 'Failed to create rank audit events'}), 500
+
 @app.route('/api/redis-health', methods=['GET'])
 def redis_health_check():
     """Check Redis connection health"""
@@ -4115,9 +4279,9 @@ def clear_group_cache(group_id):
 def clear_all_cache():
     """Clear all member stats cache"""
     try:
-        # Get all keys matching the pattern
+        # Get all keys matching the patterns (group entries and member series)
         pattern = "member_stats_group_*"
-        keys = redis_client.keys(pattern)
+        keys = redis_client.keys(pattern) + redis_client.keys(MEMBER_SERIES_PATTERN)
         
         if keys:
             deleted = redis_client.delete(*keys)
@@ -4216,91 +4380,11 @@ def refresh_group_cache_data(group_id):
         print(f"PRINT: Step 3: Data already extracted in Step 2, skipping")
         logger.warning(f"Step 3: Data already extracted in Step 2, skipping")
         
-        # Step 4: Get events and apply optimization (same as rank_audit_processor.py)
+        # Step 4: Rebuild and cache every member's series (see member_series_cache.py)
         try:
             print(f"PRINT: Step 4: Fetching events")
             logger.warning(f"Step 4: Fetching events")
-            events_response = supabase.table('rank_audit_events').select('*').in_('riot_id', riot_ids).order('created_at').execute()
-            
-            if not events_response:
-                events_response = {'data': []}
-            
-            raw_events = events_response.data or []
-            print(f"PRINT: Step 4a: Fetched {len(raw_events)} raw events")
-            logger.warning(f"Step 4a: Fetched {len(raw_events)} raw events")
-            
-            # Apply the same optimization logic as rank_audit_processor.py
-            import pytz
-            
-            # Get current date for comparison
-            current_utc = datetime.now(timezone.utc)
-            
-            try:
-                local_tz = pytz.timezone('America/Los_Angeles')
-            except:
-                local_tz = pytz.UTC
-            
-            current_local = current_utc.astimezone(local_tz)
-            current_date = current_local.date().isoformat()
-            
-            # Group events by riot_id and date
-            events_by_riot_id = {}
-            
-            for event in raw_events:
-                riot_id = event['riot_id']
-                if riot_id not in events_by_riot_id:
-                    events_by_riot_id[riot_id] = {}
-                
-                try:
-                    event_utc = datetime.fromisoformat(event['created_at'].replace('Z', '+00:00'))
-                    event_local = event_utc.astimezone(local_tz)
-                    event_date = event_local.date().isoformat()
-                    
-                    if event_date not in events_by_riot_id[riot_id]:
-                        events_by_riot_id[riot_id][event_date] = []
-                    
-                    events_by_riot_id[riot_id][event_date].append(event)
-                except (KeyError, AttributeError, ValueError) as e:
-                    print(f"PRINT: Skipping invalid event: {e}")
-                    logger.warn(f"Skipping invalid event: {e}")
-                    continue
-            
-            # Apply smart filtering
-            optimized_events = []
-            
-            for riot_id, dates in events_by_riot_id.items():
-                for event_date, day_events in dates.items():
-                    if not day_events:
-                        continue
-                    
-                    is_today = event_date == current_date
-                    
-                    if is_today:
-                        selected_event = max(day_events, key=lambda x: x['created_at'])
-                    else:
-                        selected_event = max(day_events, key=lambda x: x['elo'])
-                    
-                    optimized_events.append(selected_event)
-            
-            # Sort and limit events
-            optimized_events.sort(key=lambda x: x['created_at'])
-            
-            MAX_EVENTS_PER_USER = 50
-            limited_events = []
-            events_per_user = {}
-            
-            for event in optimized_events:
-                riot_id = event['riot_id']
-                if riot_id not in events_per_user:
-                    events_per_user[riot_id] = []
-                events_per_user[riot_id].append(event)
-            
-            for riot_id, user_events in events_per_user.items():
-                user_events.sort(key=lambda x: x['created_at'], reverse=True)
-                limited_events.extend(user_events[:MAX_EVENTS_PER_USER])
-            
-            limited_events.sort(key=lambda x: x['created_at'])
-            events = limited_events
+            events, _ = load_member_events(riot_id_to_name, refresh=True)
             
             print(f"PRINT: Step 4b: After optimization: {len(events)} events")
             logger.warning(f"Step 4b: After optimization: {len(events)} events")
@@ -4315,7 +4399,6 @@ def refresh_group_cache_data(group_id):
             print(f"PRINT: Step 5: Creating cache data")
             logger.warning(f"Step 5: Creating cache data")
             cache_data = {
-                "events": events,
                 "memberNames": riot_id_to_name,
                 "liveData": {},  # Empty for cached data
                 "cached_at": datetime.now(timezone.utc).isoformat()
@@ -4372,10 +4455,28 @@ def refresh_group_cache(group_id):
 
 @app.route('/api/riot-accounts', methods=['GET'])
 def get_all_riot_accounts():
-    """Get all riot accounts"""
+    """
+    Get all riot accounts
+    Query parameters:
+    - updated_since: ISO timestamp; only return accounts created or updated after it (optional)
+    """
     try:
+        updated_since = request.args.get('updated_since')
+        if updated_since:
+            try:
+                since = parse_datetime_safe(updated_since)
+            except ValueError:
+                return jsonify({'error': 'updated_since must be an ISO timestamp'}), 400
+            if since.tzinfo is None:
+                since = since.replace(tzinfo=timezone.utc)
+            updated_since = since.astimezone(timezone.utc).isoformat()
+        
         def get_accounts():
-            return supabase.table('riot_accounts').select('riot_id, summoner_name, rank, region, created_at').execute()
+            query = supabase.table('riot_accounts').select('riot_id, summoner_name, rank, region, created_at, date_updated')
+            if updated_since:
+                # Quoted: the '+' and ':' of the timestamp must not be read as filter syntax
+                query = query.or_(f'created_at.gt."{updated_since}",date_updated.gt."{updated_since}"')
+            return query.execute()
         
         response = execute_supabase_query_with_retry(get_accounts)
         
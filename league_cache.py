@@ -0,0 +1,171 @@
+"""
+Short-TTL cache of Riot league-by-puuid lookups, shared through Redis.
+
+The same tft/league/v1/by-puuid call is made by the league endpoint, group pages,
+live group stats, rank updates and the rank audit processor. Snapshots are kept
+in Redis for RIOT_LEAGUE_CACHE_TTL seconds so every path shares them, and
+concurrent misses for one puuid wait on a single upstream request: in-process
+through a shared future, across workers through a short Redis lock.
+
+A background caller holding the lock may queue for quota for a long time, so
+interactive callers only wait RIOT_LEAGUE_LOCK_WAIT seconds for another worker's
+fetch before asking Riot themselves.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from riot_rate_limiter import LANE_BACKGROUND
+
+logger = logging.getLogger(__name__)
+
+# How long a league snapshot is reused before Riot is asked again (seconds)
+RIOT_LEAGUE_CACHE_TTL = int(os.environ.get('RIOT_LEAGUE_CACHE_TTL', 60))
+# Responses worth caching: found (200) and "no ranked data" (404)
+CACHEABLE_STATUSES = (200, 404)
+# Longest an interactive caller waits on another worker's fetch of the same puuid (seconds)
+RIOT_LEAGUE_LOCK_WAIT = float(os.environ.get('RIOT_LEAGUE_LOCK_WAIT', 1))
+# How often a worker waiting on another worker's fetch re-checks the cache (seconds)
+_LOCK_POLL_INTERVAL = 0.05
+
+
+class LeagueSnapshot:
+    """A stored league-by-puuid response (status_code / text / json() like requests.Response)"""
+
+    def __init__(self, status_code: int, text: str, fetched_at: float, cached: bool = False):
+        self.status_code = status_code
+        self.text = text
+        self.fetched_at = fetched_at
+        self.cached = cached
+
+    def json(self) -> Any:
+        return json.loads(self.text)
+
+    def to_cache(self) -> str:
+        return json.dumps({'status_code': self.status_code, 'text': self.text, 'fetched_at': self.fetched_at})
+
+    @classmethod
+    def from_cache(cls, raw: str) -> 'LeagueSnapshot':
+        data = json.loads(raw)
+        return cls(data['status_code'], data['text'], data['fetched_at'], cached=True)
+
+
+class _InFlight:
+    """A league fetch in progress that other threads can wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.snapshot = None
+        self.error = None
+
+
+class LeagueSnapshotCache:
+    """Per-puuid league snapshot cache with single-flight upstream fetches"""
+
+    def __init__(self, riot_client, redis_client, ttl: int = RIOT_LEAGUE_CACHE_TTL,
+                 key_prefix: str = 'riot_league', lock_wait: float = RIOT_LEAGUE_LOCK_WAIT):
+        self.riot_client = riot_client
+        self.redis = redis_client
+        self.ttl = ttl
+        self.key_prefix = key_prefix
+        self.lock_wait = lock_wait
+        self._in_flight: Dict[str, _InFlight] = {}
+        self._in_flight_lock = threading.Lock()
+
+    def _key(self, region: str, puuid: str) -> str:
+        return f"{self.key_prefix}:{region}:{puuid}"
+
+    def _read(self, key: str) -> Optional[LeagueSnapshot]:
+        try:
+            raw = self.redis.get(key)
+            return LeagueSnapshot.from_cache(raw) if raw else None
+        except Exception as e:
+            logger.warning(f"League cache read failed for {key}: {str(e)}")
+            return None
+
+    def peek(self, region: str, puuid: str) -> Optional[LeagueSnapshot]:
+        """The cached snapshot for a player, if any, without ever calling Riot"""
+        return self._read(self._key(region, puuid))
+
+    def get(self, region: str, puuid: str, **kwargs) -> LeagueSnapshot:
+        """
+        League entries for a player, from cache when fresh, otherwise from Riot.
+
+        Extra kwargs (e.g. timeout, lane) are passed to RiotClient.get_league_by_puuid.
+        Riot errors (RiotRateLimitError, requests exceptions) propagate to every waiter.
+        """
+        key = self._key(region, puuid)
+        snapshot = self._read(key)
+        if snapshot:
+            return snapshot
+
+        with self._in_flight_lock:
+            in_flight = self._in_flight.get(key)
+            leader = in_flight is None
+            if leader:
+                in_flight = _InFlight()
+                self._in_flight[key] = in_flight
+
+        if not leader:
+            in_flight.done.wait()
+            if in_flight.error is not None:
+                raise in_flight.error
+            return in_flight.snapshot
+
+        try:
+            in_flight.snapshot = self._fetch(key, region, puuid, **kwargs)
+            return in_flight.snapshot
+        except Exception as e:
+            in_flight.error = e
+            raise
+        finally:
+            with self._in_flight_lock:
+                self._in_flight.pop(key, None)
+            in_flight.done.set()
+
+    def _fetch(self, key: str, region: str, puuid: str, **kwargs) -> LeagueSnapshot:
+        """Fetch from Riot, coordinating with other workers through a Redis lock"""
+        lock_key = f"{key}:lock"
+        lock_ttl_ms = int((self.riot_client.timeout + (self.riot_client.max_wait or 0) + 1) * 1000)
+        try:
+            have_lock = bool(self.redis.set(lock_key, '1', nx=True, px=lock_ttl_ms))
+        except Exception as e:
+            logger.warning(f"League cache lock failed for {key}: {str(e)}")
+            have_lock = True
+
+        if not have_lock:
+            # Another worker is fetching this puuid; wait for its result to land (interactive
+            # callers only briefly: the holder may be a background caller queued for quota)
+            wait = lock_ttl_ms / 1000.0
+            if (kwargs.get('lane') or self.riot_client.lane) != LANE_BACKGROUND:
+                wait = min(wait, self.lock_wait)
+            deadline = time.monotonic() + wait
+            while time.monotonic() < deadline:
+                time.sleep(_LOCK_POLL_INTERVAL)
+                snapshot = self._read(key)
+                if snapshot:
+                    return snapshot
+                try:
+                    if not self.redis.exists(lock_key):
+                        break
+                except Exception:
+                    break
+
+        try:
+            response = self.riot_client.get_league_by_puuid(region, puuid, **kwargs)
+            snapshot = LeagueSnapshot(response.status_code, response.text, time.time())
+            if snapshot.status_code in CACHEABLE_STATUSES:
+                try:
+                    self.redis.setex(key, self.ttl, snapshot.to_cache())
+                except Exception as e:
+                    logger.warning(f"League cache write failed for {key}: {str(e)}")
+            return snapshot
+        finally:
+            if have_lock:
+                try:
+                    self.redis.delete(lock_key)
+                except Exception:
+                    pass
@@ -0,0 +1,324 @@
+"""
+Permanent store for finished TFT matches.
+
+Riot only serves a match once it has finished, and its data never changes after
+that, so matches are stored without expiry and Riot is only asked for ids we have
+never seen. Matches live in Redis by default; set MATCH_STORE_DIR to keep them as
+JSON files on local disk instead.
+
+Only a packed summary of each match is stored (see pack_match): every participant's
+placement, units and active traits, which is all match history uses, so each group
+member's games are served from one small record. The record is zlib-compressed
+(encode_record); on a typical 8-player match it is about a tenth of Riot's document.
+Reads expand it back into Riot's document shape (slim_match).
+
+Riot's documents are parsed with orjson when it is installed (about 2.5x faster than
+the json module), falling back to json.
+"""
+import base64
+import json
+import logging
+import os
+import re
+import zlib
+from typing import Dict, Iterable, Optional, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+# Directory for the on-disk backend; empty means store matches in Redis
+MATCH_STORE_DIR = os.environ.get('MATCH_STORE_DIR', '')
+# Riot match ids look like NA1_5123456789
+_MATCH_ID_PATTERN = re.compile(r'^[A-Za-z0-9]+_[0-9]+$')
+
+# Version tag of the packed storage format below
+_PACKED_VERSION = 2
+# Prefix of stored records holding a compressed packed match
+_COMPRESSED_PREFIX = 'z:'
+
+
+def parse_match(raw: Union[bytes, str]) -> dict:
+    """A Riot match document from the response body"""
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+def encode_record(packed: dict) -> str:
+    """A packed match as stored: compressed JSON, base64 so it fits text backends"""
+    compressed = zlib.compress(json.dumps(packed, separators=(',', ':')).encode('utf-8'), 6)
+    return _COMPRESSED_PREFIX + base64.b64encode(compressed).decode('ascii')
+
+
+def decode_record(raw: str) -> dict:
+    """A stored record as a match document (compressed, packed, or a full Riot document)"""
+    if raw.startswith(_COMPRESSED_PREFIX):
+        data = json.loads(zlib.decompress(base64.b64decode(raw[len(_COMPRESSED_PREFIX):])))
+    else:
+        data = json.loads(raw)
+    # Matches stored before packing was introduced are full Riot documents
+    return unpack_match(data) if data.get('v') == _PACKED_VERSION else data
+
+
+def pack_match(match: dict) -> dict:
+    """
+    Reduce a Riot match document to a compact positional record.
+
+    Keeps, for every participant, only what match history needs: puuid, placement,
+    level, Riot ID, units (character, star level, items) and active traits. Key names
+    are not repeated per unit/trait, and the duplicate puuid list in metadata is dropped.
+    """
+    info = match.get('info', {})
+    participants = []
+    for participant in info.get('participants', []):
+        participants.append([
+            participant.get('puuid'),
+            participant.get('placement'),
+            participant.get('level'),
+            participant.get('riotIdGameName'),
+            participant.get('riotIdTagline'),
+            [
+                [unit.get('character_id'), unit.get('tier'), unit.get('itemNames', [])]
+                for unit in participant.get('units', [])
+            ],
+            [
+                [trait.get('name'), trait.get('num_units'), trait.get('tier_current'), trait.get('tier_total')]
+                for trait in participant.get('traits', [])
+                if trait.get('tier_current', 0) > 0
+            ]
+        ])
+    return {
+        'v': _PACKED_VERSION,
+        'id': match.get('metadata', {}).get('match_id'),
+        'c': info.get('gameCreation'),
+        'd': info.get('game_datetime'),
+        'l': info.get('game_length'),
+        'q': info.get('queue_id'),
+        's': info.get('tft_set_number'),
+        'p': participants
+    }
+
+
+def unpack_match(packed: dict) -> dict:
+    """Expand a packed record back into Riot's match document structure"""
+    participants = []
+    for puuid, placement, level, game_name, tag_line, units, traits in packed['p']:
+        participants.append({
+            'puuid': puuid,
+            'placement': placement,
+            'level': level,
+            'riotIdGameName': game_name,
+            'riotIdTagline': tag_line,
+            'units': [
+                {'character_id': character_id, 'tier': tier, 'itemNames': items}
+                for character_id, tier, items in units
+            ],
+            'traits': [
+                {'name': name, 'num_units': num_units, 'tier_current': tier_current, 'tier_total': tier_total}
+                for name, num_units, tier_current, tier_total in traits
+            ]
+        })
+    return {
+        'metadata': {
+            'match_id': packed['id'],
+            'participants': [participant['puuid'] for participant in participants]
+        },
+        'info': {
+            'gameCreation': packed['c'],
+            'game_datetime': packed['d'],
+            'game_length': packed['l'],
+            'queue_id': packed['q'],
+            'tft_set_number': packed['s'],
+            'participants': participants
+        }
+    }
+
+
+def slim_match(match: dict) -> dict:
+    """
+    A match document trimmed to per-participant summaries.
+
+    Same structure and key names as Riot's document, so code reading a full match
+    reads a slim one unchanged. Inactive traits are dropped.
+    """
+    return unpack_match(pack_match(match))
+
+
+class RedisMatchBackend:
+    """Matches as JSON strings under {key_prefix}:{match_id}, no TTL"""
+
+    def __init__(self, redis_client, key_prefix: str = 'riot_match'):
+        self.redis = redis_client
+        self.key_prefix = key_prefix
+
+    def get_many(self, match_ids: list) -> Dict[str, str]:
+        if not match_ids:
+            return {}
+        values = self.redis.mget([f"{self.key_prefix}:{match_id}" for match_id in match_ids])
+        return {match_id: value for match_id, value in zip(match_ids, values) if value}
+
+    def put(self, match_id: str, raw: str):
+        self.redis.set(f"{self.key_prefix}:{match_id}", raw)
+
+
+class DiskMatchBackend:
+    """Matches as {directory}/{platform}/{match_id}.json files"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def _path(self, match_id: str) -> str:
+        # Shard by platform prefix to keep directories small
+        platform = match_id.split('_', 1)[0]
+        return os.path.join(self.directory, platform, f"{match_id}.json")
+
+    def get_many(self, match_ids: list) -> Dict[str, str]:
+        found = {}
+        for match_id in match_ids:
+            if not _MATCH_ID_PATTERN.match(match_id):
+                continue
+            try:
+                with open(self._path(match_id), 'r', encoding='utf-8') as f:
+                    found[match_id] = f.read()
+            except FileNotFoundError:
+                continue
+        return found
+
+    def put(self, match_id: str, raw: str):
+        if not _MATCH_ID_PATTERN.match(match_id):
+            raise ValueError(f"Unexpected match id: {match_id}")
+        path = self._path(match_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temp file and rename so readers never see a partial match
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(raw)
+        os.replace(tmp_path, path)
+
+
+class MatchStore:
+    """Immutable match cache in front of the Riot match endpoint"""
+
+    def __init__(self, riot_client, redis_client, directory: str = MATCH_STORE_DIR):
+        self.riot_client = riot_client
+        if directory:
+            self.backend = DiskMatchBackend(directory)
+        else:
+            self.backend = RedisMatchBackend(redis_client)
+
+    def get_many(self, match_ids: Iterable[str]) -> Dict[str, dict]:
+        """Stored matches for the given ids (ids never seen before are simply absent)"""
+        match_ids = list(match_ids)
+        try:
+            stored = self.backend.get_many(match_ids)
+        except Exception as e:
+            logger.warning(f"Match store read failed: {str(e)}")
+            return {}
+        return {match_id: decode_record(raw) for match_id, raw in stored.items()}
+
+    def put(self, match_id: str, match: dict):
+        """Store a match (packed down to per-participant summaries)"""
+        try:
+            self.backend.put(match_id, encode_record(pack_match(match)))
+        except Exception as e:
+            logger.warning(f"Match store write failed for {match_id}: {str(e)}")
+
+    def get(self, routing_region: str, match_id: str) -> Optional[dict]:
+        """A match from the store, downloading it only if we have never seen it"""
+        stored = self.get_many([match_id]).get(match_id)
+        if stored is not None:
+            return stored
+        return self.download(routing_region, match_id)
+
+    def download(self, routing_region: str, match_id: str) -> Optional[dict]:
+        """Fetch a match we don't have from Riot and store it (None if Riot has no such match)"""
+        response = self.riot_client.get_match(routing_region, match_id)
+        if response.status_code != 200:
+            return None
+        packed = pack_match(parse_match(response.content))
+        try:
+            self.backend.put(match_id, encode_record(packed))
+        except Exception as e:
+            logger.warning(f"Match store write failed for {match_id}: {str(e)}")
+        return unpack_match(packed)
+
+
+class MatchHistoryIndex:
+    """
+    Stored match history per puuid.
+
+    {key_prefix}:{puuid} is a sorted set of match ids scored by gameCreation (ms).
+    {key_prefix}_cursor:{puuid} is a hash of two cursors, each only moved once every
+    match up to it is stored: the newest match, so refreshes only ask Riot for later
+    games, and oldest_game_creation, the point backfill continues from (older games
+    are asked for by time, not by offset). 'exhausted' is set once Riot has no older
+    matches to give.
+    """
+
+    def __init__(self, redis_client, key_prefix: str = 'match_history'):
+        self.redis = redis_client
+        self.key_prefix = key_prefix
+
+    def _ids_key(self, puuid: str) -> str:
+        return f"{self.key_prefix}:{puuid}"
+
+    def _cursor_key(self, puuid: str) -> str:
+        return f"{self.key_prefix}_cursor:{puuid}"
+
+    def get_cursor(self, puuid: str) -> Optional[dict]:
+        cursor = self.redis.hgetall(self._cursor_key(puuid))
+        if not cursor or 'newest_match_id' not in cursor:
+            return None
+        oldest = cursor.get('oldest_game_creation')
+        return {
+            'newest_match_id': cursor['newest_match_id'],
+            'newest_game_creation': int(cursor.get('newest_game_creation', 0)),
+            'oldest_game_creation': int(oldest) if oldest else None,
+            'exhausted': cursor.get('exhausted') == '1'
+        }
+
+    def known(self, puuid: str, match_ids: list) -> Dict[str, int]:
+        """{match_id: gameCreation} for the match_ids already in the player's stored history"""
+        if not match_ids:
+            return {}
+        pipe = self.redis.pipeline()
+        for match_id in match_ids:
+            pipe.zscore(self._ids_key(puuid), match_id)
+        return {match_id: int(score) for match_id, score in zip(match_ids, pipe.execute()) if score is not None}
+
+    def add(self, puuid: str, game_creations: Dict[str, int]):
+        """Merge {match_id: gameCreation} into the history (cursors are moved separately)"""
+        if game_creations:
+            self.redis.zadd(self._ids_key(puuid), game_creations)
+
+    def set_newest(self, puuid: str, match_id: str, game_creation: int):
+        """Advance the refresh cursor: every match up to this one is stored"""
+        cursor = self.get_cursor(puuid)
+        if not cursor or game_creation > cursor['newest_game_creation']:
+            self.redis.hset(self._cursor_key(puuid), mapping={
+                'newest_match_id': match_id,
+                'newest_game_creation': game_creation
+            })
+
+    def set_oldest(self, puuid: str, game_creation: int):
+        """Move the backfill cursor: every match from this one up to the newest is stored"""
+        self.redis.hset(self._cursor_key(puuid), 'oldest_game_creation', game_creation)
+
+    def oldest_stored(self, puuid: str) -> Optional[int]:
+        """gameCreation of the oldest stored match (for histories stored before the backfill cursor)"""
+        oldest = self.redis.zrange(self._ids_key(puuid), 0, 0, withscores=True)
+        return int(oldest[0][1]) if oldest else None
+
+    def mark_exhausted(self, puuid: str):
+        self.redis.hset(self._cursor_key(puuid), 'exhausted', '1')
+
+    def count(self, puuid: str) -> int:
+        return self.redis.zcard(self._ids_key(puuid))
+
+    def page(self, puuid: str, start: int, count: int) -> list:
+        """Stored match ids, newest first"""
+        return self.redis.zrevrange(self._ids_key(puuid), start, start + count - 1)
@@ -0,0 +1,210 @@
+"""
+Per-member chart series in Redis, composed into group responses.
+
+Each player's downsampled series (one event per day, last 50 days, oldest first) is
+cached once under member_series:{riot_id}, however many groups they are in. A group's
+cache entry, member_stats_group_{id}, only holds its member names and live data; the
+events of a group response are assembled from its members' series with one MGET.
+A new event for a player touches that player's series, not every group they
+belong to.
+
+Event writers also update a cached series in place (append_events): the new event
+replaces its day's point (today: if it is later; earlier days: if its ELO is higher)
+or adds a day, trimmed to the last 50, without reading any history. An event with the
+same wins and losses as its day's point replaced that row in the database (the upsert
+key), so when it would not win over the point, the day's new pick is unknown without
+the day's other events: such a series is left to be rebuilt instead. Each series
+records the chart day it was built for, and a series from a previous day counts as
+not cached: yesterday's point was its latest event, but past days show their highest.
+
+A series record:
+    {"events": [{"created_at", "elo", "wins", "losses"}, ...],
+     "today": "YYYY-MM-DD", "built_at": ISO time, "cached_at": ISO time of the last write,
+     "version": in-place updates since built_at}
+"""
+import json
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import redis
+
+from smart_filter import MAX_EVENTS_PER_USER, chart_day, chart_today, parse_created_at
+
+logger = logging.getLogger(__name__)
+
+MEMBER_SERIES_TTL = 7200
+MEMBER_SERIES_PATTERN = 'member_series:*'
+# Attempts at an in-place update racing other writers of the same series
+APPEND_ATTEMPTS = 3
+
+# Fields of a cached series point (riot_id is in the key)
+SERIES_FIELDS = ('created_at', 'elo', 'wins', 'losses')
+
+
+def series_key(riot_id: str) -> str:
+    return f"member_series:{riot_id}"
+
+
+def _new_record(events: List[Dict[str, Any]], today: str) -> Dict[str, Any]:
+    now = datetime.now(timezone.utc).isoformat()
+    return {'events': events, 'today': today, 'built_at': now, 'cached_at': now, 'version': 0}
+
+
+def series_from_events(events: Iterable[Dict[str, Any]], riot_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+    """Series records from smart-filtered events (members without events get an empty one)"""
+    today = chart_today()
+    points = {riot_id: [] for riot_id in riot_ids}
+    for event in sorted(events, key=lambda event: event['created_at']):
+        if event['riot_id'] in points:
+            points[event['riot_id']].append({field: event[field] for field in SERIES_FIELDS})
+    return {riot_id: _new_record(events, today) for riot_id, events in points.items()}
+
+
+def store_series(pipe, series: Dict[str, Dict[str, Any]], ttl: int = MEMBER_SERIES_TTL):
+    """Queue writes of these series records on a Redis pipeline (the caller executes it)"""
+    for riot_id, record in series.items():
+        pipe.setex(series_key(riot_id), ttl, json.dumps(record))
+
+
+def load_series(redis_client, riot_ids: Iterable[str]) -> Tuple[Dict[str, Dict[str, Any]], Set[str]]:
+    """Cached series of these members in one MGET: (records by riot_id, riot_ids not cached)"""
+    riot_ids = list(riot_ids)
+    if not riot_ids:
+        return {}, set()
+    today = chart_today()
+    series = {}
+    missing = set()
+    for riot_id, cached in zip(riot_ids, redis_client.mget([series_key(riot_id) for riot_id in riot_ids])):
+        record = json.loads(cached) if cached is not None else None
+        if record is None or record.get('today') != today:
+            missing.add(riot_id)
+        else:
+            series[riot_id] = record
+    return series, missing
+
+
+def compose_group_events(series: Dict[str, Dict[str, Any]], riot_id_to_name: Dict[str, str]) -> List[Dict[str, Any]]:
+    """
+    A group response's events from its members' series: grouped by member (members in
+    order of their first event), each member's events oldest first.
+    """
+    members = sorted(
+        (riot_id for riot_id in riot_id_to_name if series.get(riot_id, {}).get('events')),
+        key=lambda riot_id: series[riot_id]['events'][0]['created_at']
+    )
+    events = []
+    for riot_id in members:
+        summoner_name = riot_id_to_name.get(riot_id, riot_id)
+        events.extend(dict(point, riot_id=riot_id, summoner_name=summoner_name) for point in series[riot_id]['events'])
+    return events
+
+
+def series_freshness(series: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Per-member version and timestamps of these records, for API responses"""
+    return {
+        riot_id: {'version': record['version'], 'built_at': record['built_at'], 'cached_at': record['cached_at']}
+        for riot_id, record in series.items()
+    }
+
+
+def _chart_day(seconds: float) -> str:
+    return chart_day(datetime.fromtimestamp(seconds, timezone.utc))
+
+
+def apply_event(record: Dict[str, Any], event: Dict[str, Any]) -> Optional[bool]:
+    """
+    Fold a newly written event into a series record in place. True if the series changed,
+    False if it didn't need to, None if it can't be updated in place (rebuild it).
+    """
+    seconds = parse_created_at(event['created_at'])
+    day = _chart_day(seconds)
+    point = {field: event[field] for field in SERIES_FIELDS}
+    point['created_at'] = datetime.fromtimestamp(seconds, timezone.utc).isoformat()
+    points = record['events']
+    times = [parse_created_at(existing['created_at']) for existing in points]
+    for index, existing_seconds in enumerate(times):
+        if _chart_day(existing_seconds) != day:
+            continue
+        existing = points[index]
+        if day == record['today']:
+            replace = seconds >= existing_seconds
+        else:
+            replace = point['elo'] > existing['elo'] or (
+                point['elo'] == existing['elo'] and seconds < existing_seconds)
+        if not replace:
+            # Same upsert key: the event overwrote this point's row, so another of the
+            # day's events may be the pick now
+            if (point['wins'], point['losses']) == (existing['wins'], existing['losses']):
+                return None
+            return False
+        del points[index]
+        del times[index]
+        break
+    else:
+        if len(points) >= MAX_EVENTS_PER_USER and seconds < times[0]:
+            # Older than every day the series shows
+            return False
+    position = sum(1 for existing_seconds in times if existing_seconds <= seconds)
+    points.insert(position, point)
+    del points[:-MAX_EVENTS_PER_USER]
+    return True
+
+
+def append_events(redis_client, events: Iterable[Dict[str, Any]]) -> List[str]:
+    """
+    Fold newly written events into the cached series of their players, in place.
+
+    Returns the riot_ids whose series was not updated: those without a current cached
+    series (nothing to update; a rebuild picks the events up) and those that failed.
+    Mark them dirty as before.
+    """
+    by_riot_id = {}
+    for event in events:
+        if event.get('riot_id'):
+            by_riot_id.setdefault(event['riot_id'], []).append(event)
+
+    not_updated = []
+    for riot_id, player_events in by_riot_id.items():
+        if not _append_player_events(redis_client, riot_id, player_events):
+            not_updated.append(riot_id)
+    return not_updated
+
+
+def _append_player_events(redis_client, riot_id: str, events: List[Dict[str, Any]]) -> bool:
+    """True once the cached series holds these events"""
+    key = series_key(riot_id)
+    today = chart_today()
+    try:
+        with redis_client.pipeline() as pipe:
+            for _ in range(APPEND_ATTEMPTS):
+                try:
+                    pipe.watch(key)
+                    cached = pipe.get(key)
+                    record = json.loads(cached) if cached is not None else None
+                    if record is None or record.get('today') != today:
+                        pipe.unwatch()
+                        return False
+                    changed = False
+                    for event in sorted(events, key=lambda event: parse_created_at(event['created_at'])):
+                        applied = apply_event(record, event)
+                        if applied is None:
+                            pipe.unwatch()
+                            return False
+                        changed = applied or changed
+                    if not changed:
+                        pipe.unwatch()
+                        return True
+                    record['version'] += 1
+                    record['cached_at'] = datetime.now(timezone.utc).isoformat()
+                    pipe.multi()
+                    pipe.set(key, json.dumps(record), keepttl=True)
+                    pipe.execute()
+                    return True
+                except redis.WatchError:
+                    continue
+    except Exception as e:
+        logger.warning(f"Redis cache error appending {len(events)} events to member series {riot_id}: {str(e)}")
+        return False
+    logger.warning(f"Redis cache error: member series {riot_id} kept changing, not appended")
+    return False
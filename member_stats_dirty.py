@@ -0,0 +1,52 @@
+"""
+Which member series and member_stats_group_{id} caches need rebuilding.
+
+Writers mark what they changed: rank audit event writers mark the riot_ids that got
+new events but whose cached series they couldn't update in place (append_events),
+membership changes mark the group. The processor's cache population takes
+both sets and rebuilds only those members' series and those groups' entries (plus any
+whose key has expired; see member_series_cache.py).
+"""
+import logging
+from typing import Iterable, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+DIRTY_GROUPS_KEY = 'member_stats_dirty_groups'
+DIRTY_RIOT_IDS_KEY = 'member_stats_dirty_riot_ids'
+
+
+def mark_groups_dirty(redis_client, group_ids: Iterable):
+    group_ids = [str(group_id) for group_id in group_ids if group_id is not None]
+    if not group_ids:
+        return
+    try:
+        redis_client.sadd(DIRTY_GROUPS_KEY, *group_ids)
+    except Exception as e:
+        logger.warning(f"Redis error marking member stats cache dirty for groups {group_ids}: {str(e)}")
+
+
+def mark_riot_ids_dirty(redis_client, riot_ids: Iterable[str]):
+    riot_ids = [riot_id for riot_id in riot_ids if riot_id]
+    if not riot_ids:
+        return
+    try:
+        redis_client.sadd(DIRTY_RIOT_IDS_KEY, *riot_ids)
+    except Exception as e:
+        logger.warning(f"Redis error marking member stats cache dirty for {len(riot_ids)} riot_ids: {str(e)}")
+
+
+def take_dirty(redis_client) -> Tuple[Set[int], Set[str]]:
+    """Atomically read and clear the dirty sets: (group ids, riot_ids)"""
+    pipe = redis_client.pipeline(transaction=True)
+    pipe.smembers(DIRTY_GROUPS_KEY)
+    pipe.smembers(DIRTY_RIOT_IDS_KEY)
+    pipe.delete(DIRTY_GROUPS_KEY, DIRTY_RIOT_IDS_KEY)
+    group_ids, riot_ids, _ = pipe.execute()
+    return {int(group_id) for group_id in group_ids}, set(riot_ids)
+
+
+def restore_dirty(redis_client, group_ids: Iterable, riot_ids: Iterable[str]):
+    """Put back what take_dirty returned when the rebuild failed"""
+    mark_groups_dirty(redis_client, group_ids)
+    mark_riot_ids_dirty(redis_client, riot_ids)
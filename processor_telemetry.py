@@ -0,0 +1,192 @@
+"""
+Per-run telemetry for the rank audit processor.
+
+Each run collects stage timings, Riot API latencies and statuses by region, database
+write counts and account outcomes, and at the end appends one JSON line to
+RANK_TELEMETRY_JSONL and rewrites the Prometheus textfile RANK_TELEMETRY_PROM (for
+node_exporter's textfile collector). Relative paths are resolved against
+PROCESSOR_TELEMETRY_DIR, so the files land in the same place whatever directory the
+processor is started from. Either output is disabled by setting its path to an empty
+string.
+
+Riot latencies are exported as a Prometheus histogram (_bucket/_sum/_count series),
+which can be aggregated across regions and runs; the JSON line keeps p50/p90/p99.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Dict, List
+
+logger = logging.getLogger(__name__)
+
+PROCESSOR_TELEMETRY_DIR = os.environ.get(
+    'PROCESSOR_TELEMETRY_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'telemetry'))
+RANK_TELEMETRY_JSONL = os.environ.get('RANK_TELEMETRY_JSONL', 'rank_audit_runs.jsonl')
+RANK_TELEMETRY_PROM = os.environ.get('RANK_TELEMETRY_PROM', 'rank_audit_processor.prom')
+
+LATENCY_QUANTILES = (0.5, 0.9, 0.99)
+# Upper bounds (seconds) of the Riot latency histogram buckets; +Inf is implied
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def telemetry_path(path: str) -> str:
+    """Resolve a telemetry output path against PROCESSOR_TELEMETRY_DIR ('' stays disabled)"""
+    if not path:
+        return path
+    return os.path.join(PROCESSOR_TELEMETRY_DIR, path)
+
+
+def _quantile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank quantile of an already sorted list"""
+    index = min(len(sorted_values) - 1, max(0, int(round(q * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+class RunTelemetry:
+    """Thread-safe collector for one processor run (call start() to begin a new run)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.start()
+
+    def start(self):
+        with self._lock:
+            self.started_at = datetime.now(timezone.utc)
+            self._started = time.monotonic()
+            self.stages: Dict[str, float] = {}
+            self.latencies: Dict[str, List[float]] = {}
+            self.statuses: Dict[str, Dict[str, int]] = {}
+            self.db_writes: Dict[str, int] = {}
+            self.outcomes: Dict[str, int] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        """Time a stage of the run (repeated stages add up)"""
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - started
+            with self._lock:
+                self.stages[name] = self.stages.get(name, 0.0) + elapsed
+
+    def record_riot_response(self, host: str, endpoint: str, response):
+        """RiotClient on_response hook: latency and status per Riot host (region)"""
+        elapsed = getattr(response, 'elapsed', None)
+        elapsed = elapsed.total_seconds() if elapsed is not None else None
+        status = str(response.status_code)
+        with self._lock:
+            if elapsed is not None:
+                self.latencies.setdefault(host, []).append(elapsed)
+            region_statuses = self.statuses.setdefault(host, {})
+            region_statuses[status] = region_statuses.get(status, 0) + 1
+
+    def count_db_write(self, kind: str, rows: int = 1):
+        with self._lock:
+            self.db_writes[kind] = self.db_writes.get(kind, 0) + rows
+
+    def set_outcomes(self, outcomes: Dict[str, Any]):
+        with self._lock:
+            self.outcomes = {key: value for key, value in outcomes.items() if isinstance(value, int)}
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            latency = {}
+            for region, values in self.latencies.items():
+                ordered = sorted(values)
+                latency[region] = {
+                    'count': len(ordered),
+                    'sum': round(sum(ordered), 4),
+                    # Cumulative counts per bucket upper bound, as Prometheus histograms want them
+                    'buckets': {str(bound): sum(1 for value in ordered if value <= bound)
+                                for bound in LATENCY_BUCKETS},
+                    **{f"p{int(q * 100)}": round(_quantile(ordered, q), 4) for q in LATENCY_QUANTILES}
+                }
+            return {
+                'started_at': self.started_at.isoformat(),
+                'wall_seconds': round(time.monotonic() - self._started, 3),
+                'stages': {name: round(seconds, 3) for name, seconds in self.stages.items()},
+                'accounts': dict(self.outcomes),
+                'riot_latency_seconds': latency,
+                'riot_statuses': {region: dict(statuses) for region, statuses in self.statuses.items()},
+                'db_writes': dict(self.db_writes)
+            }
+
+    def write(self, jsonl_path: str = RANK_TELEMETRY_JSONL, prom_path: str = RANK_TELEMETRY_PROM) -> Dict[str, Any]:
+        """Emit the run summary as a JSON line and a Prometheus textfile. Returns the summary."""
+        summary = self.summary()
+        jsonl_path = telemetry_path(jsonl_path)
+        prom_path = telemetry_path(prom_path)
+        if jsonl_path or prom_path:
+            try:
+                os.makedirs(PROCESSOR_TELEMETRY_DIR, exist_ok=True)
+            except OSError as e:
+                logger.warning(f"Failed to create telemetry directory {PROCESSOR_TELEMETRY_DIR}: {str(e)}")
+        if jsonl_path:
+            try:
+                with open(jsonl_path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(summary, separators=(',', ':')) + '\n')
+            except OSError as e:
+                logger.warning(f"Failed to write run telemetry to {jsonl_path}: {str(e)}")
+        if prom_path:
+            try:
+                # Write then rename so the collector never reads a half-written file
+                tmp_path = f"{prom_path}.{os.getpid()}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    f.write(self.to_prometheus(summary))
+                os.replace(tmp_path, prom_path)
+            except OSError as e:
+                logger.warning(f"Failed to write run telemetry to {prom_path}: {str(e)}")
+        return summary
+
+    @staticmethod
+    def to_prometheus(summary: Dict[str, Any]) -> str:
+        started = datetime.fromisoformat(summary['started_at']).timestamp()
+        lines = [
+            '# HELP rank_audit_last_run_timestamp_seconds Start of the last processor run.',
+            '# TYPE rank_audit_last_run_timestamp_seconds gauge',
+            f"rank_audit_last_run_timestamp_seconds {started:.0f}",
+            '# HELP rank_audit_last_run_duration_seconds Wall time of the last processor run.',
+            '# TYPE rank_audit_last_run_duration_seconds gauge',
+            f"rank_audit_last_run_duration_seconds {summary['wall_seconds']}",
+            '# HELP rank_audit_last_run_stage_seconds Time spent per stage in the last run.',
+            '# TYPE rank_audit_last_run_stage_seconds gauge',
+        ]
+        lines += [f'rank_audit_last_run_stage_seconds{{stage="{stage}"}} {seconds}'
+                  for stage, seconds in summary['stages'].items()]
+        lines += [
+            '# HELP rank_audit_last_run_accounts Accounts by outcome in the last run.',
+            '# TYPE rank_audit_last_run_accounts gauge',
+        ]
+        lines += [f'rank_audit_last_run_accounts{{outcome="{outcome}"}} {count}'
+                  for outcome, count in summary['accounts'].items()]
+        lines += [
+            '# HELP rank_audit_last_run_db_writes Database writes (rows) by kind in the last run.',
+            '# TYPE rank_audit_last_run_db_writes gauge',
+        ]
+        lines += [f'rank_audit_last_run_db_writes{{kind="{kind}"}} {count}'
+                  for kind, count in summary['db_writes'].items()]
+        lines += [
+            '# HELP rank_audit_last_run_riot_latency_seconds Riot API latency by region in the last run.',
+            '# TYPE rank_audit_last_run_riot_latency_seconds histogram',
+        ]
+        for region, latency in summary['riot_latency_seconds'].items():
+            for bound, count in latency['buckets'].items():
+                lines.append(f'rank_audit_last_run_riot_latency_seconds_bucket{{region="{region}",le="{bound}"}} {count}')
+            lines += [
+                f'rank_audit_last_run_riot_latency_seconds_bucket{{region="{region}",le="+Inf"}} {latency["count"]}',
+                f'rank_audit_last_run_riot_latency_seconds_sum{{region="{region}"}} {latency["sum"]}',
+                f'rank_audit_last_run_riot_latency_seconds_count{{region="{region}"}} {latency["count"]}',
+            ]
+        lines += [
+            '# HELP rank_audit_last_run_riot_requests Riot API responses by region and status in the last run.',
+            '# TYPE rank_audit_last_run_riot_requests gauge',
+        ]
+        for region, statuses in summary['riot_statuses'].items():
+            for status, count in statuses.items():
+                lines.append(f'rank_audit_last_run_riot_requests{{region="{region}",status="{status}"}} {count}')
+        return '\n'.join(lines) + '\n'
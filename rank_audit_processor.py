@@ -5,10 +5,25 @@ import jwt
 import json
 import redis
 from datetime import datetime, timezone, timedelta
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 import sys
 import os
+import concurrent.futures
+import signal
+import threading
 from supabase import create_client, Client
+from riot_client import RiotClient
+from riot_rate_limiter import LANE_BACKGROUND, RiotRateLimiter, RiotRateLimitError
+from league_cache import LeagueSnapshotCache
+from rank_freshness import CALLER_PROCESSOR, RANK_FINGERPRINT_KEY, freshness_stamp, rank_fingerprint, rank_is_fresh
+from rank_poll_scheduler import RankPollScheduler
+from sweep_queue import SweepQueue, shard_of
+from member_stats_dirty import mark_riot_ids_dirty, restore_dirty, take_dirty
+from processor_telemetry import RunTelemetry
+from rank_rollup import fetch_daily_rank_events
+from rank_event_stream import iter_rank_event_pages
+from smart_filter import smart_filter_chunks
+from member_series_cache import append_events, series_from_events, series_key, store_series
 #Test hook next
 # Try to load dotenv if available, otherwise use system environment variables
 try:
@@ -46,6 +61,10 @@ class RedisCacheFilter(logging.Filter):
 # Apply the filter to the logger
 logger.addFilter(RedisCacheFilter())
 
+# Per-run throughput is always reported, separately from the filtered logger above
+stats_logger = logging.getLogger(f"{__name__}.stats")
+stats_logger.setLevel(logging.INFO)
+
 # Configuration
 FLASK_API_BASE_URL = os.environ.get('FLASK_API_BASE_URL')
 JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY')
@@ -84,9 +103,46 @@ redis_client = redis.Redis(
     decode_responses=True
 )
 
-# Batch processing configuration
-BATCH_SIZE = 10
-BATCH_DELAY = 10  # seconds
+# Shared pooled Riot API client (same as app.py). The processor is background work:
+# it only uses quota left over by interactive requests, and queues for longer instead
+# of failing fast.
+RIOT_PROCESSOR_MAX_WAIT = float(os.environ.get('RIOT_PROCESSOR_MAX_WAIT', 60))
+# Stage timings, Riot latencies and write counts of the current run (see processor_telemetry.py)
+telemetry = RunTelemetry()
+riot_rate_limiter = RiotRateLimiter(redis_client)
+riot_client = RiotClient(RIOT_API_KEY, rate_limiter=riot_rate_limiter, max_wait=RIOT_PROCESSOR_MAX_WAIT,
+                         lane=LANE_BACKGROUND, on_response=telemetry.record_riot_response)
+# League snapshots shared with app.py, so accounts just looked up by users aren't re-fetched
+league_cache = LeagueSnapshotCache(riot_client, redis_client)
+# Polls active players every run and backs off dormant ones (see rank_poll_scheduler.py)
+rank_poll_scheduler = RankPollScheduler(redis_client)
+
+# Keep-alive session for calls to the Flask API (reused across sweeps in daemon mode)
+flask_api_session = requests.Session()
+
+# Daemon mode (--daemon): seconds between sweep starts, full account list re-download
+# interval, and how long one processor JWT is used before minting a new one
+RANK_SWEEP_INTERVAL = int(os.environ.get('RANK_SWEEP_INTERVAL', 1800))
+RANK_ACCOUNTS_FULL_REFRESH = int(os.environ.get('RANK_ACCOUNTS_FULL_REFRESH', 86400))
+PROCESSOR_TOKEN_LIFETIME = 12 * 3600
+
+# Accounts processed concurrently. Workers share the background rate-limit lane, so
+# actual throughput follows the limits Riot reports rather than a fixed batch delay.
+PROCESSOR_WORKERS = int(os.environ.get('PROCESSOR_WORKERS', 10))
+
+# Rank audit events are written in bulk upserts of this many rows, keyed on the
+# rank_audit_events_daily_key unique constraint (see RANK_AUDIT_EVENTS_SETUP.md)
+RANK_AUDIT_UPSERT_CHUNK = int(os.environ.get('RANK_AUDIT_UPSERT_CHUNK', 200))
+RANK_AUDIT_EVENT_KEY = 'riot_id,wins,losses,local_day'
+
+# process_riot_account outcomes
+RESULT_CHANGED = 'changed'
+RESULT_UNCHANGED = 'unchanged'
+RESULT_UNRANKED = 'unranked'
+RESULT_FAILED = 'failed'
+
+# Tiers Riot serves as one league list per region (every player's LP, wins and losses)
+APEX_TIERS = ('CHALLENGER', 'GRANDMASTER', 'MASTER')
 
 def create_jwt_token(user_id: int, riot_id: str) -> str:
     """Create a JWT token for authentication"""
@@ -194,30 +250,32 @@ def rank_to_elo(rank_str: str) -> int:
         return add_lp_to_elo(rank_str, base_elo)
     return 0
 
-def get_all_riot_accounts(token: str) -> List[Dict[str, Any]]:
-    """Fetch all riot accounts from the database via Flask API"""
+def get_all_riot_accounts(token: str, updated_since: Optional[str] = None) -> Optional[List[Dict[str, Any]]]:
+    """
+    Fetch riot accounts from the database via Flask API (None if the request failed).
+    updated_since limits it to accounts created or updated after that ISO timestamp.
+    """
     try:
         headers = get_auth_headers(token)
-        response = requests.get(f"{FLASK_API_BASE_URL}/api/riot-accounts", headers=headers, timeout=30)
+        params = {'updated_since': updated_since} if updated_since else None
+        response = flask_api_session.get(f"{FLASK_API_BASE_URL}/api/riot-accounts", headers=headers,
+                                         params=params, timeout=30)
         
         if response.status_code == 200:
             data = response.json()
             accounts = data.get('accounts', [])
             return accounts
         else:
-            return []
+            return None
             
     except Exception as e:
-        return []
+        return None
 
 def fetch_league_data(riot_id: str, region: str) -> Optional[Dict[str, Any]]:
     """Fetch league data from Riot API for a given riot_id"""
     try:
         # Use the region directly from the user's account
-        url = f"https://{region}.api.riotgames.com/tft/league/v1/by-puuid/{riot_id}"
-        headers = {'X-Riot-Token': RIOT_API_KEY}
-        
-        response = requests.get(url, headers=headers, timeout=10)
+        response = league_cache.get(region, riot_id)
         
         if response.status_code == 200:
             league_data = response.json()
@@ -229,6 +287,9 @@ def fetch_league_data(riot_id: str, region: str) -> Optional[Dict[str, Any]]:
         else:
             return None
             
+    except RiotRateLimitError:
+        # Quota still exhausted after queueing; this account is retried next run
+        return None
     except requests.exceptions.Timeout:
         return None
     except requests.exceptions.RequestException as e:
@@ -236,6 +297,43 @@ def fetch_league_data(riot_id: str, region: str) -> Optional[Dict[str, Any]]:
     except Exception as e:
         return None
 
+def is_apex_rank(rank_str: Optional[str]) -> bool:
+    """True for stored ranks like 'MASTER I 120LP'"""
+    return bool(rank_str) and rank_str.split()[0].upper() in APEX_TIERS
+
+def fetch_apex_league_entries(regions) -> Dict[str, Dict[str, Any]]:
+    """
+    League entries for every apex-tier player in the given regions, by puuid.
+    
+    Entries are shaped like the by-puuid league endpoint's RANKED_TFT entry, so they
+    go through extract_rank_data unchanged. Failed list fetches are simply skipped;
+    their players fall back to per-puuid lookups.
+    """
+    entries = {}
+    for region in regions:
+        for tier in APEX_TIERS:
+            try:
+                response = riot_client.get_apex_league(region, tier.lower())
+            except (RiotRateLimitError, requests.exceptions.RequestException):
+                continue
+            if response.status_code != 200:
+                continue
+            league = response.json()
+            for entry in league.get('entries', []):
+                puuid = entry.get('puuid')
+                if not puuid:
+                    continue
+                entries[puuid] = {
+                    'queueType': 'RANKED_TFT',
+                    'tier': league.get('tier', tier),
+                    'rank': entry.get('rank', 'I'),
+                    'leaguePoints': entry.get('leaguePoints', 0),
+                    'wins': entry.get('wins', 0),
+                    'losses': entry.get('losses', 0),
+                    'puuid': puuid
+                }
+    return entries
+
 def extract_rank_data(league_data: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
     """Extract rank data from league API response"""
     try:
@@ -292,379 +390,530 @@ def extract_rank_data(league_data: List[Dict[str, Any]]) -> Optional[Dict[str, A
 
 
 
-def create_rank_audit_event(riot_id: str, rank_data: Dict[str, Any], token: str) -> bool:
-    """Create a rank audit event in the database via Flask API"""
+def upsert_rank_audit_events(events: List[Dict[str, Any]]) -> bool:
+    """
+    Write a chunk of rank audit events in one round trip.
+    
+    Keyed on (riot_id, wins, losses, local_day): a player whose record hasn't changed
+    today replaces today's event instead of adding another one.
+    """
     try:
-        # Check if wins/losses have changed by comparing with the most recent event
-        def get_latest_event():
-            return supabase.table('rank_audit_events').select('id, wins, losses').eq('riot_id', riot_id).order('created_at', desc=True).limit(1).execute()
-        
-        latest_response = get_latest_event()
+        def upsert_events():
+            return supabase.table('rank_audit_events').upsert(
+                events, on_conflict=RANK_AUDIT_EVENT_KEY
+            ).execute()
         
-        current_time = datetime.now(timezone.utc).isoformat()
-        
-        event_data = {
-            'created_at': current_time,
-            'elo': rank_data['elo'],
-            'wins': rank_data['wins'],
-            'losses': rank_data['losses'],
-            'riot_id': riot_id
-        }
-        
-        # If no previous events exist, create the event
-        if not latest_response or not latest_response.data:
-            # Create new event
-            headers = get_auth_headers(token)
-            response = requests.post(
-                f"{FLASK_API_BASE_URL}/api/rank-audit-events",
-                json=event_data,
-                headers=headers,
-                timeout=10
-            )
-            
-            if response.status_code == 201:
-                return True
-            else:
-                return False
-        
-        # Check if wins/losses are the same as the most recent event
-        latest_event = latest_response.data[0]
-        latest_wins = latest_event.get('wins', 0)
-        latest_losses = latest_event.get('losses', 0)
+        response = upsert_events()
+        if response and response.data is not None:
+            telemetry.count_db_write('rank_audit_events', len(events))
+            return True
+        return False
         
-        if rank_data['wins'] == latest_wins and rank_data['losses'] == latest_losses:
-            # Same wins/losses - replace the previous event with the most recent one
-            latest_event_id = latest_event.get('id')
-            
-            if latest_event_id:
-                # Update the existing event with new timestamp and ELO
-                headers = get_auth_headers(token)
-                response = requests.put(
-                    f"{FLASK_API_BASE_URL}/api/rank-audit-events/{latest_event_id}",
-                    json=event_data,
-                    headers=headers,
-                    timeout=10
-                )
-                
-                if response.status_code == 200:
-                    return True
-                else:
-                    return False
-            else:
-                # Fallback: create new event if we can't update
-                headers = get_auth_headers(token)
-                response = requests.post(
-                    f"{FLASK_API_BASE_URL}/api/rank-audit-events",
-                    json=event_data,
-                    headers=headers,
-                    timeout=10
-                )
-                
-                if response.status_code == 201:
-                    return True
-                else:
-                    return False
-        else:
-            # Different wins/losses - create new event
-            headers = get_auth_headers(token)
-            response = requests.post(
-                f"{FLASK_API_BASE_URL}/api/rank-audit-events",
-                json=event_data,
-                headers=headers,
-                timeout=10
-            )
-            
-            if response.status_code == 201:
-                return True
-            else:
-                return False
-            
     except Exception as e:
+        stats_logger.warning(f"Failed to upsert {len(events)} rank audit events: {str(e)}")
         return False
 
-def update_riot_account_rank(riot_id: str, rank_str: str, token: str) -> bool:
-    """Update the rank column in the riot_accounts table directly using riot_id"""
+def update_riot_account_ranks(ranks: Dict[str, str]) -> bool:
+    """
+    Set rank and date_updated of a chunk of accounts (riot_id -> rank) after their events landed.
+    
+    Only updates existing rows: an account deleted in the meantime stays deleted, and no
+    other column is touched. One round trip through the update_riot_account_ranks function
+    (see RANK_AUDIT_EVENTS_SETUP.md); until it is set up, one update per distinct rank.
+    """
+    if not ranks:
+        return True
+    stamp = freshness_stamp()
     try:
-        # Update the rank directly in the database using Supabase with riot_id
-        update_response = supabase.table('riot_accounts').update({'rank': rank_str}).eq('riot_id', riot_id).execute()
-        
-        if update_response.data:
-            return True
-        else:
-            return False
-            
+        supabase.rpc('update_riot_account_ranks', {
+            'p_ranks': [{'riot_id': riot_id, 'rank': rank} for riot_id, rank in ranks.items()],
+            'p_date_updated': stamp
+        }).execute()
+        telemetry.count_db_write('riot_accounts', len(ranks))
+        return True
     except Exception as e:
+        stats_logger.warning(f"update_riot_account_ranks unavailable, updating ranks one by one: {str(e)}")
+    
+    riot_ids_by_rank = {}
+    for riot_id, rank in ranks.items():
+        riot_ids_by_rank.setdefault(rank, []).append(riot_id)
+    try:
+        for rank, riot_ids in riot_ids_by_rank.items():
+            supabase.table('riot_accounts').update({'rank': rank, 'date_updated': stamp}).in_('riot_id', riot_ids).execute()
+        telemetry.count_db_write('riot_accounts', len(ranks))
+        return True
+    except Exception as e:
+        stats_logger.warning(f"Failed to update the rank of {len(ranks)} riot accounts: {str(e)}")
         return False
 
-def process_riot_account(account: Dict[str, Any], token: str) -> bool:
-    """Process a single riot account"""
+def load_rank_fingerprints(riot_ids: List[str]) -> Dict[str, str]:
+    """Stored fingerprints for these riot_ids (empty if Redis is unavailable: everything gets written)"""
+    if not riot_ids:
+        return {}
+    try:
+        values = redis_client.hmget(RANK_FINGERPRINT_KEY, riot_ids)
+        return {riot_id: value for riot_id, value in zip(riot_ids, values) if value}
+    except Exception as e:
+        return {}
+
+def save_rank_fingerprints(fingerprints: Dict[str, str]):
+    if not fingerprints:
+        return
+    try:
+        redis_client.hset(RANK_FINGERPRINT_KEY, mapping=fingerprints)
+    except Exception as e:
+        pass
+
+def process_riot_account(account: Dict[str, Any],
+                         league_data: Optional[List[Dict[str, Any]]] = None,
+                         last_fingerprint: Optional[str] = None
+                         ) -> Tuple[str, Optional[Dict[str, Any]], Optional[str], Optional[str]]:
+    """
+    Refresh a single riot account's rank.
+    
+    Returns (result, event, fingerprint, rank_str): RESULT_CHANGED with the rank audit
+    event and the new rank for the chunk's bulk writes, RESULT_UNCHANGED when the reading
+    matches last_fingerprint (nothing is written), RESULT_UNRANKED for a player without a
+    ranked TFT entry, or RESULT_FAILED. Nothing is written here. league_data: entries
+    already fetched in bulk.
+    """
     riot_id = account.get('riot_id')
     region = account.get('region', 'americas')
-    user_id = account.get('user_id')
     
     if not riot_id:
-        return False
+        return RESULT_FAILED, None, None, None
     
     # Fetch league data
-    league_data = fetch_league_data(riot_id, region)
-    if not league_data:
-        return False
+    if league_data is None:
+        league_data = fetch_league_data(riot_id, region)
+    if league_data is None:
+        return RESULT_FAILED, None, None, None
     
     # Extract rank data
     rank_data = extract_rank_data(league_data)
     if not rank_data:
-        return False
-    
-    # Create rank audit event
-    success = create_rank_audit_event(riot_id, rank_data, token)
+        # Unranked: nothing to record, but back off like any player who isn't playing
+        rank_poll_scheduler.record(riot_id, 0)
+        return RESULT_UNRANKED, None, None, None
     
-    # Update the rank in the riot_accounts table
-    update_riot_account_rank(riot_id, rank_data['rank_str'], token)
+    fingerprint = rank_fingerprint(rank_data)
+    if fingerprint == last_fingerprint:
+        rank_poll_scheduler.record(riot_id, rank_data['wins'] + rank_data['losses'])
+        return RESULT_UNCHANGED, None, fingerprint, None
     
-    return success
+    return RESULT_CHANGED, {
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'elo': rank_data['elo'],
+        'wins': rank_data['wins'],
+        'losses': rank_data['losses'],
+        'riot_id': riot_id
+    }, fingerprint, rank_data['rank_str']
 
-def process_batch(accounts: List[Dict[str, Any]], token: str) -> int:
-    """Process a batch of riot accounts"""
+def process_accounts(accounts: List[Dict[str, Any]],
+                     apex_cache: Optional[Dict[str, Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """
+    Process riot accounts on a worker pool paced by the shared rate limiter.
+    
+    apex_cache (region -> apex league entries) carries league lists between calls, so
+    a run fetches each region's lists once however many shards it processes.
+    """
+    started = time.monotonic()
     successful = 0
+    unchanged = 0
+    unranked = 0
     failed = 0
     
-    for account in accounts:
+    # Accounts refreshed moments ago by the app (which records their event itself) or a
+    # previous run need nothing, and dormant players are only polled when their backoff says so
+    candidates = [account for account in accounts if not rank_is_fresh(account, CALLER_PROCESSOR)]
+    due_ids = rank_poll_scheduler.due(account.get('riot_id') for account in candidates)
+    due_accounts = [account for account in candidates if account.get('riot_id') in due_ids]
+    
+    # One league list call per apex tier and region replaces a call per apex player
+    apex_cache = {} if apex_cache is None else apex_cache
+    apex_regions = {account.get('region', 'americas') for account in due_accounts if is_apex_rank(account.get('rank'))}
+    for region in apex_regions - apex_cache.keys():
+        apex_cache[region] = fetch_apex_league_entries([region])
+    apex_entries = {}
+    for region in apex_regions:
+        apex_entries.update(apex_cache[region])
+    
+    fingerprints = load_rank_fingerprints([account['riot_id'] for account in due_accounts])
+    
+    def process(account):
         try:
-            if process_riot_account(account, token):
-                successful += 1
-            else:
-                failed += 1
+            riot_id = account.get('riot_id')
+            apex_entry = apex_entries.get(riot_id)
+            return process_riot_account(account, [apex_entry] if apex_entry else None,
+                                        fingerprints.get(riot_id))
         except Exception as e:
-            failed += 1
+            return RESULT_FAILED, None, None, None
     
-    return successful
+    pending_events = []
+    pending_fingerprints = {}
+    pending_ranks = {}
+    
+    def flush_events():
+        nonlocal successful, failed
+        if upsert_rank_audit_events(pending_events):
+            successful += len(pending_events)
+            # Ranks are written only once their events landed, and fingerprints only once
+            # both did, so a chunk that failed either way is rewritten next time
+            if update_riot_account_ranks(pending_ranks):
+                save_rank_fingerprints(pending_fingerprints)
+            mark_riot_ids_dirty(redis_client, append_events(redis_client, pending_events))
+            for event in pending_events:
+                rank_poll_scheduler.record(event['riot_id'], event['wins'] + event['losses'])
+        else:
+            # Not rescheduled, so these accounts are due again next run
+            failed += len(pending_events)
+        pending_events.clear()
+        pending_fingerprints.clear()
+        pending_ranks.clear()
+    
+    with concurrent.futures.ThreadPoolExecutor(max_workers=PROCESSOR_WORKERS) as executor:
+        for result, event, fingerprint, rank_str in executor.map(process, due_accounts):
+            if result == RESULT_UNCHANGED:
+                unchanged += 1
+                continue
+            if result == RESULT_UNRANKED:
+                unranked += 1
+                continue
+            if result == RESULT_FAILED:
+                failed += 1
+                continue
+            pending_events.append(event)
+            pending_fingerprints[event['riot_id']] = fingerprint
+            pending_ranks[event['riot_id']] = rank_str
+            if len(pending_events) >= RANK_AUDIT_UPSERT_CHUNK:
+                flush_events()
+    if pending_events:
+        flush_events()
+    
+    elapsed = time.monotonic() - started
+    return {
+        'accounts': len(accounts),
+        'skipped_fresh': len(accounts) - len(candidates),
+        'skipped_not_due': len(candidates) - len(due_accounts),
+        'polled': len(due_accounts),
+        'from_apex_lists': sum(1 for account in due_accounts if account.get('riot_id') in apex_entries),
+        'successful': successful,
+        'unchanged': unchanged,
+        'unranked': unranked,
+        'failed': failed,
+        'elapsed_seconds': round(elapsed, 1),
+        'accounts_per_second': round(len(due_accounts) / elapsed, 2) if elapsed > 0 else 0.0
+    }
 
-def main():
-    """Main function to process all riot accounts"""
+def run_sweep(accounts: List[Dict[str, Any]], stop: Optional[threading.Event] = None) -> Dict[str, Any]:
+    """
+    Work through shards of the shared sweep until none are left (see sweep_queue.py).
+    
+    Other processor instances may be claiming shards of the same sweep at the same time;
+    shards committed before a crash are not processed again. Falls back to processing
+    every account here when Redis is unavailable. Setting stop ends the run after the
+    shard in progress; the rest of the sweep is left for the next run or other instances.
+    """
+    started = time.monotonic()
+    apex_cache = {}
+    totals = {}
+    
+    def add_stats(stats):
+        for field, value in stats.items():
+            if field not in ('elapsed_seconds', 'accounts_per_second'):
+                totals[field] = totals.get(field, 0) + value
+    
+    try:
+        queue = SweepQueue(redis_client)
+        queue.join()
+    except Exception as e:
+        queue = None
+    
+    if queue is None:
+        add_stats(process_accounts(accounts, apex_cache))
+        totals['shards'] = 1
+    else:
+        accounts_by_shard = {}
+        for account in accounts:
+            if account.get('riot_id'):
+                accounts_by_shard.setdefault(shard_of(account['riot_id'], queue.shards), []).append(account)
+        
+        totals['shards'] = 0
+        while stop is None or not stop.is_set():
+            try:
+                shard = queue.claim()
+            except Exception as e:
+                break
+            if shard is None:
+                break
+            stop_heartbeat = queue.keep_alive(shard)
+            try:
+                add_stats(process_accounts(accounts_by_shard.get(shard, []), apex_cache))
+            finally:
+                stop_heartbeat.set()
+            try:
+                queue.commit(shard)
+            except Exception as e:
+                pass
+            totals['shards'] += 1
+    
+    elapsed = time.monotonic() - started
+    totals.setdefault('accounts', 0)
+    totals['elapsed_seconds'] = round(elapsed, 1)
+    totals['accounts_per_second'] = round(totals.get('polled', 0) / elapsed, 2) if elapsed > 0 else 0.0
+    for field in ('skipped_fresh', 'skipped_not_due', 'from_apex_lists', 'successful', 'unchanged', 'unranked', 'failed'):
+        totals.setdefault(field, 0)
+    return totals
+
+# Cached member series and group entries live for 2 hours; nothing new keeps them until then
+MEMBER_STATS_CACHE_TTL = 7200
+# Rows per page when a read may exceed Supabase's row limit
+PAGE_SIZE = 1000
+
+def fetch_all_rows(build_query) -> List[Dict[str, Any]]:
+    """Every row of a (stably ordered) query, paged past the row limit"""
+    rows = []
+    offset = 0
+    while True:
+        page = build_query().range(offset, offset + PAGE_SIZE - 1).execute()
+        page_rows = page.data or []
+        rows.extend(page_rows)
+        if len(page_rows) < PAGE_SIZE:
+            return rows
+        offset += PAGE_SIZE
+
+def fetch_events_for_riot_ids(riot_ids: List[str]) -> List[Dict[str, Any]]:
+    """
+    Chart events for all these riot_ids: one per member per day from the rank_audit_daily
+    rollup or, when the rollup isn't available, from raw rank audit events streamed and
+    downsampled page by page.
+    """
+    try:
+        return fetch_daily_rank_events(supabase, riot_ids)
+    except Exception as e:
+        logger.warning(f"Redis cache population: rank_audit_daily unavailable, reading raw events: {str(e)}")
+    
+    return smart_filter_chunks(iter_rank_event_pages(supabase, riot_ids))
+
+def build_group_index(riot_id_to_name: Dict[str, str]) -> Dict[str, Any]:
+    """member_stats_group_{id} contents for a group (its events are composed from member series)"""
+    return {
+        "memberNames": riot_id_to_name,
+        "liveData": {},  # Empty for cached data
+        "cached_at": datetime.now(timezone.utc).isoformat()
+    }
+
+def add_data_to_redis_server():
+    """
+    Rebuild the member series and group caches that need it (see member_series_cache.py).
+    
+    A member's series is rebuilt when they got new rank events since the last run (see
+    member_stats_dirty.py) or when it expired while their group is being rebuilt. A
+    group's entry is rebuilt when its membership changed or its key expired. Members
+    and events are read together rather than group by group, and every key is written
+    through one pipeline.
+    """
+    logger.warning("Starting Redis cache population for member stats...")
+    
+    dirty_group_ids, dirty_riot_ids = take_dirty(redis_client)
+    try:
+        # Groups whose cache has expired are rebuilt too
+        study_groups_response = supabase.table('study_group').select('id').execute()
+        group_ids = [group['id'] for group in (study_groups_response.data or [])]
+        pipe = redis_client.pipeline(transaction=False)
+        for group_id in group_ids:
+            pipe.exists(f"member_stats_group_{group_id}")
+        expired_group_ids = {group_id for group_id, exists in zip(group_ids, pipe.execute()) if not exists}
+        rebuild_group_ids = (dirty_group_ids | expired_group_ids) & set(group_ids)
+        
+        # Members of every group being rebuilt, in one query
+        names_by_group = {group_id: {} for group_id in rebuild_group_ids}
+        if rebuild_group_ids:
+            members = fetch_all_rows(lambda: supabase.table('user_to_study_group').select(
+                'study_group_id, riot_id, riot_accounts!inner(summoner_name, region)'
+            ).in_('study_group_id', list(rebuild_group_ids)).order('study_group_id').order('riot_id'))
+            for member in members:
+                riot_account = member.get('riot_accounts')
+                if riot_account:
+                    names_by_group[member['study_group_id']][member['riot_id']] = riot_account['summoner_name']
+        
+        # Series of members with new events, and of rebuilt groups' members that have none cached
+        rebuild_riot_ids = set(dirty_riot_ids)
+        group_riot_ids = sorted({riot_id for names in names_by_group.values() for riot_id in names} - rebuild_riot_ids)
+        pipe = redis_client.pipeline(transaction=False)
+        for riot_id in group_riot_ids:
+            pipe.exists(series_key(riot_id))
+        rebuild_riot_ids.update(riot_id for riot_id, exists in zip(group_riot_ids, pipe.execute()) if not exists)
+        
+        if not rebuild_group_ids and not rebuild_riot_ids:
+            logger.warning(f"Redis cache population: all {len(group_ids)} group caches up to date")
+            return
+        logger.warning(f"Redis cache population: rebuilding {len(rebuild_riot_ids)} member series and "
+                       f"{len(rebuild_group_ids)} of {len(group_ids)} groups")
+        
+        rebuild_riot_id_list = sorted(rebuild_riot_ids)
+        series = series_from_events(
+            fetch_events_for_riot_ids(rebuild_riot_id_list) if rebuild_riot_id_list else [], rebuild_riot_id_list
+        )
+        
+        pipe = redis_client.pipeline(transaction=False)
+        store_series(pipe, series, MEMBER_STATS_CACHE_TTL)
+        for group_id, riot_id_to_name in names_by_group.items():
+            redis_key = f"member_stats_group_{group_id}"
+            if not riot_id_to_name:
+                logger.warning(f"No members found for group {group_id} in Redis cache population")
+                pipe.delete(redis_key)
+                continue
+            pipe.setex(redis_key, MEMBER_STATS_CACHE_TTL, json.dumps(build_group_index(riot_id_to_name)))
+        pipe.execute()
+        telemetry.count_db_write('member_series_cache', len(series))
+        telemetry.count_db_write('member_stats_cache', len(names_by_group))
+        
+        logger.warning(f"Successfully cached data for {len(series)} member series and {len(names_by_group)} groups")
+        logger.warning("Redis cache population completed")
+        
+    except Exception as e:
+        # Nothing was rebuilt for sure: keep the marks for the next run
+        restore_dirty(redis_client, dirty_group_ids, dirty_riot_ids)
+        logger.warning(f"Error in Redis cache population: {str(e)}")
+
+def run_once(accounts: List[Dict[str, Any]], stop: Optional[threading.Event] = None):
+    """
+    One sweep over the accounts, then refresh the group stats cache. The run's
+    telemetry (started by the caller) is written out at the end.
+    """
+    with telemetry.stage('sweep'):
+        run_stats = run_sweep(accounts, stop)
+    telemetry.set_outcomes({
+        'scanned': run_stats['accounts'],
+        'skipped_fresh': run_stats['skipped_fresh'],
+        'skipped_not_due': run_stats['skipped_not_due'],
+        'polled': run_stats.get('polled', 0),
+        'from_apex_lists': run_stats['from_apex_lists'],
+        'changed': run_stats['successful'],
+        'unchanged': run_stats['unchanged'],
+        'unranked': run_stats['unranked'],
+        'failed': run_stats['failed']
+    })
+    stats_logger.info(
+        f"Processed {run_stats['accounts']} accounts ({run_stats['shards']} shards) in {run_stats['elapsed_seconds']}s "
+        f"({run_stats['accounts_per_second']} accounts/s, {PROCESSOR_WORKERS} workers): "
+        f"{run_stats['successful']} updated, {run_stats['unchanged']} unchanged, {run_stats['unranked']} unranked, "
+        f"{run_stats['failed']} failed, "
+        f"{run_stats['skipped_fresh']} skipped as fresh, {run_stats['skipped_not_due']} not due, "
+        f"{run_stats['from_apex_lists']} served by apex league lists"
+    )
+
+    # Call the Redis caching function
+    try:
+        with telemetry.stage('cache_population'):
+            add_data_to_redis_server()
+        logger.warning("Redis cache population completed successfully")
+    except Exception as e:
+        logger.warning(f"Error during Redis cache population: {str(e)}")
+        logger.warning("Continuing with normal processing completion...")
+    
+    summary = telemetry.write()
+    stats_logger.info(f"Run finished in {summary['wall_seconds']}s: stages {summary['stages']}, "
+                      f"DB writes {summary['db_writes']}")
+
+def create_processor_token() -> str:
     # Create a JWT token for authentication (using a system user ID)
     # You might want to create a dedicated system user for this
     system_user_id = 1  # Assuming user ID 1 exists, or create a system user
     system_riot_id = "system_audit_processor"
-    token = create_jwt_token(system_user_id, system_riot_id)
+    return create_jwt_token(system_user_id, system_riot_id)
+
+def main():
+    """Main function to process all riot accounts"""
+    token = create_processor_token()
+    telemetry.start()
     
     # Get all riot accounts
-    accounts = get_all_riot_accounts(token)
+    with telemetry.stage('account_list'):
+        accounts = get_all_riot_accounts(token)
     if not accounts:
         return
     
-    total_accounts = len(accounts)
+    run_once(accounts)
+
+class AccountList:
+    """
+    The daemon's resident copy of riot_accounts.
+    
+    After the first full download, refreshes only ask for accounts created or updated
+    since the last one. A full download every RANK_ACCOUNTS_FULL_REFRESH seconds drops
+    accounts that were deleted.
+    """
     
-    # Process accounts in batches
-    total_processed = 0
-    total_successful = 0
+    def __init__(self):
+        self.accounts = {}
+        self.synced_at = None
+        self.full_synced_at = None
     
-    for i in range(0, total_accounts, BATCH_SIZE):
-        batch = accounts[i:i + BATCH_SIZE]
-        batch_num = (i // BATCH_SIZE) + 1
-        total_batches = (total_accounts + BATCH_SIZE - 1) // BATCH_SIZE
+    def refresh(self, token: str) -> List[Dict[str, Any]]:
+        now = datetime.now(timezone.utc)
+        full = self.full_synced_at is None or (now - self.full_synced_at).total_seconds() >= RANK_ACCOUNTS_FULL_REFRESH
+        # Small overlap so rows committed while the previous refresh ran aren't missed
+        since = None if full else (self.synced_at - timedelta(seconds=60)).isoformat()
         
-        successful = process_batch(batch, token)
-        total_successful += successful
-        total_processed += len(batch)
+        fetched = get_all_riot_accounts(token, updated_since=since)
+        if fetched is None:
+            # Keep working from the last good copy
+            return list(self.accounts.values())
         
-        # Wait before next batch (except for the last batch)
-        if i + BATCH_SIZE < total_accounts:
-            time.sleep(BATCH_DELAY)
+        if full:
+            self.accounts = {}
+            self.full_synced_at = now
+        for account in fetched:
+            if account.get('riot_id'):
+                self.accounts[account['riot_id']] = account
+        self.synced_at = now
+        return list(self.accounts.values())
 
-    def add_data_to_redis_server():
-        """Add member stats data to Redis cache for all study groups"""
-        logger.warning("Starting Redis cache population for member stats...")
+def run_daemon():
+    """
+    Stay resident and sweep every RANK_SWEEP_INTERVAL seconds, reusing the Riot, Supabase,
+    Redis and Flask API connections between sweeps. SIGTERM/SIGINT stop the daemon after
+    the shard in progress is committed.
+    """
+    stop = threading.Event()
+    
+    def handle_signal(signum, frame):
+        stats_logger.info(f"Received signal {signum}, stopping after the current shard")
+        stop.set()
+    
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+    
+    account_list = AccountList()
+    token = None
+    token_created = 0.0
+    
+    while not stop.is_set():
+        # Tokens are valid for 24 hours; mint a new one well before that
+        if token is None or time.monotonic() - token_created > PROCESSOR_TOKEN_LIFETIME:
+            token = create_processor_token()
+            token_created = time.monotonic()
         
+        started = time.monotonic()
+        telemetry.start()
         try:
-            # Get all study groups
-            study_groups_response = supabase.table('study_group').select('id, group_name').execute()
-            
-            if not study_groups_response or not study_groups_response.data:
-                logger.warning("No study groups found for Redis cache population")
-                return
-            
-            study_groups = study_groups_response.data
-            logger.warning(f"Found {len(study_groups)} study groups for Redis cache population")
-            
-            for group in study_groups:
-                group_id = group['id']
-                group_name = group['group_name']
-                
-                try:
-                    logger.warning(f"Processing group {group_id}: {group_name} for Redis cache")
-                    
-                    # Get all users in the study group with their riot accounts
-                    members_response = supabase.table('user_to_study_group').select(
-                        'riot_id, riot_accounts!inner(summoner_name, region)'
-                    ).eq('study_group_id', group_id).execute()
-                    
-                    if not members_response or not members_response.data:
-                        logger.warning(f"No members found for group {group_id} in Redis cache population")
-                        continue
-                    
-                    # Extract riot_ids and create mapping of riot_id to summoner_name and region
-                    riot_ids = []
-                    riot_id_to_name = {}
-                    riot_id_to_region = {}
-                    
-                    for member in members_response.data:
-                        riot_id = member['riot_id']
-                        riot_account = member.get('riot_accounts')
-                        
-                        if riot_account:
-                            riot_ids.append(riot_id)
-                            summoner_name = riot_account['summoner_name']
-                            region = riot_account.get('region', 'na1')
-                            
-                            riot_id_to_name[riot_id] = summoner_name
-                            riot_id_to_region[riot_id] = region
-                    
-                    if not riot_ids:
-                        logger.warning(f"No valid Riot IDs found for group {group_id} in Redis cache population")
-                        continue
-                    
-                    # Get rank audit events for these riot_ids
-                    events_response = supabase.table('rank_audit_events').select('*').in_('riot_id', riot_ids).order('created_at').execute()
-                    
-                    if not events_response:
-                        events_response = {'data': []}
-                    
-                    events = events_response.data or []
-                    
-                    # Apply the same optimization logic as get_member_stats
-                    from datetime import datetime, timezone
-                    import pytz
-                    
-                    # Get current date for comparison
-                    current_utc = datetime.now(timezone.utc)
-                    
-                    try:
-                        local_tz = pytz.timezone('America/Los_Angeles')
-                    except:
-                        local_tz = pytz.UTC
-                    
-                    current_local = current_utc.astimezone(local_tz)
-                    current_date = current_local.date().isoformat()
-                    
-                    # Group events by riot_id and date
-                    events_by_riot_id = {}
-                    
-                    for event in events:
-                        riot_id = event['riot_id']
-                        if riot_id not in events_by_riot_id:
-                            events_by_riot_id[riot_id] = {}
-                        
-                        try:
-                            event_utc = datetime.fromisoformat(event['created_at'].replace('Z', '+00:00'))
-                            event_local = event_utc.astimezone(local_tz)
-                            event_date = event_local.date().isoformat()
-                            
-                            if event_date not in events_by_riot_id[riot_id]:
-                                events_by_riot_id[riot_id][event_date] = []
-                            
-                            events_by_riot_id[riot_id][event_date].append(event)
-                        except (KeyError, AttributeError, ValueError) as e:
-                            logger.warn(f"Skipping invalid event: {e}")
-                            continue
-                    
-                    # Apply smart filtering
-                    optimized_events = []
-                    
-                    for riot_id, dates in events_by_riot_id.items():
-                        for event_date, day_events in dates.items():
-                            if not day_events:
-                                continue
-                            
-                            is_today = event_date == current_date
-                            
-                            if is_today:
-                                selected_event = max(day_events, key=lambda x: x['created_at'])
-                            else:
-                                selected_event = max(day_events, key=lambda x: x['elo'])
-                            
-                            optimized_events.append({
-                                'riot_id': riot_id,
-                                'summoner_name': riot_id_to_name.get(riot_id, riot_id),
-                                'created_at': selected_event['created_at'],
-                                'elo': selected_event['elo'],
-                                'wins': selected_event['wins'],
-                                'losses': selected_event['losses']
-                            })
-                    
-                    # Sort and limit events
-                    optimized_events.sort(key=lambda x: x['created_at'])
-                    
-                    MAX_EVENTS_PER_USER = 50
-                    limited_events = []
-                    events_per_user = {}
-                    
-                    for event in optimized_events:
-                        riot_id = event['riot_id']
-                        if riot_id not in events_per_user:
-                            events_per_user[riot_id] = []
-                        events_per_user[riot_id].append(event)
-                    
-                    for riot_id, user_events in events_per_user.items():
-                        user_events.sort(key=lambda x: x['created_at'], reverse=True)
-                        limited_events.extend(user_events[:MAX_EVENTS_PER_USER])
-                    
-                    limited_events.sort(key=lambda x: x['created_at'])
-                    
-                    # Group events by summoner_name
-                    member_stats = {}
-                    for event in limited_events:
-                        riot_id = event['riot_id']
-                        summoner_name = riot_id_to_name.get(riot_id, riot_id)
-                        
-                        if summoner_name not in member_stats:
-                            member_stats[summoner_name] = []
-                        
-                        event_with_name = event.copy()
-                        event_with_name['summoner_name'] = summoner_name
-                        member_stats[summoner_name].append(event_with_name)
-                    
-                    # Flatten all events into a single array
-                    all_events = []
-                    for summoner_name, events_list in member_stats.items():
-                        all_events.extend(events_list)
-                    
-                    # Create the final data structure
-                    cache_data = {
-                        "events": all_events,
-                        "memberNames": riot_id_to_name,
-                        "liveData": {},  # Empty for cached data
-                        "cached_at": datetime.now(timezone.utc).isoformat()
-                    }
-                    
-                    # Store in Redis with group_id as key
-                    redis_key = f"member_stats_group_{group_id}"
-                    redis_client.setex(
-                        redis_key,
-                        7200,  # 2 hours expiration (increased from 30 minutes)
-                        json.dumps(cache_data)
-                    )
-                    
-                    logger.warning(f"Successfully cached data for group {group_id}: {len(all_events)} events, {len(riot_id_to_name)} members")
-                    
-                except Exception as e:
-                    logger.warning(f"Error processing group {group_id} for Redis cache: {str(e)}")
-                    continue
-            
-            logger.warning("Redis cache population completed")
-            
+            with telemetry.stage('account_list'):
+                accounts = account_list.refresh(token)
+            if accounts:
+                run_once(accounts, stop)
         except Exception as e:
-            logger.warning(f"Error in Redis cache population: {str(e)}")
-    
-    # Call the Redis caching function
-    try:
-        add_data_to_redis_server()
-        logger.warning("Redis cache population completed successfully")
-    except Exception as e:
-        logger.warning(f"Error during Redis cache population: {str(e)}")
-        logger.warning("Continuing with normal processing completion...")
-    
+            stats_logger.warning(f"Sweep failed: {str(e)}")
+        
+        stop.wait(max(0.0, RANK_SWEEP_INTERVAL - (time.monotonic() - started)))
     
-    # Only log Redis cache completion, not general processing stats
+    riot_client.close()
+    flask_api_session.close()
+    stats_logger.info("Rank audit processor daemon stopped")
 
 if __name__ == '__main__':
-    main() 
\ No newline at end of file
+    if '--daemon' in sys.argv[1:]:
+        run_daemon()
+    else:
+        main()
@@ -0,0 +1,46 @@
+"""
+Keyset-paged reads of rank_audit_events.
+
+A single select is cut off at PostgREST's max-rows, silently dropping the newest events
+of players with long histories. iter_rank_event_pages() instead walks the events in
+(created_at, id) order one bounded page at a time, each page starting after the last
+row of the previous one, and never holds more than one page. Feed the pages to
+smart_filter.smart_filter_chunks() to downsample as they arrive.
+"""
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+# Rows per page (at most the server's max-rows) and riot_ids per in_() filter so
+# request URLs stay short
+RANK_EVENT_PAGE_SIZE = 1000
+RANK_EVENT_RIOT_ID_CHUNK = 100
+
+RANK_EVENT_COLUMNS = 'id, riot_id, created_at, elo, wins, losses'
+
+
+def iter_rank_event_pages(supabase_client, riot_ids: Iterable[str], columns: str = RANK_EVENT_COLUMNS,
+                          page_size: int = RANK_EVENT_PAGE_SIZE,
+                          execute: Optional[Callable] = None) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Yield the rank audit events of these riot_ids page by page, oldest first per riot_id chunk.
+
+    execute runs a built query (defaults to query.execute(); pass a retrying wrapper to
+    retry individual pages). Reading stops at the first empty page, so a server max-rows
+    below page_size shortens pages without losing rows.
+    """
+    execute = execute or (lambda query: query.execute())
+    riot_ids = list(riot_ids)
+    for i in range(0, len(riot_ids), RANK_EVENT_RIOT_ID_CHUNK):
+        chunk = riot_ids[i:i + RANK_EVENT_RIOT_ID_CHUNK]
+        after = None
+        while True:
+            query = supabase_client.table('rank_audit_events').select(columns).in_('riot_id', chunk)
+            if after is not None:
+                created_at, event_id = after
+                query = query.or_(f'created_at.gt."{created_at}",'
+                                  f'and(created_at.eq."{created_at}",id.gt.{event_id})')
+            response = execute(query.order('created_at').order('id').limit(page_size))
+            rows = (response.data if response else None) or []
+            if not rows:
+                break
+            yield rows
+            after = (rows[-1]['created_at'], rows[-1]['id'])
@@ -0,0 +1,62 @@
+"""
+When a stored rank is fresh enough to skip asking Riot again.
+
+Every path that writes riot_accounts.rank (the league endpoint, the manual rank update,
+group page refreshes and the rank audit processor) stamps riot_accounts.date_updated,
+and checks it here first. An account refreshed less than the caller's minimum interval
+ago costs no Riot call and no database write.
+
+The processor skips accounts that are fresh, so the app's rank writers record the rank
+audit event for what they read themselves (app.record_rank_audit_event). Both sides share
+the last reading written per account (RANK_FINGERPRINT_KEY), so the same reading is
+not written twice.
+"""
+import os
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+CALLER_INTERACTIVE = 'interactive'  # a user looking at or updating their own rank
+CALLER_GROUP = 'group'  # group page views refreshing every member
+CALLER_PROCESSOR = 'processor'  # the rank audit processor
+
+# Minimum seconds between rank refreshes of one account, per caller type
+RANK_REFRESH_INTERVALS = {
+    CALLER_INTERACTIVE: int(os.environ.get('RANK_REFRESH_INTERVAL_INTERACTIVE', 60)),
+    CALLER_GROUP: int(os.environ.get('GROUP_RANK_REFRESH_INTERVAL', 300)),
+    CALLER_PROCESSOR: int(os.environ.get('RANK_REFRESH_INTERVAL_PROCESSOR', 300)),
+}
+
+# Last rank reading written as a rank audit event, per riot_id ("rank_str|wins|losses")
+RANK_FINGERPRINT_KEY = 'rank_fingerprint'
+
+
+def parse_date_updated(date_updated) -> Optional[datetime]:
+    """riot_accounts.date_updated as an aware datetime (None if missing or unparseable)"""
+    if not date_updated:
+        return None
+    try:
+        updated_at = datetime.fromisoformat(date_updated.replace('Z', '+00:00'))
+    except (AttributeError, ValueError):
+        return None
+    if updated_at.tzinfo is None:
+        updated_at = updated_at.replace(tzinfo=timezone.utc)
+    return updated_at
+
+
+def rank_is_fresh(riot_account: dict, caller: str) -> bool:
+    """True if the account's rank was refreshed within the caller's minimum interval"""
+    updated_at = parse_date_updated(riot_account.get('date_updated'))
+    if updated_at is None:
+        return False
+    age = (datetime.now(timezone.utc) - updated_at).total_seconds()
+    return age < RANK_REFRESH_INTERVALS[caller]
+
+
+def rank_fingerprint(rank_data: Dict[str, Any]) -> str:
+    """Compact identity of a rank reading: tier, division and LP (via rank_str), wins, losses"""
+    return f"{rank_data['rank_str']}|{rank_data['wins']}|{rank_data['losses']}"
+
+
+def freshness_stamp() -> str:
+    """Value to write to riot_accounts.date_updated alongside a refreshed rank"""
+    return datetime.now(timezone.utc).isoformat()
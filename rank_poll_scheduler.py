@@ -0,0 +1,90 @@
+"""
+Activity-based polling schedule for the rank audit processor.
+
+Each riot_id has a next-poll time in Redis. A player whose games played (wins + losses)
+changed since the last poll is polled again after RANK_POLL_MIN_INTERVAL; each poll
+that finds nothing new doubles the interval, up to RANK_POLL_MAX_INTERVAL. Viewing a
+group pulls its members' next poll forward to now, so the people being looked at stay
+current even if they were dormant.
+
+Keys:
+    {prefix}:next            sorted set, riot_id -> next poll (unix seconds)
+    {prefix}:interval        hash, riot_id -> current poll interval (seconds)
+    {prefix}:games           hash, riot_id -> wins + losses seen at the last poll
+    {prefix}:viewed:{group}  marker throttling how often one group's views bump its members
+"""
+import logging
+import os
+import time
+from typing import Iterable, Set
+
+logger = logging.getLogger(__name__)
+
+# Poll interval for players who just played; keep it below the processor's run cadence
+RANK_POLL_MIN_INTERVAL = int(os.environ.get('RANK_POLL_MIN_INTERVAL', 1200))
+# Longest a dormant player goes without being polled
+RANK_POLL_MAX_INTERVAL = int(os.environ.get('RANK_POLL_MAX_INTERVAL', 172800))
+
+
+class RankPollScheduler:
+    """Per-riot_id next-poll times with exponential backoff for inactive players"""
+
+    def __init__(self, redis_client, key_prefix: str = 'rank_poll',
+                 min_interval: int = RANK_POLL_MIN_INTERVAL, max_interval: int = RANK_POLL_MAX_INTERVAL):
+        self.redis = redis_client
+        self.key_prefix = key_prefix
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+
+    def due(self, riot_ids: Iterable[str]) -> Set[str]:
+        """The riot_ids whose next poll has come (players never polled are always due)"""
+        riot_ids = list(riot_ids)
+        if not riot_ids:
+            return set()
+        try:
+            pipe = self.redis.pipeline()
+            for riot_id in riot_ids:
+                pipe.zscore(f"{self.key_prefix}:next", riot_id)
+            next_polls = pipe.execute()
+        except Exception as e:
+            # Without a schedule, poll everyone rather than no one
+            logger.warning(f"Rank poll schedule unavailable, polling all accounts: {str(e)}")
+            return set(riot_ids)
+        now = time.time()
+        return {riot_id for riot_id, next_poll in zip(riot_ids, next_polls) if next_poll is None or next_poll <= now}
+
+    def record(self, riot_id: str, games_played: int):
+        """Schedule the next poll after a successful one that saw games_played (wins + losses)"""
+        try:
+            pipe = self.redis.pipeline()
+            pipe.hget(f"{self.key_prefix}:games", riot_id)
+            pipe.hget(f"{self.key_prefix}:interval", riot_id)
+            last_games, last_interval = pipe.execute()
+            if last_games is None or int(last_games) != games_played or last_interval is None:
+                interval = self.min_interval
+            else:
+                interval = min(self.max_interval, int(last_interval) * 2)
+            pipe = self.redis.pipeline()
+            pipe.hset(f"{self.key_prefix}:games", riot_id, games_played)
+            pipe.hset(f"{self.key_prefix}:interval", riot_id, interval)
+            pipe.zadd(f"{self.key_prefix}:next", {riot_id: time.time() + interval})
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Failed to schedule next rank poll for {riot_id}: {str(e)}")
+
+    def prioritize(self, riot_ids: Iterable[str]):
+        """Make these players due now (without resetting their backoff)"""
+        riot_ids = [riot_id for riot_id in riot_ids if riot_id]
+        if not riot_ids:
+            return
+        now = time.time()
+        # lt: only ever move a next poll earlier
+        self.redis.zadd(f"{self.key_prefix}:next", {riot_id: now for riot_id in riot_ids}, lt=True)
+
+    def mark_group_viewed(self, group_id, riot_ids: Iterable[str]):
+        """A group was viewed: poll its members next run (at most once per min interval per group)"""
+        try:
+            if self.redis.set(f"{self.key_prefix}:viewed:{group_id}", '1', nx=True, ex=self.min_interval):
+                self.prioritize(riot_ids)
+        except Exception as e:
+            logger.warning(f"Failed to prioritize rank polls for group {group_id}: {str(e)}")
@@ -0,0 +1,48 @@
+"""
+Chart events from the rank_audit_daily rollup.
+
+The rollup keeps one row per (riot_id, Pacific day), maintained by a trigger on
+rank_audit_events (see RANK_AUDIT_EVENTS_SETUP.md). Each row carries the day's latest
+event and its highest-ELO event, so the charts' smart filter (latest event for today,
+highest ELO for past days) is a pick per row instead of a scan of every raw event.
+"""
+from typing import Any, Dict, Iterable, List
+
+from smart_filter import MAX_EVENTS_PER_USER, chart_today
+
+# Days (rollup rows) per member the charts show
+RANK_AUDIT_DAILY_DAYS = MAX_EVENTS_PER_USER
+# Rows one rank_audit_daily_recent call may return (PostgREST max rows)
+RANK_AUDIT_DAILY_MAX_ROWS = 1000
+
+_EVENT_FIELDS = ('event_id', 'created_at', 'elo', 'wins', 'losses')
+
+
+def daily_event(row: Dict[str, Any], today: str) -> Dict[str, Any]:
+    """The event a rollup row stands for: the latest one today, the highest ELO one before"""
+    prefix = 'latest_' if row['local_day'] == today else 'best_'
+    event = {field: row[prefix + field] for field in _EVENT_FIELDS}
+    event['id'] = event.pop('event_id')
+    event['riot_id'] = row['riot_id']
+    return event
+
+
+def fetch_daily_rank_events(supabase_client, riot_ids: Iterable[str],
+                            days: int = RANK_AUDIT_DAILY_DAYS) -> List[Dict[str, Any]]:
+    """
+    One event per member per day for each member's last `days` days, oldest first.
+
+    Raises if the rollup isn't set up, so callers can fall back to raw events.
+    """
+    riot_ids = list(riot_ids)
+    chunk_size = max(1, RANK_AUDIT_DAILY_MAX_ROWS // days)
+    today = chart_today()
+    events = []
+    for i in range(0, len(riot_ids), chunk_size):
+        response = supabase_client.rpc('rank_audit_daily_recent', {
+            'p_riot_ids': riot_ids[i:i + chunk_size],
+            'p_days': days
+        }).execute()
+        events.extend(daily_event(row, today) for row in (response.data or []))
+    events.sort(key=lambda event: event['created_at'])
+    return events
@@ -0,0 +1,165 @@
+"""
+Shared Riot Games API client used by app.py and rank_audit_processor.py.
+
+Every Riot call goes through one pooled, keep-alive session so repeated requests
+to the same {region}.api.riotgames.com host reuse open TLS connections instead
+of paying a new handshake each time. When a RiotRateLimiter is attached, every
+call also takes a token from the cluster-wide quota first.
+"""
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from riot_rate_limiter import LANE_INTERACTIVE, RiotRateLimitError
+
+logger = logging.getLogger(__name__)
+
+# Default timeout (seconds) applied to every Riot request that doesn't pass one
+RIOT_API_TIMEOUT = float(os.environ.get('RIOT_API_TIMEOUT', 10))
+# Number of distinct Riot hosts to keep pools for, and connections kept per host
+RIOT_API_POOL_HOSTS = int(os.environ.get('RIOT_API_POOL_HOSTS', 32))
+RIOT_API_POOL_MAXSIZE = int(os.environ.get('RIOT_API_POOL_MAXSIZE', 20))
+# Base URL template; override (e.g. http://localhost:8080/{host}) to point at a fake Riot server
+RIOT_API_BASE_URL = os.environ.get('RIOT_API_BASE_URL', 'https://{host}.api.riotgames.com')
+# Longest a caller queues for rate-limit quota before RiotRateLimitError (seconds)
+RIOT_RATE_LIMIT_MAX_WAIT = float(os.environ.get('RIOT_RATE_LIMIT_MAX_WAIT', 5))
+
+
+class RiotClient:
+    """Thin wrapper around a pooled requests.Session for the Riot Games API.
+
+    Methods return the raw requests.Response so callers keep their existing
+    status-code handling; connection reuse, timeouts and rate limiting are
+    centralised here. Raises RiotRateLimitError when quota can't be acquired
+    within max_wait seconds (max_wait=None queues for as long as it takes).
+    lane picks the quota class ('interactive' or 'background') for every call
+    unless a call overrides it. on_response, if given, is called with
+    (host, endpoint, response) after every HTTP response (e.g. for latency metrics).
+    """
+
+    def __init__(self, api_key: str, timeout: float = RIOT_API_TIMEOUT,
+                 pool_hosts: int = RIOT_API_POOL_HOSTS, pool_maxsize: int = RIOT_API_POOL_MAXSIZE,
+                 base_url: str = RIOT_API_BASE_URL, rate_limiter=None,
+                 max_wait: Optional[float] = RIOT_RATE_LIMIT_MAX_WAIT, lane: str = LANE_INTERACTIVE,
+                 on_response=None):
+        self.api_key = api_key
+        self.timeout = timeout
+        self.base_url = base_url
+        self.rate_limiter = rate_limiter
+        self.max_wait = max_wait
+        self.lane = lane
+        self.on_response = on_response
+        self._pool_hosts = pool_hosts
+        self._pool_maxsize = pool_maxsize
+        self._session = None
+        self._session_lock = threading.Lock()
+
+    @property
+    def session(self) -> requests.Session:
+        """Lazily build the shared session (one connection pool per Riot host)"""
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(
+                        pool_connections=self._pool_hosts,
+                        pool_maxsize=self._pool_maxsize,
+                        max_retries=0
+                    )
+                    session.mount('https://', adapter)
+                    session.mount('http://', adapter)
+                    session.headers.update({'X-Riot-Token': self.api_key})
+                    self._session = session
+        return self._session
+
+    def close(self):
+        """Close all pooled connections"""
+        with self._session_lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+    def get(self, host: str, path: str, endpoint: str, params: Optional[Dict[str, Any]] = None,
+            timeout: Optional[float] = None, lane: Optional[str] = None) -> requests.Response:
+        """
+        GET a Riot API path on the given host (platform or routing region).
+
+        endpoint names the Riot method (e.g. 'league-by-puuid') for method-level limits.
+        """
+        url = self.base_url.format(host=host) + path
+        if self.rate_limiter is None:
+            return self._send(host, endpoint, url, params, timeout)
+
+        lane = lane or self.lane
+        deadline = None if self.max_wait is None else time.monotonic() + self.max_wait
+        for attempt in range(2):
+            remaining = None if deadline is None else max(0, deadline - time.monotonic())
+            self.rate_limiter.acquire(host, endpoint, max_wait=remaining, lane=lane)
+            response = self._send(host, endpoint, url, params, timeout)
+            retry_after = self.rate_limiter.observe(host, endpoint, response)
+            if retry_after is None:
+                return response
+            # Retry a 429 once Retry-After has passed, as long as it fits in our wait budget
+            if deadline is not None and time.monotonic() + retry_after > deadline:
+                raise RiotRateLimitError(retry_after)
+        raise RiotRateLimitError(retry_after)
+
+    def _send(self, host: str, endpoint: str, url: str, params: Optional[Dict[str, Any]],
+              timeout: Optional[float]) -> requests.Response:
+        response = self.session.get(url, params=params, timeout=timeout or self.timeout)
+        if self.on_response is not None:
+            try:
+                self.on_response(host, endpoint, response)
+            except Exception as e:
+                logger.warning(f"Riot API on_response hook failed: {str(e)}")
+        return response
+
+    # Platform-routed endpoints (na1, euw1, kr, ...)
+
+    def get_league_by_puuid(self, region: str, puuid: str, **kwargs) -> requests.Response:
+        """TFT league entries for a player"""
+        return self.get(region, f"/tft/league/v1/by-puuid/{puuid}", 'league-by-puuid', **kwargs)
+
+    def get_apex_league(self, region: str, tier: str, queue: str = 'RANKED_TFT', **kwargs) -> requests.Response:
+        """Every player in an apex tier ('challenger', 'grandmaster' or 'master') of a region"""
+        return self.get(region, f"/tft/league/v1/{tier}", f"league-{tier}", params={'queue': queue}, **kwargs)
+
+    def get_summoner_by_puuid(self, region: str, puuid: str, **kwargs) -> requests.Response:
+        """TFT summoner (profile icon, level) for a player"""
+        return self.get(region, f"/tft/summoner/v1/summoners/by-puuid/{puuid}", 'summoner-by-puuid', **kwargs)
+
+    # Regionally-routed endpoints (americas, asia, europe, sea)
+
+    def get_account_by_riot_id(self, routing_region: str, game_name: str, tag_line: str,
+                               **kwargs) -> requests.Response:
+        """Riot account (puuid, gameName, tagLine) for a Riot ID"""
+        return self.get(routing_region, f"/riot/account/v1/accounts/by-riot-id/{game_name}/{tag_line}",
+                        'account-by-riot-id', **kwargs)
+
+    def get_account_region(self, routing_region: str, puuid: str, **kwargs) -> requests.Response:
+        """Active TFT platform region for a player"""
+        return self.get(routing_region, f"/riot/account/v1/region/by-game/tft/by-puuid/{puuid}",
+                        'account-region', **kwargs)
+
+    def get_match_ids(self, routing_region: str, puuid: str, count: int = 20, start: Optional[int] = None,
+                      start_time: Optional[int] = None, end_time: Optional[int] = None,
+                      **kwargs) -> requests.Response:
+        """Match ids for a player, newest first (start_time/end_time in epoch seconds)"""
+        params = {'count': count}
+        if start is not None:
+            params['start'] = start
+        if start_time is not None:
+            params['startTime'] = start_time
+        if end_time is not None:
+            params['endTime'] = end_time
+        return self.get(routing_region, f"/tft/match/v1/matches/by-puuid/{puuid}/ids", 'match-ids',
+                        params=params, **kwargs)
+
+    def get_match(self, routing_region: str, match_id: str, **kwargs) -> requests.Response:
+        """Full match document"""
+        return self.get(routing_region, f"/tft/match/v1/matches/{match_id}", 'match', **kwargs)
@@ -0,0 +1,218 @@
+"""
+Cluster-wide Riot API rate limiter backed by Redis.
+
+Every gunicorn worker and the rank audit processor share one RIOT_API_KEY, so the
+quota is tracked in Redis rather than per process. Limits are token buckets per
+Riot host (application limit) and per host+endpoint (method limit), learned from
+the X-App-Rate-Limit / X-Method-Rate-Limit headers Riot sends back. 429 responses
+block the offending scope for the Retry-After period.
+
+Callers belong to a lane. 'interactive' requests (user-facing endpoints) may use
+the whole bucket; 'background' requests (the rank audit processor) must leave
+RIOT_INTERACTIVE_RESERVE of every bucket untouched, and pause entirely for
+RIOT_BACKGROUND_BACKOFF seconds whenever an interactive request had to wait.
+"""
+import logging
+import os
+import random
+import time
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Limits used until Riot tells us the real ones (development key defaults)
+RIOT_DEFAULT_APP_RATE_LIMIT = os.environ.get('RIOT_DEFAULT_APP_RATE_LIMIT', '20:1,100:120')
+# Block applied after a 429 that carries no Retry-After header (seconds)
+RIOT_DEFAULT_RETRY_AFTER = float(os.environ.get('RIOT_DEFAULT_RETRY_AFTER', 1))
+# Share of every bucket only interactive requests may use
+RIOT_INTERACTIVE_RESERVE = float(os.environ.get('RIOT_INTERACTIVE_RESERVE', 0.3))
+# How long background requests stand aside after interactive requests were throttled (seconds)
+RIOT_BACKGROUND_BACKOFF = float(os.environ.get('RIOT_BACKGROUND_BACKOFF', 2))
+
+LANE_INTERACTIVE = 'interactive'
+LANE_BACKGROUND = 'background'
+
+# Atomically check every bucket for a host/endpoint and take one token from each.
+# Background callers must leave a reserved share of each bucket for interactive ones.
+# Returns 0 when the call may proceed, otherwise the number of ms to wait.
+_ACQUIRE_SCRIPT = """
+local prefix = ARGV[1]
+local host = ARGV[2]
+local endpoint = ARGV[3]
+local default_app_limits = ARGV[4]
+local lane = ARGV[5]
+local reserve = tonumber(ARGV[6])
+local backoff_ms = tonumber(ARGV[7])
+local pressure_key = prefix .. ':pressure:' .. host
+local background = lane == 'background'
+
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+
+local wait = 0
+local blocked_keys = {prefix .. ':blocked:' .. host, prefix .. ':blocked:' .. host .. ':' .. endpoint}
+if background then
+    table.insert(blocked_keys, pressure_key)
+end
+for _, blocked_key in ipairs(blocked_keys) do
+    local pttl = redis.call('PTTL', blocked_key)
+    if pttl > wait then
+        wait = pttl
+    end
+end
+if wait > 0 then
+    return wait
+end
+
+local scopes = {}
+local app_limits = redis.call('HGET', prefix .. ':limits', 'app:' .. host)
+if not app_limits then
+    app_limits = default_app_limits
+end
+table.insert(scopes, {'app:' .. host, app_limits})
+local method_limits = redis.call('HGET', prefix .. ':limits', 'method:' .. host .. ':' .. endpoint)
+if method_limits then
+    table.insert(scopes, {'method:' .. host .. ':' .. endpoint, method_limits})
+end
+
+local updates = {}
+for _, scope in ipairs(scopes) do
+    for count, window in string.gmatch(scope[2], '(%d+):(%d+)') do
+        local capacity = tonumber(count)
+        local window_ms = tonumber(window) * 1000
+        local key = prefix .. ':bucket:' .. scope[1] .. ':' .. window
+        local state = redis.call('HMGET', key, 'tokens', 'ts')
+        local tokens = tonumber(state[1])
+        local ts = tonumber(state[2])
+        if not tokens then
+            tokens = capacity
+            ts = now
+        end
+        tokens = math.min(capacity, tokens + (now - ts) * capacity / window_ms)
+        local floor = 0
+        if background then
+            floor = capacity * reserve
+        end
+        if tokens < 1 + floor then
+            local needed = math.ceil((1 + floor - tokens) * window_ms / capacity)
+            if needed > wait then
+                wait = needed
+            end
+        end
+        table.insert(updates, {key, tokens, window_ms})
+    end
+end
+if wait > 0 then
+    if not background and backoff_ms > 0 then
+        -- Interactive demand exceeds supply: push background work aside for a while
+        redis.call('SET', pressure_key, '1', 'PX', backoff_ms)
+    end
+    return wait
+end
+
+for _, update in ipairs(updates) do
+    redis.call('HSET', update[1], 'tokens', tostring(update[2] - 1), 'ts', tostring(now))
+    redis.call('PEXPIRE', update[1], update[3] * 2)
+end
+return 0
+"""
+
+
+class RiotRateLimitError(Exception):
+    """Raised when the shared Riot quota cannot be acquired within the caller's wait budget"""
+
+    def __init__(self, retry_after: float, message: Optional[str] = None):
+        self.retry_after = retry_after
+        super().__init__(message or f"Riot API rate limit reached, retry after {retry_after:.1f}s")
+
+
+class RiotRateLimiter:
+    """Redis token-bucket limiter shared by every process using the Riot API key"""
+
+    def __init__(self, redis_client, key_prefix: str = 'riot_rl',
+                 default_app_limits: str = RIOT_DEFAULT_APP_RATE_LIMIT,
+                 interactive_reserve: float = RIOT_INTERACTIVE_RESERVE,
+                 background_backoff: float = RIOT_BACKGROUND_BACKOFF):
+        self.redis = redis_client
+        self.key_prefix = key_prefix
+        self.default_app_limits = default_app_limits
+        self.interactive_reserve = interactive_reserve
+        self.background_backoff = background_backoff
+        self._acquire_script = None
+        # Last limits written to Redis, so we only HSET when Riot reports a change
+        self._known_limits = {}
+
+    def _script(self):
+        if self._acquire_script is None:
+            self._acquire_script = self.redis.register_script(_ACQUIRE_SCRIPT)
+        return self._acquire_script
+
+    def try_acquire(self, host: str, endpoint: str, lane: str = LANE_INTERACTIVE) -> float:
+        """Take one token for host/endpoint. Returns 0 on success, else seconds to wait."""
+        try:
+            wait_ms = self._script()(args=[
+                self.key_prefix, host, endpoint, self.default_app_limits,
+                lane, self.interactive_reserve, int(self.background_backoff * 1000)
+            ])
+            return int(wait_ms) / 1000.0
+        except Exception as e:
+            # Fail open: an unavailable Redis must not take the Riot integration down with it
+            logger.warning(f"Riot rate limiter unavailable, allowing request: {str(e)}")
+            return 0
+
+    def acquire(self, host: str, endpoint: str, max_wait: Optional[float] = None,
+                lane: str = LANE_INTERACTIVE):
+        """
+        Block until a token is available for host/endpoint in the given lane.
+
+        max_wait=None queues indefinitely; max_wait=0 fails fast. Raises
+        RiotRateLimitError when the wait would exceed max_wait.
+        """
+        deadline = None if max_wait is None else time.monotonic() + max_wait
+        while True:
+            wait = self.try_acquire(host, endpoint, lane)
+            if wait <= 0:
+                return
+            if deadline is not None and time.monotonic() + wait > deadline:
+                raise RiotRateLimitError(wait)
+            # Small jitter so queued workers don't all retry on the same tick
+            time.sleep(wait + random.uniform(0, 0.05))
+
+    def observe(self, host: str, endpoint: str, response) -> Optional[float]:
+        """
+        Learn limits from a Riot response and apply Retry-After on 429.
+
+        Returns the Retry-After delay in seconds for 429 responses, else None.
+        """
+        try:
+            headers = response.headers
+            limit_fields = {}
+            app_limits = headers.get('X-App-Rate-Limit')
+            if app_limits:
+                limit_fields[f"app:{host}"] = app_limits
+            method_limits = headers.get('X-Method-Rate-Limit')
+            if method_limits:
+                limit_fields[f"method:{host}:{endpoint}"] = method_limits
+            changed = {field: value for field, value in limit_fields.items() if self._known_limits.get(field) != value}
+            if changed:
+                self.redis.hset(f"{self.key_prefix}:limits", mapping=changed)
+                self._known_limits.update(changed)
+
+            if response.status_code != 429:
+                return None
+
+            try:
+                retry_after = float(headers.get('Retry-After', RIOT_DEFAULT_RETRY_AFTER))
+            except (TypeError, ValueError):
+                retry_after = RIOT_DEFAULT_RETRY_AFTER
+            # Method and service 429s only affect this endpoint; application 429s block the whole host
+            if headers.get('X-Rate-Limit-Type') == 'application':
+                blocked_key = f"{self.key_prefix}:blocked:{host}"
+            else:
+                blocked_key = f"{self.key_prefix}:blocked:{host}:{endpoint}"
+            self.redis.set(blocked_key, '1', px=max(1, int(retry_after * 1000)))
+            logger.warning(f"Riot API 429 on {host} {endpoint}, blocking for {retry_after}s")
+            return retry_after
+        except Exception as e:
+            logger.warning(f"Failed to record Riot rate limit headers: {str(e)}")
+            return None
@@ -0,0 +1,243 @@
+"""
+The charts' "smart filter": one rank audit event per player per day.
+
+Days follow the Pacific calendar. For today a player's latest event is kept (their
+current standing); for earlier days their highest-ELO event (the first one, on ties).
+Each player then keeps only their MAX_EVENTS_PER_USER most recent days.
+
+select_daily() works on columnar arrays (player codes, epoch seconds, ELO) and is
+vectorized with NumPy when it is installed, with a pure-Python fallback giving the same
+result. DailySelection applies it to event dicts as read from rank_audit_events, chunk
+by chunk, holding on to one event per (player, day) rather than every event read.
+See smart_filter_benchmark.py for timings of both.
+"""
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import pytz
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+CHART_TIMEZONE = pytz.timezone('America/Los_Angeles')
+# Days per player the charts show
+MAX_EVENTS_PER_USER = 50
+# Fewest buffered events DailySelection reduces at once
+REDUCE_MIN_EVENTS = 10000
+
+
+def chart_day(moment: datetime) -> str:
+    """The charts' (Pacific) day an aware datetime falls on, as YYYY-MM-DD"""
+    return moment.astimezone(CHART_TIMEZONE).date().isoformat()
+
+
+def chart_today() -> str:
+    """Today's date in the charts' (Pacific) day boundary, as YYYY-MM-DD"""
+    return chart_day(datetime.now(timezone.utc))
+
+
+def _today_ordinal(today: Optional[str]) -> int:
+    return datetime.fromisoformat(today or chart_today()).date().toordinal()
+
+
+@lru_cache(maxsize=65536)
+def _utc_offset(hour: int) -> int:
+    """Chart timezone offset (seconds) during the UTC hour starting at hour * 3600"""
+    moment = datetime.fromtimestamp(hour * 3600, timezone.utc)
+    return int(moment.astimezone(CHART_TIMEZONE).utcoffset().total_seconds())
+
+
+# Day 0 of the epoch as a date ordinal, so day numbers compare with _today_ordinal()
+_EPOCH_ORDINAL = datetime(1970, 1, 1).toordinal()
+
+
+def local_days_python(epoch_seconds: Sequence[float]) -> List[int]:
+    """Chart-timezone day (date ordinal) of each timestamp"""
+    offsets = {}
+    days = []
+    for seconds in epoch_seconds:
+        hour = int(seconds // 3600)
+        offset = offsets.get(hour)
+        if offset is None:
+            offset = offsets[hour] = _utc_offset(hour)
+        days.append(int((seconds + offset) // 86400) + _EPOCH_ORDINAL)
+    return days
+
+
+def local_days_numpy(epoch_seconds):
+    """local_days_python for an array: the offset is looked up once per UTC hour in range"""
+    seconds = np.floor(epoch_seconds).astype(np.int64)
+    hours = seconds // 3600
+    first_hour = int(hours.min())
+    hour_span = int(hours.max()) - first_hour + 1
+    if hour_span <= hours.size:
+        offsets = np.array([_utc_offset(first_hour + hour) for hour in range(hour_span)], dtype=np.int64)
+        hour_offsets = offsets[hours - first_hour]
+    else:
+        # Few events over a long time: only look up the hours that occur
+        unique_hours, hour_index = np.unique(hours, return_inverse=True)
+        offsets = np.array([_utc_offset(int(hour)) for hour in unique_hours], dtype=np.int64)
+        hour_offsets = offsets[hour_index]
+    return (seconds + hour_offsets) // 86400 + _EPOCH_ORDINAL
+
+
+def select_daily_python(players: Sequence[int], epoch_seconds: Sequence[float], elo: Sequence[float],
+                        today: Optional[str] = None,
+                        max_per_user: Optional[int] = MAX_EVENTS_PER_USER) -> List[int]:
+    today_ordinal = _today_ordinal(today)
+    days = local_days_python(epoch_seconds)
+    chosen = {}
+    for i, key in enumerate(zip(players, days)):
+        best = chosen.get(key)
+        if best is None:
+            chosen[key] = i
+        elif key[1] == today_ordinal:
+            if epoch_seconds[i] > epoch_seconds[best]:
+                chosen[key] = i
+        elif elo[i] > elo[best] or (elo[i] == elo[best] and epoch_seconds[i] < epoch_seconds[best]):
+            chosen[key] = i
+
+    selected = sorted(chosen.values(), key=lambda i: (epoch_seconds[i], i))
+    if max_per_user is None:
+        return selected
+    kept = []
+    seen = {}
+    for i in reversed(selected):
+        count = seen.get(players[i], 0)
+        if count < max_per_user:
+            seen[players[i]] = count + 1
+            kept.append(i)
+    kept.reverse()
+    return kept
+
+
+def select_daily_numpy(players, epoch_seconds, elo, today: Optional[str] = None,
+                       max_per_user: Optional[int] = MAX_EVENTS_PER_USER):
+    players = np.asarray(players, dtype=np.int64)
+    epoch_seconds = np.asarray(epoch_seconds, dtype=np.float64)
+    elo = np.asarray(elo, dtype=np.float64)
+    if players.size == 0:
+        return np.empty(0, dtype=np.int64)
+    days = local_days_numpy(epoch_seconds)
+    is_today = days == _today_ordinal(today)
+
+    # Number the (player, day) groups in player-then-day order, without sorting events
+    first_day = int(days.min())
+    day_span = int(days.max()) - first_day + 1
+    group_key = (players - players.min()) * day_span + (days - first_day)
+    group_count = int(group_key.max()) + 1
+    if group_count > 4 * players.size:
+        # Sparse keys (few events over many players and days): compact them
+        unique_keys, group_key = np.unique(group_key, return_inverse=True)
+        group_count = unique_keys.size
+
+    # Wanted: the latest event today, otherwise the highest ELO and, among equal ELO, the
+    # earliest. Each pass keeps the events matching their group's best on one criterion;
+    # full ties go to the first event.
+    candidate = np.ones(players.size, dtype=bool)
+    for key in (np.where(is_today, epoch_seconds, elo), np.where(is_today, 0.0, -epoch_seconds)):
+        key = np.where(candidate, key, -np.inf)
+        best = np.full(group_count, -np.inf)
+        np.maximum.at(best, group_key, key)
+        candidate &= key == best[group_key]
+    first = np.full(group_count, players.size, dtype=np.int64)
+    np.minimum.at(first, group_key[candidate], np.flatnonzero(candidate))
+    selected = first[first < players.size]
+
+    if max_per_user is not None:
+        # selected is ordered by player then day; keep each player's last max_per_user
+        selected_players = players[selected]
+        group_end = np.searchsorted(selected_players, selected_players, side='right')
+        selected = selected[group_end - np.arange(selected.size) <= max_per_user]
+
+    return selected[np.lexsort((selected, epoch_seconds[selected]))]
+
+
+def select_daily(players, epoch_seconds, elo, today: Optional[str] = None,
+                 max_per_user: Optional[int] = MAX_EVENTS_PER_USER) -> List[int]:
+    """
+    Indices of the events the charts keep, oldest first.
+
+    players: an integer code per event (events of one player share a code)
+    epoch_seconds: event time as Unix seconds
+    elo: event ELO
+    today: YYYY-MM-DD in the chart timezone (defaults to now)
+    max_per_user: most recent days kept per player (None for all)
+    """
+    if np is not None:
+        return select_daily_numpy(players, epoch_seconds, elo, today, max_per_user).tolist()
+    return select_daily_python(players, epoch_seconds, elo, today, max_per_user)
+
+
+def parse_created_at(created_at: str) -> float:
+    """rank_audit_events.created_at as Unix seconds (naive timestamps are UTC)"""
+    moment = datetime.fromisoformat(created_at.replace('Z', '+00:00'))
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+
+class DailySelection:
+    """
+    select_daily over event dicts (with riot_id, created_at and elo) fed in chunks.
+
+    Buffered events are reduced to one per (player, day) whenever the buffer outgrows
+    what is already kept, so memory follows the number of player-days, not events, and
+    each event is parsed once. Feed chunks in read order: ties go to the first event.
+    """
+
+    def __init__(self, today: Optional[str] = None):
+        # Fixed up front so a read that spans midnight uses one day boundary
+        self.today = today or chart_today()
+        self._codes = {}
+        self._events = []
+        self._players = []
+        self._epoch_seconds = []
+        self._elo = []
+        self._kept = 0
+
+    def add(self, events: Iterable[Dict[str, Any]]):
+        for event in events:
+            try:
+                seconds = parse_created_at(event['created_at'])
+                event_elo = float(event['elo'])
+            except (KeyError, TypeError, AttributeError, ValueError):
+                continue
+            self._players.append(self._codes.setdefault(event['riot_id'], len(self._codes)))
+            self._epoch_seconds.append(seconds)
+            self._elo.append(event_elo)
+            self._events.append(event)
+        if len(self._events) - self._kept >= max(REDUCE_MIN_EVENTS, self._kept):
+            self._reduce(None)
+
+    def _reduce(self, max_per_user: Optional[int]):
+        selected = select_daily(self._players, self._epoch_seconds, self._elo, self.today, max_per_user)
+        self._events = [self._events[i] for i in selected]
+        self._players = [self._players[i] for i in selected]
+        self._epoch_seconds = [self._epoch_seconds[i] for i in selected]
+        self._elo = [self._elo[i] for i in selected]
+        self._kept = len(selected)
+
+    def result(self, max_per_user: Optional[int] = MAX_EVENTS_PER_USER) -> List[Dict[str, Any]]:
+        """The events the charts keep, oldest first"""
+        if self._events:
+            self._reduce(max_per_user)
+        return list(self._events)
+
+
+def smart_filter_events(events: List[Dict[str, Any]], today: Optional[str] = None,
+                        max_per_user: Optional[int] = MAX_EVENTS_PER_USER) -> List[Dict[str, Any]]:
+    """The events (dicts with riot_id, created_at and elo) the charts keep, oldest first"""
+    return smart_filter_chunks([events], today, max_per_user)
+
+
+def smart_filter_chunks(chunks: Iterable[List[Dict[str, Any]]], today: Optional[str] = None,
+                        max_per_user: Optional[int] = MAX_EVENTS_PER_USER) -> List[Dict[str, Any]]:
+    """smart_filter_events over events arriving in chunks (e.g. pages of a streamed read)"""
+    selection = DailySelection(today)
+    for chunk in chunks:
+        selection.add(chunk)
+    return selection.result(max_per_user)
@@ -0,0 +1,92 @@
+"""
+Benchmark the smart filter engine (smart_filter.py) on synthetic rank audit events.
+
+Usage:
+    python smart_filter_benchmark.py                       # 100k, 1M and 10M events
+    python smart_filter_benchmark.py --sizes 100000 500000 --players 500 --days 120
+    python smart_filter_benchmark.py --python-max 1000000  # also time the pure-Python path up to 1M
+    python smart_filter_benchmark.py --dicts-max 1000000   # also time smart_filter_events on event dicts
+
+Events are spread over --players players and the last --days days. Each size is timed
+for the vectorized path (needs NumPy); the pure-Python path and the end-to-end dict path
+(ISO timestamp parsing included) run for sizes up to --python-max / --dicts-max, and
+the two engine paths are checked to select the same events.
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+import smart_filter
+
+
+def synthetic_columns(size: int, players: int, days: int, seed: int = 0):
+    """(player codes, epoch seconds, elo) as NumPy arrays, sorted by time like a table read"""
+    np = smart_filter.np
+    rng = np.random.default_rng(seed)
+    now = datetime.now(timezone.utc).timestamp()
+    epoch_seconds = np.sort(rng.uniform(now - days * 86400, now, size)).round()
+    player_codes = rng.integers(0, players, size)
+    elo = rng.integers(0, 3200, size)
+    return player_codes, epoch_seconds, elo
+
+
+def synthetic_events(size: int, players: int, days: int, seed: int = 0):
+    """The same kind of data as event dicts, as read from rank_audit_events"""
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    events = []
+    for _ in range(size):
+        created_at = now - timedelta(seconds=rng.uniform(0, days * 86400))
+        events.append({
+            'riot_id': f"puuid-{rng.randrange(players)}",
+            'created_at': created_at.isoformat(),
+            'elo': rng.randrange(3200),
+            'wins': rng.randrange(500),
+            'losses': rng.randrange(500)
+        })
+    events.sort(key=lambda event: event['created_at'])
+    return events
+
+
+def timed(function, *args, **kwargs):
+    started = time.perf_counter()
+    result = function(*args, **kwargs)
+    return time.perf_counter() - started, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100_000, 1_000_000, 10_000_000])
+    parser.add_argument('--players', type=int, default=2000)
+    parser.add_argument('--days', type=int, default=180)
+    parser.add_argument('--python-max', type=int, default=1_000_000,
+                        help='largest size to also run the pure-Python path on')
+    parser.add_argument('--dicts-max', type=int, default=0,
+                        help='largest size to also run smart_filter_events on event dicts')
+    args = parser.parse_args()
+
+    if smart_filter.np is None:
+        parser.error('NumPy is not installed; the vectorized path cannot be benchmarked')
+
+    print(f"{'events':>10}  {'path':<8}  {'seconds':>8}  {'events/s':>12}  {'kept':>8}")
+    for size in args.sizes:
+        players, epoch_seconds, elo = synthetic_columns(size, args.players, args.days)
+        seconds, selected = timed(smart_filter.select_daily_numpy, players, epoch_seconds, elo)
+        print(f"{size:>10}  {'numpy':<8}  {seconds:>8.3f}  {size / seconds:>12,.0f}  {len(selected):>8}")
+
+        if size <= args.python_max:
+            columns = (players.tolist(), epoch_seconds.tolist(), elo.tolist())
+            seconds, python_selected = timed(smart_filter.select_daily_python, *columns)
+            print(f"{size:>10}  {'python':<8}  {seconds:>8.3f}  {size / seconds:>12,.0f}  {len(python_selected):>8}")
+            if python_selected != selected.tolist():
+                raise SystemExit(f"NumPy and pure-Python paths disagree at {size} events")
+
+        if size <= args.dicts_max:
+            events = synthetic_events(size, args.players, args.days)
+            seconds, kept = timed(smart_filter.smart_filter_events, events)
+            print(f"{size:>10}  {'dicts':<8}  {seconds:>8.3f}  {size / seconds:>12,.0f}  {len(kept):>8}")
+
+
+if __name__ == '__main__':
+    main()
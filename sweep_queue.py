@@ -0,0 +1,167 @@
+"""
+Shared, resumable rank audit sweeps as a Redis work queue.
+
+A sweep splits every riot account into RANK_SWEEP_SHARDS shards (by a stable hash of
+riot_id). Processor instances claim shards under a lease, renew it with heartbeats
+while they work, and commit the shard when its events are written. A shard whose
+lease runs out (its instance crashed or was stopped) goes back to the queue, so any
+number of instances can share one sweep, and a restarted instance picks up the
+shards that were never committed instead of starting over.
+
+Keys (all under {prefix}, expiring RANK_SWEEP_TTL after the sweep started):
+    {prefix}:current               id of the sweep in progress
+    {prefix}:{sweep}:pending       list of shards nobody holds
+    {prefix}:{sweep}:leases        sorted set, shard -> lease expiry (ms)
+    {prefix}:{sweep}:owners        hash, shard -> instance holding it
+    {prefix}:{sweep}:done          set of committed shards
+"""
+import logging
+import os
+import socket
+import threading
+import uuid
+import zlib
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+RANK_SWEEP_SHARDS = int(os.environ.get('RANK_SWEEP_SHARDS', 32))
+# Seconds a claimed shard stays leased without a heartbeat
+RANK_SWEEP_LEASE_TTL = int(os.environ.get('RANK_SWEEP_LEASE_TTL', 120))
+# How long an unfinished sweep's state is kept (seconds)
+RANK_SWEEP_TTL = 2 * 24 * 3600
+
+# Join the current sweep, or start a new one if there is none or it is complete.
+_START_SCRIPT = """
+local prefix = ARGV[1]
+local shards = tonumber(ARGV[2])
+local new_id = ARGV[3]
+local ttl = tonumber(ARGV[4])
+local current = redis.call('GET', prefix .. ':current')
+if current and redis.call('SCARD', prefix .. ':' .. current .. ':done') < shards then
+    return current
+end
+redis.call('SET', prefix .. ':current', new_id, 'EX', ttl)
+local pending = prefix .. ':' .. new_id .. ':pending'
+for shard = 0, shards - 1 do
+    redis.call('RPUSH', pending, shard)
+end
+redis.call('EXPIRE', pending, ttl)
+return new_id
+"""
+
+# Requeue expired leases, then lease the next pending shard to this instance.
+_CLAIM_SCRIPT = """
+local sweep = ARGV[1]
+local owner = ARGV[2]
+local lease_ms = tonumber(ARGV[3])
+local ttl = tonumber(ARGV[4])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local pending = sweep .. ':pending'
+local leases = sweep .. ':leases'
+local owners = sweep .. ':owners'
+for _, shard in ipairs(redis.call('ZRANGEBYSCORE', leases, '-inf', now)) do
+    redis.call('ZREM', leases, shard)
+    redis.call('HDEL', owners, shard)
+    redis.call('RPUSH', pending, shard)
+end
+local shard = redis.call('LPOP', pending)
+if not shard then
+    return false
+end
+redis.call('ZADD', leases, now + lease_ms, shard)
+redis.call('HSET', owners, shard, owner)
+redis.call('EXPIRE', leases, ttl)
+redis.call('EXPIRE', owners, ttl)
+return shard
+"""
+
+# Extend (or commit, when ARGV[4] == '1') a lease this instance still owns.
+_RENEW_SCRIPT = """
+local sweep = ARGV[1]
+local owner = ARGV[2]
+local shard = ARGV[3]
+local commit = ARGV[4] == '1'
+local lease_ms = tonumber(ARGV[5])
+local ttl = tonumber(ARGV[6])
+if redis.call('HGET', sweep .. ':owners', shard) ~= owner then
+    return 0
+end
+if commit then
+    redis.call('ZREM', sweep .. ':leases', shard)
+    redis.call('HDEL', sweep .. ':owners', shard)
+    redis.call('SADD', sweep .. ':done', shard)
+    redis.call('EXPIRE', sweep .. ':done', ttl)
+    return 1
+end
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+redis.call('ZADD', sweep .. ':leases', 'XX', now + lease_ms, shard)
+return 1
+"""
+
+
+def shard_of(riot_id: str, shards: int = RANK_SWEEP_SHARDS) -> int:
+    """Stable shard number for a riot_id (the same on every instance)"""
+    return zlib.crc32(riot_id.encode('utf-8')) % shards
+
+
+class SweepQueue:
+    """One processor instance's handle on the shared sweep"""
+
+    def __init__(self, redis_client, key_prefix: str = 'rank_sweep', shards: int = RANK_SWEEP_SHARDS,
+                 lease_ttl: int = RANK_SWEEP_LEASE_TTL):
+        self.redis = redis_client
+        self.key_prefix = key_prefix
+        self.shards = shards
+        self.lease_ttl = lease_ttl
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.sweep_id = None
+        self._start_script = redis_client.register_script(_START_SCRIPT)
+        self._claim_script = redis_client.register_script(_CLAIM_SCRIPT)
+        self._renew_script = redis_client.register_script(_RENEW_SCRIPT)
+
+    def _sweep_key(self) -> str:
+        return f"{self.key_prefix}:{self.sweep_id}"
+
+    def join(self) -> str:
+        """Join the sweep in progress, or start a new one. Returns the sweep id."""
+        new_id = uuid.uuid4().hex[:12]
+        self.sweep_id = self._start_script(args=[self.key_prefix, self.shards, new_id, RANK_SWEEP_TTL])
+        return self.sweep_id
+
+    def claim(self) -> Optional[int]:
+        """Lease the next shard nobody is working on (None when the sweep has none left)"""
+        shard = self._claim_script(args=[self._sweep_key(), self.owner, self.lease_ttl * 1000, RANK_SWEEP_TTL])
+        return None if shard is None else int(shard)
+
+    def heartbeat(self, shard: int) -> bool:
+        """Extend our lease on a shard. False if it was lost (expired and handed to someone else)."""
+        return bool(self._renew_script(args=[self._sweep_key(), self.owner, shard, '0',
+                                             self.lease_ttl * 1000, RANK_SWEEP_TTL]))
+
+    def commit(self, shard: int) -> bool:
+        """Mark a shard done for this sweep. False if our lease was lost in the meantime."""
+        return bool(self._renew_script(args=[self._sweep_key(), self.owner, shard, '1',
+                                             self.lease_ttl * 1000, RANK_SWEEP_TTL]))
+
+    def remaining(self) -> int:
+        """Shards not yet committed in this sweep"""
+        return self.shards - self.redis.scard(f"{self._sweep_key()}:done")
+
+    def keep_alive(self, shard: int) -> threading.Event:
+        """Heartbeat a shard from a background thread until the returned event is set"""
+        stop = threading.Event()
+
+        def beat():
+            while not stop.wait(self.lease_ttl / 3.0):
+                try:
+                    if not self.heartbeat(shard):
+                        logger.warning(f"Lost lease on rank sweep shard {shard}")
+                        return
+                except Exception as e:
+                    logger.warning(f"Rank sweep heartbeat failed for shard {shard}: {str(e)}")
+
+        threading.Thread(target=beat, name=f"sweep-heartbeat-{shard}", daemon=True).start()
+        return stop
@@ -0,0 +1,103 @@
+"""
+LeagueSnapshotCache single-flight fetches against fakeredis and a stub Riot client.
+
+Run with:  pip install -r requirements-dev.txt && python -m pytest tests
+"""
+import threading
+import time
+import unittest
+
+from league_cache import LeagueSnapshot, LeagueSnapshotCache
+from riot_rate_limiter import LANE_BACKGROUND, LANE_INTERACTIVE
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+
+class StubResponse:
+    status_code = 200
+    text = '[{"queueType": "RANKED_TFT", "tier": "GOLD"}]'
+
+
+class StubRiotClient:
+    """Answers league lookups after `delay` seconds and records them"""
+
+    timeout = 10
+    max_wait = 60
+
+    def __init__(self, lane=LANE_INTERACTIVE, delay=0.0):
+        self.lane = lane
+        self.delay = delay
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def get_league_by_puuid(self, region, puuid, **kwargs):
+        with self.lock:
+            self.calls.append((region, puuid, kwargs.get('lane')))
+        time.sleep(self.delay)
+        return StubResponse()
+
+
+@unittest.skipIf(fakeredis is None, 'fakeredis is not installed')
+class LeagueSnapshotCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis(decode_responses=True)
+
+    def test_concurrent_misses_share_one_fetch(self):
+        client = StubRiotClient(delay=0.2)
+        cache = LeagueSnapshotCache(client, self.redis)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get('na1', 'p1').json())) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(client.calls), 1)
+        self.assertEqual(len(results), 10)
+        self.assertTrue(cache.get('na1', 'p1').cached)
+
+    def test_interactive_caller_does_not_wait_on_a_background_fetch(self):
+        # Another worker (the processor) holds the lock and is queued for quota
+        self.redis.set('riot_league:na1:p1:lock', '1', px=71000)
+        client = StubRiotClient()
+        cache = LeagueSnapshotCache(client, self.redis, lock_wait=0.2)
+
+        started = time.monotonic()
+        snapshot = cache.get('na1', 'p1')
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(snapshot.status_code, 200)
+        self.assertEqual(client.calls, [('na1', 'p1', None)])
+        # The direct fetch leaves the holder's lock alone
+        self.assertEqual(self.redis.get('riot_league:na1:p1:lock'), '1')
+
+    def test_interactive_caller_uses_a_result_landing_within_the_wait(self):
+        self.redis.set('riot_league:na1:p1:lock', '1', px=71000)
+        client = StubRiotClient()
+        cache = LeagueSnapshotCache(client, self.redis, lock_wait=2)
+
+        # The lock holder's result lands while we wait
+        landed = LeagueSnapshot(200, StubResponse.text, time.time())
+        timer = threading.Timer(0.2, lambda: self.redis.set('riot_league:na1:p1', landed.to_cache()))
+        timer.start()
+        self.addCleanup(timer.cancel)
+        snapshot = cache.get('na1', 'p1')
+        self.assertTrue(snapshot.cached)
+        self.assertEqual(client.calls, [])
+
+    def test_background_caller_waits_for_the_lock_holder(self):
+        self.redis.set('riot_league:na1:p1:lock', '1', px=600)
+        client = StubRiotClient(lane=LANE_BACKGROUND)
+        cache = LeagueSnapshotCache(client, self.redis, lock_wait=0.1)
+
+        started = time.monotonic()
+        cache.get('na1', 'p1')
+        # Waited until the lock expired rather than the interactive 0.1s
+        self.assertGreater(time.monotonic() - started, 0.4)
+        self.assertEqual(client.calls, [('na1', 'p1', None)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,139 @@
+"""
+In-place updates of cached member series (member_series_cache.py).
+
+Run with:  pip install -r requirements-dev.txt && python -m pytest tests
+"""
+import json
+import random
+import unittest
+from datetime import datetime, timedelta, timezone
+
+import member_series_cache
+from member_series_cache import append_events, apply_event, load_series, series_from_events, store_series
+from smart_filter import chart_day, chart_today, smart_filter_events
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+NOW = datetime.now(timezone.utc).replace(microsecond=0)
+
+
+def iso(days_ago: float = 0, hours: float = 0) -> str:
+    return (NOW - timedelta(days=days_ago, hours=hours)).isoformat()
+
+
+def event(created_at: str, elo: int, wins: int = 1, losses: int = 1) -> dict:
+    return {'riot_id': 'p', 'created_at': created_at, 'elo': elo, 'wins': wins, 'losses': losses}
+
+
+def record(*events) -> dict:
+    return series_from_events(smart_filter_events(list(events)), ['p'])['p']
+
+
+def elos(series: dict) -> list:
+    return [point['elo'] for point in series['events']]
+
+
+class ApplyEventTest(unittest.TestCase):
+
+    def setUp(self):
+        # Midday today (Pacific) and on earlier days, so small offsets stay on the same day
+        self.today = chart_today()
+        self.noon = datetime.fromisoformat(self.today).replace(hour=20, tzinfo=timezone.utc)
+
+    def at(self, days_ago: int, minutes: int = 0) -> str:
+        return (self.noon - timedelta(days=days_ago) + timedelta(minutes=minutes)).isoformat()
+
+    def test_today_keeps_the_latest_event(self):
+        series = record(event(self.at(0), 500, wins=1))
+        self.assertTrue(apply_event(series, event(self.at(0, 5), 100, wins=2)))
+        self.assertEqual(elos(series), [100])
+        # An earlier reading of another record doesn't replace today's point
+        self.assertFalse(apply_event(series, event(self.at(0, -5), 900, wins=3)))
+        self.assertEqual(elos(series), [100])
+
+    def test_past_day_keeps_the_highest_elo(self):
+        series = record(event(self.at(3), 500, wins=1))
+        self.assertFalse(apply_event(series, event(self.at(3, 5), 400, wins=2)))
+        self.assertTrue(apply_event(series, event(self.at(3, 10), 600, wins=3)))
+        self.assertEqual(elos(series), [600])
+        # Equal ELO: the earlier event wins
+        self.assertTrue(apply_event(series, event(self.at(3, -10), 600, wins=4)))
+        self.assertEqual(series['events'][0]['wins'], 4)
+
+    def test_new_day_is_added_in_order(self):
+        series = record(event(self.at(5), 100), event(self.at(1), 300))
+        self.assertTrue(apply_event(series, event(self.at(3), 200, wins=2)))
+        self.assertEqual(elos(series), [100, 200, 300])
+
+    def test_oldest_day_beyond_the_window_is_ignored(self):
+        series = record(*[event(self.at(day), day, wins=day) for day in range(50)])
+        self.assertEqual(len(series['events']), 50)
+        self.assertFalse(apply_event(series, event(self.at(60), 999, wins=99)))
+        self.assertTrue(apply_event(series, event(self.at(0, 5), 7, wins=98)))
+        self.assertEqual(len(series['events']), 50)
+
+    def test_event_overwriting_the_picked_row_needs_a_rebuild(self):
+        # Same wins and losses on the same day: the database upsert replaced the picked
+        # row with a lower one, and the day's next best event isn't in the series
+        series = record(event(self.at(3), 500, wins=1))
+        self.assertIsNone(apply_event(series, event(self.at(3, 5), 300, wins=1)))
+        # Replacing it with a higher one is still known to be the day's best
+        self.assertTrue(apply_event(series, event(self.at(3, 5), 700, wins=1)))
+        self.assertEqual(elos(series), [700])
+
+
+@unittest.skipIf(fakeredis is None, 'fakeredis is not installed')
+class AppendEventsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis(decode_responses=True)
+
+    def store(self, events, riot_ids=('p',)):
+        pipe = self.redis.pipeline()
+        store_series(pipe, series_from_events(smart_filter_events(events), riot_ids))
+        pipe.execute()
+
+    def test_players_without_a_series_are_reported(self):
+        self.store([event(iso(1), 100)])
+        self.assertEqual(append_events(self.redis, [event(iso(), 200), dict(event(iso(), 1), riot_id='q')]), ['q'])
+        cached = json.loads(self.redis.get('member_series:p'))
+        self.assertEqual(cached['version'], 1)
+        self.assertGreater(self.redis.ttl('member_series:p'), 0)
+
+    def test_matches_a_rebuild_from_the_upserted_rows(self):
+        rng = random.Random(4)
+        for trial in range(200):
+            self.redis.flushall()
+            # rank_audit_events keyed on (riot_id, wins, losses, local_day)
+            rows = {}
+
+            def upsert(new_event):
+                day = chart_day(datetime.fromisoformat(new_event['created_at']))
+                rows[(new_event['wins'], new_event['losses'], day)] = new_event
+
+            for _ in range(rng.randrange(0, 60)):
+                upsert(event(iso(rng.uniform(0, 70)), rng.randrange(5), rng.randrange(3), rng.randrange(3)))
+            self.store(list(rows.values()))
+
+            new = [event(iso(rng.uniform(0, 4)), rng.randrange(5), rng.randrange(3), rng.randrange(3))
+                   for _ in range(rng.randrange(1, 4))]
+            for new_event in new:
+                upsert(new_event)
+            not_updated = append_events(self.redis, new)
+
+            with self.subTest(trial=trial):
+                if not_updated:
+                    # Left for a rebuild: the cached series is untouched
+                    self.assertEqual(not_updated, ['p'])
+                    continue
+                cached, _ = load_series(self.redis, ['p'])
+                rebuilt = record(*rows.values())
+                key = lambda point: (datetime.fromisoformat(point['created_at']).timestamp(), point['elo'])
+                self.assertEqual(list(map(key, cached['p']['events'])), list(map(key, rebuilt['events'])))
+
+
+if __name__ == '__main__':
+    unittest.main()
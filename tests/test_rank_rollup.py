@@ -0,0 +1,204 @@
+"""
+Chart reads from the rank_audit_daily rollup (rank_rollup.py) and keyset-paged raw events
+(rank_event_stream.py), against a stub Supabase client.
+
+Run with:  pip install -r requirements-dev.txt && python -m pytest tests
+"""
+import random
+import re
+import unittest
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+
+import rank_rollup
+from rank_event_stream import iter_rank_event_pages
+from rank_rollup import fetch_daily_rank_events
+from smart_filter import chart_day, chart_today, parse_created_at, smart_filter_chunks, smart_filter_events
+
+
+def random_events(rng, riot_ids, count, days=70):
+    """Raw rank_audit_events rows, ordered by (created_at, id) like the table's index"""
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    rows = []
+    for event_id in range(1, count + 1):
+        created_at = now - timedelta(minutes=30 * rng.randrange(days * 48))
+        rows.append({
+            'id': event_id,
+            'riot_id': rng.choice(riot_ids),
+            'created_at': created_at.isoformat(),
+            'elo': rng.randrange(5),
+            'wins': rng.randrange(100),
+            'losses': rng.randrange(100)
+        })
+    rows.sort(key=lambda row: (parse_created_at(row['created_at']), row['id']))
+    return rows
+
+
+def rollup_rows(events):
+    """rank_audit_daily as the trigger maintains it (rank_audit_daily_refresh in RANK_AUDIT_EVENTS_SETUP.md)"""
+    by_day = {}
+    for event in events:
+        day = chart_day(datetime.fromisoformat(event['created_at']))
+        by_day.setdefault((event['riot_id'], day), []).append(event)
+    rows = []
+    for (riot_id, day), day_events in by_day.items():
+        # ORDER BY created_at DESC, id / ORDER BY elo DESC, created_at, id
+        latest = min(day_events, key=lambda e: (-parse_created_at(e['created_at']), e['id']))
+        best = min(day_events, key=lambda e: (-e['elo'], parse_created_at(e['created_at']), e['id']))
+        row = {'riot_id': riot_id, 'local_day': day}
+        for prefix, event in (('latest_', latest), ('best_', best)):
+            row[prefix + 'event_id'] = event['id']
+            for field in ('created_at', 'elo', 'wins', 'losses'):
+                row[prefix + field] = event[field]
+        rows.append(row)
+    return rows
+
+
+class Response:
+    def __init__(self, data):
+        self.data = data
+
+
+class RollupClient:
+    """Serves rank_audit_daily_recent from rollup rows"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.calls = []
+
+    def rpc(self, name, params):
+        assert name == 'rank_audit_daily_recent'
+        self.calls.append(list(params['p_riot_ids']))
+        data = []
+        for riot_id in params['p_riot_ids']:
+            member_rows = sorted((row for row in self.rows if row['riot_id'] == riot_id),
+                                 key=lambda row: row['local_day'], reverse=True)
+            data.extend(member_rows[:params['p_days']])
+        return mock.Mock(execute=lambda: Response(data))
+
+
+class EventsQuery:
+    """The slice of the PostgREST query builder iter_rank_event_pages uses"""
+
+    AFTER = re.compile(r'^created_at\.gt\."([^"]+)",and\(created_at\.eq\."([^"]+)",id\.gt\.(\d+)\)$')
+
+    def __init__(self, client):
+        self.client = client
+        self.riot_ids = None
+        self.after = None
+        self.limit_rows = None
+
+    def select(self, columns):
+        return self
+
+    def in_(self, column, values):
+        self.riot_ids = set(values)
+        return self
+
+    def or_(self, filters):
+        match = self.AFTER.match(filters)
+        assert match and match.group(1) == match.group(2), filters
+        self.after = (parse_created_at(match.group(1)), int(match.group(3)))
+        return self
+
+    def order(self, column):
+        return self
+
+    def limit(self, rows):
+        self.limit_rows = rows
+        return self
+
+    def execute(self):
+        rows = [row for row in self.client.events if row['riot_id'] in self.riot_ids
+                and (self.after is None or (parse_created_at(row['created_at']), row['id']) > self.after)]
+        page = rows[:min(self.limit_rows, self.client.max_rows)]
+        self.client.pages.append(len(page))
+        return Response(page)
+
+
+class EventsClient:
+    def __init__(self, events, max_rows=1000):
+        self.events = events
+        self.max_rows = max_rows
+        self.pages = []
+
+    def table(self, name):
+        assert name == 'rank_audit_events'
+        return EventsQuery(self)
+
+
+class RankRollupTest(unittest.TestCase):
+
+    def test_rollup_matches_smart_filter_over_raw_events(self):
+        rng = random.Random(5)
+        riot_ids = [f"player{i}#NA1" for i in range(25)]
+        events = random_events(rng, riot_ids, 3000)
+        # Make sure some ties are in there: same ELO on a past day, same time today
+        events.append(dict(events[-1], id=len(events) + 1))
+        events.append(dict(events[0], id=len(events) + 1, elo=events[0]['elo']))
+        events.sort(key=lambda row: (parse_created_at(row['created_at']), row['id']))
+
+        client = RollupClient(rollup_rows(events))
+        with mock.patch.object(rank_rollup, 'RANK_AUDIT_DAILY_MAX_ROWS', 200):
+            daily = fetch_daily_rank_events(client, riot_ids)
+        # 200 rows per call / 50 days: four members per rank_audit_daily_recent call
+        self.assertEqual([len(call) for call in client.calls], [4] * 6 + [1])
+
+        expected = smart_filter_events(events, chart_today())
+        key = lambda event: (event['riot_id'], event['id'])
+        self.assertEqual(sorted(map(key, daily)), sorted(map(key, expected)))
+        self.assertEqual([event['created_at'] for event in daily], sorted(event['created_at'] for event in daily))
+
+    def test_daily_event_picks_latest_today_and_best_before(self):
+        today = chart_today()
+        row = {'riot_id': 'a', 'local_day': today,
+               'latest_event_id': 2, 'latest_created_at': 't2', 'latest_elo': 10, 'latest_wins': 3, 'latest_losses': 1,
+               'best_event_id': 1, 'best_created_at': 't1', 'best_elo': 20, 'best_wins': 2, 'best_losses': 1}
+        self.assertEqual(rank_rollup.daily_event(row, today),
+                         {'id': 2, 'riot_id': 'a', 'created_at': 't2', 'elo': 10, 'wins': 3, 'losses': 1})
+        self.assertEqual(rank_rollup.daily_event(row, '2099-01-01')['id'], 1)
+
+
+class RankEventStreamTest(unittest.TestCase):
+
+    def test_pages_cover_every_event_once_and_stop_after_the_short_page(self):
+        rng = random.Random(9)
+        events = random_events(rng, ['a', 'b', 'c'], 2350)
+        client = EventsClient(events)
+
+        pages = list(iter_rank_event_pages(client, ['a', 'b', 'c'], page_size=1000))
+        self.assertEqual([len(page) for page in pages], [1000, 1000, 350])
+        # The short page ends the data; one more (empty) read confirms it
+        self.assertEqual(client.pages, [1000, 1000, 350, 0])
+        self.assertEqual([row['id'] for page in pages for row in page], [row['id'] for row in events])
+
+    def test_server_max_rows_below_page_size_loses_nothing(self):
+        rng = random.Random(10)
+        events = random_events(rng, ['a', 'b'], 730)
+        # Rows sharing a created_at continue on the next page by id
+        events += [dict(events[-1], id=10000 + i) for i in range(5)]
+        client = EventsClient(events, max_rows=100)
+
+        pages = list(iter_rank_event_pages(client, ['a', 'b'], page_size=1000))
+        self.assertEqual([len(page) for page in pages], [100] * 7 + [35])
+        self.assertEqual(sorted(row['id'] for page in pages for row in page), sorted(row['id'] for row in events))
+
+    def test_riot_ids_are_read_in_chunks(self):
+        riot_ids = [f"p{i}" for i in range(250)]
+        events = random_events(random.Random(1), riot_ids, 500)
+        client = EventsClient(events)
+
+        with mock.patch('rank_event_stream.RANK_EVENT_RIOT_ID_CHUNK', 100):
+            filtered = smart_filter_chunks(iter_rank_event_pages(client, riot_ids))
+        self.assertEqual(client.pages.count(0), 3)
+        self.assertEqual(sorted(e['id'] for e in filtered),
+                         sorted(e['id'] for e in smart_filter_events(events, chart_today())))
+
+    def test_no_events(self):
+        client = EventsClient([])
+        self.assertEqual(list(iter_rank_event_pages(client, ['a'])), [])
+        self.assertEqual(client.pages, [0])
+
+
+if __name__ == '__main__':
+    unittest.main()
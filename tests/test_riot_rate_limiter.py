@@ -0,0 +1,151 @@
+"""
+RiotRateLimiter and RiotClient against a local fake Riot server and fakeredis.
+
+Run with:  pip install -r requirements-dev.txt && python -m pytest tests
+"""
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import redis
+from redis.backoff import NoBackoff
+from redis.retry import Retry
+
+from riot_client import RiotClient
+from riot_rate_limiter import LANE_BACKGROUND, LANE_INTERACTIVE, RiotRateLimiter, RiotRateLimitError
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+
+class FakeRiotServer:
+    """Serves queued (status, headers) responses, then 200s; records requested paths"""
+
+    def __init__(self):
+        self.responses = []
+        self.paths = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.paths.append(self.path)
+                status, headers = server.responses.pop(0) if server.responses else (200, {})
+                body = json.dumps({'path': self.path}).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.base_url = f"http://127.0.0.1:{self.httpd.server_address[1]}/{{host}}"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@unittest.skipIf(fakeredis is None, 'fakeredis is not installed')
+class RiotRateLimiterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis(decode_responses=True)
+        self.server = FakeRiotServer().__enter__()
+        self.addCleanup(self.server.__exit__)
+
+    def client(self, limiter, **kwargs):
+        kwargs.setdefault('max_wait', 0)
+        client = RiotClient('test-key', base_url=self.server.base_url, rate_limiter=limiter, **kwargs)
+        self.addCleanup(client.close)
+        return client
+
+    def test_learns_limits_from_headers(self):
+        limiter = RiotRateLimiter(self.redis, default_app_limits='100:1')
+        client = self.client(limiter)
+        self.server.responses.append((200, {'X-App-Rate-Limit': '2:10', 'X-Method-Rate-Limit': '50:10'}))
+
+        self.assertEqual(client.get_summoner_by_puuid('na1', 'p1').status_code, 200)
+        self.assertEqual(self.redis.hgetall('riot_rl:limits'), {
+            'app:na1': '2:10',
+            'method:na1:summoner-by-puuid': '50:10'
+        })
+        self.assertEqual(self.server.paths, ['/na1/tft/summoner/v1/summoners/by-puuid/p1'])
+
+        # The learned 2-per-10s bucket now applies: two more calls, then no quota
+        client.get_summoner_by_puuid('na1', 'p2')
+        client.get_summoner_by_puuid('na1', 'p3')
+        with self.assertRaises(RiotRateLimitError):
+            client.get_summoner_by_puuid('na1', 'p4')
+        self.assertEqual(len(self.server.paths), 3)
+
+    def test_429_retry_after_blocks_scope(self):
+        limiter = RiotRateLimiter(self.redis)
+        client = self.client(limiter)
+        self.server.responses.append((429, {'Retry-After': '3', 'X-Rate-Limit-Type': 'application'}))
+
+        with self.assertRaises(RiotRateLimitError) as raised:
+            client.get_league_by_puuid('euw1', 'p1')
+        self.assertEqual(raised.exception.retry_after, 3)
+        self.assertTrue(2000 < self.redis.pttl('riot_rl:blocked:euw1') <= 3000)
+        # Blocked requests wait without reaching Riot
+        self.assertGreater(limiter.try_acquire('euw1', 'summoner-by-puuid'), 2)
+        self.assertEqual(len(self.server.paths), 1)
+
+    def test_method_429_blocks_only_its_endpoint(self):
+        limiter = RiotRateLimiter(self.redis)
+        client = self.client(limiter)
+        self.server.responses.append((429, {'Retry-After': '5', 'X-Rate-Limit-Type': 'method'}))
+
+        with self.assertRaises(RiotRateLimitError):
+            client.get_match('americas', 'NA1_1')
+        self.assertGreater(self.redis.pttl('riot_rl:blocked:americas:match'), 4000)
+        self.assertEqual(self.redis.pttl('riot_rl:blocked:americas'), -2)
+        self.assertEqual(client.get_match_ids('americas', 'p1').status_code, 200)
+
+    def test_max_wait_raises_rate_limit_error(self):
+        limiter = RiotRateLimiter(self.redis, default_app_limits='1:60')
+        limiter.acquire('na1', 'match', max_wait=0)
+
+        with self.assertRaises(RiotRateLimitError) as raised:
+            limiter.acquire('na1', 'match', max_wait=0.1)
+        self.assertGreater(raised.exception.retry_after, 0.1)
+
+    def test_background_lane_leaves_reserve(self):
+        limiter = RiotRateLimiter(self.redis, default_app_limits='10:600', interactive_reserve=0.3,
+                                  background_backoff=60)
+        background = [limiter.try_acquire('na1', 'league-by-puuid', LANE_BACKGROUND) for _ in range(8)]
+        # 7 of 10 tokens go to the background lane, 3 stay for interactive callers
+        self.assertEqual(background[:7], [0] * 7)
+        self.assertGreater(background[7], 0)
+        self.assertEqual([limiter.try_acquire('na1', 'league-by-puuid', LANE_INTERACTIVE) for _ in range(3)], [0] * 3)
+
+        # An interactive caller that has to wait pushes the background lane aside
+        self.assertGreater(limiter.try_acquire('na1', 'league-by-puuid', LANE_INTERACTIVE), 0)
+        self.assertGreater(self.redis.pttl('riot_rl:pressure:na1'), 0)
+
+    def test_fails_open_when_redis_is_down(self):
+        down = redis.Redis(host='127.0.0.1', port=1, socket_connect_timeout=0.1, retry=Retry(NoBackoff(), 0))
+        limiter = RiotRateLimiter(down)
+        client = self.client(limiter)
+        self.server.responses.append((200, {'X-App-Rate-Limit': '1:10'}))
+
+        self.assertEqual(limiter.try_acquire('na1', 'match'), 0)
+        self.assertEqual(client.get_summoner_by_puuid('na1', 'p1').status_code, 200)
+        self.assertEqual(client.get_summoner_by_puuid('na1', 'p2').status_code, 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
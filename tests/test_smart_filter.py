@@ -0,0 +1,139 @@
+"""
+The charts' smart filter (smart_filter.py): its daily rule, and the NumPy and pure-Python
+engines agreeing.
+
+Run with:  pip install -r requirements-dev.txt && python -m pytest tests
+"""
+import random
+import unittest
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+
+import smart_filter
+from smart_filter import DailySelection, select_daily_python, smart_filter_chunks, smart_filter_events
+
+ENGINES = [('python', select_daily_python)]
+if smart_filter.np is not None:
+    ENGINES.append(('numpy', lambda *args, **kwargs: smart_filter.select_daily_numpy(*args, **kwargs).tolist()))
+
+
+def seconds(iso: str) -> float:
+    return datetime.fromisoformat(iso).timestamp()
+
+
+def event(riot_id: str, created_at: str, elo: int, event_id: int) -> dict:
+    return {'riot_id': riot_id, 'created_at': created_at, 'elo': elo, 'id': event_id}
+
+
+class SelectDailyTest(unittest.TestCase):
+    """The daily rule, checked against every available engine"""
+
+    def select(self, rows, today, max_per_user=smart_filter.MAX_EVENTS_PER_USER):
+        """rows: (player, ISO time, elo). Returns the selected indices of every engine (all equal)."""
+        players = [row[0] for row in rows]
+        times = [seconds(row[1]) for row in rows]
+        elo = [row[2] for row in rows]
+        results = {name: engine(players, times, elo, today, max_per_user) for name, engine in ENGINES}
+        first = results['python']
+        for name, result in results.items():
+            self.assertEqual(result, first, name)
+        return first
+
+    def test_today_keeps_latest_event(self):
+        rows = [
+            (0, '2026-10-16T16:00:00+00:00', 900),
+            (0, '2026-10-16T20:00:00+00:00', 100),
+            (0, '2026-10-16T18:00:00+00:00', 500),
+        ]
+        self.assertEqual(self.select(rows, '2026-10-16'), [1])
+
+    def test_past_day_keeps_highest_elo_and_earliest_on_ties(self):
+        rows = [
+            (0, '2026-10-10T16:00:00+00:00', 500),
+            (0, '2026-10-10T17:00:00+00:00', 900),
+            (0, '2026-10-10T18:00:00+00:00', 900),
+            (0, '2026-10-10T19:00:00+00:00', 200),
+        ]
+        self.assertEqual(self.select(rows, '2026-10-16'), [1])
+
+    def test_full_ties_go_to_the_first_event(self):
+        rows = [
+            (0, '2026-10-10T16:00:00+00:00', 900),
+            (0, '2026-10-10T16:00:00+00:00', 900),
+            (0, '2026-10-16T16:00:00+00:00', 100),
+            (0, '2026-10-16T16:00:00+00:00', 100),
+        ]
+        self.assertEqual(self.select(rows, '2026-10-16'), [0, 2])
+
+    def test_days_follow_the_pacific_calendar_across_dst(self):
+        # DST ended 2024-11-03 at 09:00 UTC: 08:30 UTC was 01:30 PDT on the 3rd, and
+        # 07:30 UTC the next morning was still 23:30 PST on the 3rd
+        rows = [
+            (0, '2024-11-03T06:30:00+00:00', 700),  # 23:30 PDT, Nov 2
+            (0, '2024-11-03T08:30:00+00:00', 100),  # 01:30 PDT, Nov 3
+            (0, '2024-11-04T07:30:00+00:00', 300),  # 23:30 PST, Nov 3
+            (0, '2024-11-04T08:30:00+00:00', 200),  # 00:30 PST, Nov 4
+        ]
+        self.assertEqual(self.select(rows, '2024-11-10'), [0, 2, 3])
+        self.assertEqual(smart_filter.chart_day(datetime(2024, 11, 4, 7, 30, tzinfo=timezone.utc)), '2024-11-03')
+
+    def test_max_per_user_keeps_each_players_latest_days(self):
+        start = datetime(2026, 8, 1, 20, tzinfo=timezone.utc)
+        rows = [(0, (start + timedelta(days=day)).isoformat(), day) for day in range(60)]
+        rows += [(1, (start + timedelta(days=day)).isoformat(), day) for day in range(3)]
+        selected = self.select(rows, '2026-10-16', max_per_user=50)
+        self.assertEqual([i for i in selected if rows[i][0] == 0], list(range(10, 60)))
+        self.assertEqual([i for i in selected if rows[i][0] == 1], [60, 61, 62])
+        self.assertEqual(len(self.select(rows, '2026-10-16', max_per_user=None)), 63)
+
+
+class SmartFilterEventsTest(unittest.TestCase):
+
+    def random_events(self, rng, count):
+        base = seconds('2024-10-01T00:00:00+00:00')
+        events = [
+            event(f"player{rng.randrange(6)}",
+                  datetime.fromtimestamp(base + rng.randrange(0, 60 * 86400) // 1800 * 1800, timezone.utc).isoformat(),
+                  rng.randrange(5), event_id)
+            for event_id in range(count)
+        ]
+        events.sort(key=lambda event: (event['created_at'], event['id']))
+        return events
+
+    def test_chunked_selection_matches_a_single_pass(self):
+        rng = random.Random(7)
+        for trial in range(50):
+            events = self.random_events(rng, rng.randint(0, 400))
+            max_per_user = rng.choice([None, 3, 50])
+            chunk = rng.randint(1, 50)
+            with self.subTest(trial=trial), mock.patch.object(smart_filter, 'REDUCE_MIN_EVENTS', rng.choice([1, 20])):
+                single = smart_filter_events(events, '2024-11-20', max_per_user)
+                chunked = smart_filter_chunks([events[i:i + chunk] for i in range(0, len(events), chunk)],
+                                              '2024-11-20', max_per_user)
+                self.assertEqual([e['id'] for e in chunked], [e['id'] for e in single])
+
+    def test_unparseable_events_are_skipped(self):
+        selection = DailySelection('2026-10-16')
+        selection.add([event('a', 'not a time', 1, 1), {'riot_id': 'a'}, event('a', '2026-10-16T18:00:00Z', 5, 2)])
+        self.assertEqual([e['id'] for e in selection.result()], [2])
+
+    @unittest.skipIf(smart_filter.np is None, 'numpy is not installed')
+    def test_numpy_and_python_engines_agree(self):
+        rng = random.Random(11)
+        for trial in range(200):
+            count = rng.randint(1, 300)
+            players = [rng.randrange(8) for _ in range(count)]
+            times = [seconds('2024-10-01T00:00:00+00:00') + rng.randrange(0, 90 * 86400) // 3600 * 3600
+                     for _ in range(count)]
+            elo = [rng.randrange(4) for _ in range(count)]
+            today = rng.choice(['2024-11-03', '2024-12-01'])
+            max_per_user = rng.choice([None, 1, 5, 50])
+            with self.subTest(trial=trial):
+                self.assertEqual(
+                    smart_filter.select_daily_numpy(players, times, elo, today, max_per_user).tolist(),
+                    select_daily_python(players, times, elo, today, max_per_user)
+                )
+
+
+if __name__ == '__main__':
+    unittest.main()